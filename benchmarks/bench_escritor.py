@@ -0,0 +1,117 @@
+"""
+Escritas concorrentes no CiclistaService: cada thread com sua sessão e seu commit ("direto") contra a
+fila única do EscritorBanco ("escritor", group commit).
+
+Cada thread faz --operacoes escritas alternando atualizar_ciclista (UPDATE + email na outbox) e
+cadastrar_funcionario (INSERT). Mede vazão, latência p50/p99 e quantas escritas falharam por lock
+("database is locked"). No modo direto a disputa pelo lock de escrita aparece na cauda (p99); no
+escritor ela vira fila, e o p50 paga a janela de espera do lote (ESCRITOR_JANELA). O perfil "legado"
+(rollback journal, um fsync por commit) é onde o group commit mais ajuda.
+
+    python benchmarks/bench_escritor.py --threads 16 --operacoes 200 --perfil wal
+    python benchmarks/bench_escritor.py --threads 16 --operacoes 100 --perfil legado
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def rodar(modo: str, session_factory, threads: int, operacoes: int, ciclistas: int) -> dict:
+    from sqlalchemy.exc import OperationalError
+    from src.schemas import NovoFuncionario
+    from src.services import CiclistaService, EscritorBanco
+
+    escritor = EscritorBanco(session_factory) if modo == "escritor" else None
+    latencias, falhas_lock, outras_falhas = [], [0], [0]
+    lock = threading.Lock()
+    largada = threading.Barrier(threads)
+
+    def trabalhar(n: int):
+        locais, locks, outras = [], 0, 0
+        largada.wait()
+        for i in range(operacoes):
+            db = session_factory()
+            service = CiclistaService(db, escritor=escritor)
+            inicio = time.perf_counter()
+            try:
+                if i % 2:
+                    service.atualizar_ciclista(10 + (n * operacoes + i) % ciclistas, {"nome": f"Nome {n}-{i}"})
+                else:
+                    service.cadastrar_funcionario(NovoFuncionario(
+                        nome=f"F {n}-{i}", email=f"f{n}-{i}@example.com", senha="x", confirmacaoSenha="x",
+                        cpf="12345678901", funcao="Reparador", idade=30))
+                locais.append(time.perf_counter() - inicio)
+            except OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                locks += 1
+            except Exception:
+                outras += 1
+            finally:
+                db.close()
+        with lock:
+            latencias.extend(locais)
+            falhas_lock[0] += locks
+            outras_falhas[0] += outras
+
+    inicio = time.perf_counter()
+    trabalhadores = [threading.Thread(target=trabalhar, args=(n,)) for n in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    if escritor:
+        escritor.parar()
+
+    latencias.sort()
+    resultado = {
+        "vazao": len(latencias) / duracao,
+        "p50_ms": statistics.median(latencias) * 1000 if latencias else 0.0,
+        "p99_ms": latencias[int(len(latencias) * 0.99) - 1] * 1000 if latencias else 0.0,
+        "falhas_lock": falhas_lock[0],
+        "outras_falhas": outras_falhas[0],
+    }
+    if escritor:
+        resultado["unidades_por_lote"] = escritor.estatisticas()["unidadesPorLote"]
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--operacoes", type=int, default=200, help="escritas por thread")
+    parser.add_argument("--ciclistas", type=int, default=1_000)
+    parser.add_argument("--perfil", default="wal", choices=("wal", "legado"), help="perfil do SQLite (DB_PERFIL)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # o engine do database.py lê DATABASE_URL no import (o carga.py já importa o database)
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'nao_usado.db')}"
+        from carga import semear
+        from sqlalchemy.orm import sessionmaker
+        from database import criar_engine
+
+        print(f"{'modo':<10} {'escritas/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'lock':>6} {'outras':>7} {'por lote':>9}")
+        for modo in ("direto", "escritor"):
+            banco = os.path.join(tmp, f"{modo}.db")
+            semear(banco, args.ciclistas, 0)
+            engine = criar_engine(f"sqlite:///{banco}", perfil=args.perfil,
+                                  pool_size=args.threads + 1, max_overflow=0)
+            r = rodar(modo, sessionmaker(bind=engine, autoflush=False), args.threads, args.operacoes,
+                      args.ciclistas)
+            engine.dispose()
+            print(f"{modo:<10} {r['vazao']:>11.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['falhas_lock']:>6} "
+                  f"{r['outras_falhas']:>7} {r.get('unidades_por_lote', 1.0):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Validações do aluguel e da devolução lendo o equipamento pela rede contra o espelho local
+(src/services/espelho_equipamento.py).
+
+Sobe o stub do equipamento com --latencia-ms e faz --operacoes validações alternando as do aluguel
+(busca_bicicleta + busca_tranca) e as da devolução (busca_tranca + bicicleta_em_uso) em --trancas
+trancas, com o cache de 5 s desligado para medir a ida ao equipamento. No modo "espelho" o estado vem
+de uma carga completa (ressincronizar) feita antes da medição. Mostra latência por validação, vazão,
+chamadas ao equipamento e se as respostas dos dois modos foram iguais.
+
+    python benchmarks/bench_espelho.py --operacoes 2000 --trancas 200 --latencia-ms 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs  # noqa: E402
+from src.clients import CacheTTL  # noqa: E402
+from src.services import CiclistaService, EspelhoEquipamento  # noqa: E402
+
+
+def validar(service: CiclistaService, i: int, trancas: int):
+    id_tranca = 2 * (i % trancas) + 1  # trancas ímpares começam OCUPADAS com a bicicleta de mesmo número
+    if i % 2:
+        return service.busca_tranca(id_tranca)["status"], service.bicicleta_em_uso(id_tranca)
+    return service.busca_bicicleta(id_tranca)["numero"], service.busca_tranca(id_tranca)["status"]
+
+
+def rodar(service: CiclistaService, config: stubs.ConfigStub, operacoes: int, trancas: int) -> dict:
+    latencias, respostas = [], []
+    chamadas = config.requisicoes
+    inicio = time.perf_counter()
+    for i in range(operacoes):
+        t = time.perf_counter()
+        respostas.append(validar(service, i, trancas))
+        latencias.append(time.perf_counter() - t)
+    duracao = time.perf_counter() - inicio
+    latencias.sort()
+    return {"vazao": operacoes / duracao, "p50_us": statistics.median(latencias) * 1e6,
+            "p99_us": latencias[int(len(latencias) * 0.99) - 1] * 1e6,
+            "chamadas": config.requisicoes - chamadas, "respostas": respostas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operacoes", type=int, default=2000)
+    parser.add_argument("--trancas", type=int, default=200)
+    parser.add_argument("--latencia-ms", type=float, default=5, help="latência do stub do equipamento")
+    args = parser.parse_args()
+
+    servidor, config = stubs.iniciar(stubs.rotas_equipamento, latencia_ms=args.latencia_ms)
+    url = f"http://127.0.0.1:{servidor.server_port}"
+    sem_cache = CacheTTL(ttl=0)
+
+    rede = CiclistaService(None, url_equipamento=url, cache=sem_cache, espelho=EspelhoEquipamento(ativo=False))
+    r_rede = rodar(rede, config, args.operacoes, args.trancas)
+
+    espelho = EspelhoEquipamento(ativo=True)
+    espelho.url_equipamento = url  # só a carga completa; sem session_factory fica em memória
+    carga = time.perf_counter()
+    espelho.ressincronizar()
+    carga = time.perf_counter() - carga
+    local = CiclistaService(None, url_equipamento=url, cache=sem_cache, espelho=espelho)
+    r_local = rodar(local, config, args.operacoes, args.trancas)
+
+    print(f"{'modo':<8} {'validações/s':>13} {'p50 µs':>10} {'p99 µs':>10} {'chamadas':>9}")
+    for modo, r in (("rede", r_rede), ("espelho", r_local)):
+        print(f"{modo:<8} {r['vazao']:>13.0f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['chamadas']:>9}")
+    print(f"carga completa: {carga * 1000:.1f} ms, {espelho.estatisticas()['trancas']} trancas; "
+          f"respostas iguais: {r_rede['respostas'] == r_local['respostas']}")
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
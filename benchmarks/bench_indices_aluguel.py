@@ -0,0 +1,107 @@
+"""
+Benchmark das consultas de "aluguel em aberto" com e sem os índices de migrations/0002_indices_aluguel.sql
+(e do índice único de email da 0005).
+
+Cria dois bancos temporários a partir de restaurar_banco.sql, cresce a tabela aluguel até os tamanhos
+pedidos com aluguéis encerrados (os abertos são só os do script de restauração) e mede o tempo
+médio de cada consulta. Com os índices parciais o tempo deve ficar estável conforme o histórico cresce.
+
+    python benchmarks/bench_indices_aluguel.py --tamanhos 10000 100000 1000000 3000000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from sqlalchemy import create_engine  # noqa: E402
+from database import aplicar_migracoes  # noqa: E402
+
+N_CICLISTAS = 50_000
+N_BICICLETAS = 5_000
+
+CONSULTAS = {
+    "ciclista_pode_alugar": ("SELECT id FROM aluguel WHERE ciclista_id = ? AND horaFim IS NULL LIMIT 1",
+                             lambda: (random.randint(1, N_CICLISTAS),)),
+    "realizar_aluguel": ("SELECT id FROM aluguel WHERE ciclista_id = ? AND trancaFim IS NULL LIMIT 1",
+                         lambda: (random.randint(1, N_CICLISTAS),)),
+    "realizar_devolucao": ("SELECT id FROM aluguel WHERE bicicleta = ? AND trancaFim IS NULL AND horaFim IS NULL LIMIT 1",
+                           lambda: (random.randint(1, N_BICICLETAS),)),
+    "email_ciclista": ("SELECT id FROM ciclista WHERE lower(email) = lower(?) LIMIT 1",
+                       lambda: (f"ciclista{random.randint(1, N_CICLISTAS)}@example.com",)),
+}
+
+
+def criar_banco(caminho: str, com_indices: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(caminho)
+    with open(os.path.join(RAIZ, "restaurar_banco.sql")) as f:
+        conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO ciclista (nome, email, nacionalidade, nascimento, senha, status) VALUES (?, ?, 'BRASILEIRO', '2000-01-01', 'x', 'CONFIRMADO')",
+        ((f"Ciclista {i}", f"ciclista{i}@example.com") for i in range(5, N_CICLISTAS + 1)),
+    )
+    conn.commit()
+    if com_indices:
+        aplicar_migracoes(create_engine(f"sqlite:///{caminho}"))
+    return conn
+
+
+def inserir_encerrados(conn: sqlite3.Connection, quantidade: int, inicio: datetime.datetime):
+    lote = 100_000
+    for base in range(0, quantidade, lote):
+        linhas = []
+        for i in range(base, min(base + lote, quantidade)):
+            hora = inicio + datetime.timedelta(minutes=i)
+            linhas.append((random.randint(1, N_CICLISTAS), hora.isoformat(" "),
+                           (hora + datetime.timedelta(minutes=40)).isoformat(" "),
+                           1, 2, 1, random.randint(1, N_BICICLETAS)))
+        conn.executemany(
+            "INSERT INTO aluguel (ciclista_id, horaInicio, horaFim, trancaInicio, trancaFim, cobranca, bicicleta) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", linhas)
+    conn.commit()
+
+
+def medir(conn: sqlite3.Connection, sql: str, parametros, repeticoes: int) -> float:
+    """Tempo médio por consulta, em microssegundos."""
+    args = [parametros() for _ in range(repeticoes)]
+    inicio = time.perf_counter()
+    for a in args:
+        conn.execute(sql, a).fetchone()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+    random.seed(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bancos = {
+            "sem índice": criar_banco(os.path.join(tmp, "sem.db"), com_indices=False),
+            "com índice": criar_banco(os.path.join(tmp, "com.db"), com_indices=True),
+        }
+        atual = 0
+        inicio = datetime.datetime(2020, 1, 1)
+        print(f"{'linhas':>10}  {'consulta':<22} {'sem índice (µs)':>16} {'com índice (µs)':>16}")
+        for tamanho in sorted(args.tamanhos):
+            for conn in bancos.values():
+                random.seed(tamanho)
+                inserir_encerrados(conn, tamanho - atual, inicio + datetime.timedelta(minutes=atual))
+            atual = tamanho
+            for nome, (sql, parametros) in CONSULTAS.items():
+                tempos = [medir(conn, sql, parametros, args.repeticoes) for conn in bancos.values()]
+                print(f"{tamanho:>10}  {nome:<22} {tempos[0]:>16.1f} {tempos[1]:>16.1f}")
+        for conn in bancos.values():
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark do caminho rápido de saída (SAIDA_RAPIDA) por endpoint.
+
+Para cada GET mede duas coisas, com o caminho antigo e o rápido:
+- serialização: do objeto/linha do banco até os bytes do JSON. O caminho antigo faz o que o FastAPI
+  faz com o response_model (validação from_attributes + dump + json.dumps); o rápido monta o dict
+  direto das colunas e serializa com pydantic_core.to_json;
+- endpoint: a requisição inteira pelo TestClient (banco, roteamento e serialização).
+
+Antes de medir confere que os dois caminhos devolvem o mesmo JSON.
+
+    python benchmarks/bench_saida.py --repeticoes 2000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    "GET /ciclista/{id}": "/ciclista/10",
+    "GET /cartaoDeCredito/{id}": "/cartaoDeCredito/10",
+    "GET /funcionario/{id}": "/funcionario/12345",
+    "GET /funcionario": "/funcionario",
+}
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Tempo médio por chamada, em microssegundos."""
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def casos_serializacao(db):
+    """Para cada endpoint: (caminho antigo, caminho rápido), ambos terminando nos bytes do JSON."""
+    from pydantic import TypeAdapter
+    from pydantic_core import to_json
+    from src.schemas import Ciclista, CartaoCredito, Funcionario
+    from src.services import CiclistaService
+
+    service = CiclistaService(db)
+
+    def antigo(tipo, obter):
+        adaptador = TypeAdapter(tipo)
+
+        def serializar():
+            conteudo = adaptador.dump_python(adaptador.validate_python(obter(), from_attributes=True), mode="json")
+            return json.dumps(conteudo, ensure_ascii=False, separators=(",", ":")).encode()
+        return serializar
+
+    return {
+        "GET /ciclista/{id}": (antigo(Ciclista, lambda: service.recupera_ciclista_por_id(10)),
+                               lambda: to_json(service.recupera_ciclista_resposta(10))),
+        "GET /cartaoDeCredito/{id}": (antigo(CartaoCredito, lambda: service.busca_cartao(10)),
+                                      lambda: to_json(service.busca_cartao_resposta(10))),
+        "GET /funcionario/{id}": (antigo(Funcionario, lambda: service.recupera_funcionario(12345)),
+                                  lambda: to_json(service.recupera_funcionario_resposta(12345))),
+        # a listagem já não passava pelo response_model, só pelo json.dumps do JSONResponse
+        "GET /funcionario": (lambda: json.dumps(service.recupera_funcionarios(), ensure_ascii=False,
+                                                separators=(",", ":")).encode(),
+                             lambda: to_json(service.recupera_funcionarios())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    parser.add_argument("--funcionarios", type=int, default=100, help="linhas no GET /funcionario")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        banco = os.path.join(tmp, "saida.db")
+        # o engine do database.py lê DATABASE_URL no import (o carga.py já importa o database)
+        os.environ["DATABASE_URL"] = f"sqlite:///{banco}"
+        from carga import semear
+        semear(banco, 1_000, 0)
+        conn = sqlite3.connect(banco)
+        conn.execute("INSERT INTO passaporte (numero, validade, pais, ciclista_id) VALUES ('X1', '2031-01-01', 'US', 10)")
+        conn.executemany(
+            "INSERT INTO funcionario (nome, email, senha, cpf, funcao, idade) VALUES (?, ?, 'x', '12345678901', 'Reparador', 30)",
+            ((f"Funcionario {i}", f"funcionario{i}@example.com") for i in range(args.funcionarios - 1)))
+        conn.commit()
+        conn.close()
+
+        import main as app_main
+        from fastapi.testclient import TestClient
+        from database import SessionLocal
+
+        cliente = TestClient(app_main.app)
+        with SessionLocal() as db:
+            serializacao = casos_serializacao(db)
+            print(f"{'endpoint':<28} {'serial. antiga':>15} {'serial. rápida':>15} {'endpoint antigo':>16} "
+                  f"{'endpoint rápido':>16}  (µs por chamada)")
+            for nome, caminho in ENDPOINTS.items():
+                antigo, rapido = serializacao[nome]
+                app_main.SAIDA_RAPIDA = False
+                resposta_antiga = cliente.get(caminho)
+                app_main.SAIDA_RAPIDA = True
+                resposta_rapida = cliente.get(caminho)
+                if resposta_antiga.json() != resposta_rapida.json() or json.loads(antigo()) != json.loads(rapido()):
+                    raise SystemExit(f"{nome}: os dois caminhos devolvem respostas diferentes")
+
+                tempos = [medir(antigo, args.repeticoes), medir(rapido, args.repeticoes)]
+                for ligado in (False, True):
+                    app_main.SAIDA_RAPIDA = ligado
+                    tempos.append(medir(lambda: cliente.get(caminho), args.repeticoes // 4))
+                print(f"{nome:<28} {tempos[0]:>15.1f} {tempos[1]:>15.1f} {tempos[2]:>16.1f} {tempos[3]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Vazão de escrita concorrente do SQLite por perfil do database.py ("legado" x "wal").
+
+Cada thread abre sessões como as rotas fazem (SessionLocal por operação) e insere aluguéis,
+enquanto outras threads fazem as leituras de "aluguel em aberto". Mede commits/s e quantas
+operações falharam com "database is locked".
+
+    python benchmarks/bench_sqlite_perfil.py --escritores 8 --leitores 8 --operacoes 300
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from database import criar_engine, aplicar_migracoes, PERFIS_SQLITE  # noqa: E402
+from src.models import AluguelDB  # noqa: E402
+
+
+def preparar(caminho: str, perfil: str):
+    engine = criar_engine(f"sqlite:///{caminho}", perfil=perfil)
+    with open(os.path.join(RAIZ, "restaurar_banco.sql")) as f:
+        comandos = f.read().split(";")
+    with engine.begin() as conn:
+        for comando in comandos:
+            if comando.strip():
+                conn.execute(text(comando))
+    aplicar_migracoes(engine)
+    return engine
+
+
+def rodar(perfil: str, escritores: int, leitores: int, operacoes: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = preparar(os.path.join(tmp, "bench.db"), perfil)
+        Sessao = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        erros = {"escrita": 0, "leitura": 0}
+        lock = threading.Lock()
+        parar_leitura = threading.Event()
+
+        def escrever():
+            for _ in range(operacoes):
+                db = Sessao()
+                try:
+                    db.add(AluguelDB(ciclista_id=random.randint(1, 4), horaInicio=datetime.datetime.now(),
+                                     horaFim=datetime.datetime.now(), trancaInicio=1, trancaFim=2,
+                                     cobranca=1, bicicleta=random.randint(1, 1000)))
+                    db.commit()
+                except OperationalError:
+                    db.rollback()
+                    with lock:
+                        erros["escrita"] += 1
+                finally:
+                    db.close()
+
+        def ler():
+            while not parar_leitura.is_set():
+                db = Sessao()
+                try:
+                    db.query(AluguelDB).filter(AluguelDB.ciclista_id == random.randint(1, 4),
+                                               AluguelDB.horaFim.is_(None)).first()
+                except OperationalError:
+                    with lock:
+                        erros["leitura"] += 1
+                finally:
+                    db.close()
+
+        threads_leitura = [threading.Thread(target=ler) for _ in range(leitores)]
+        threads_escrita = [threading.Thread(target=escrever) for _ in range(escritores)]
+        for t in threads_leitura:
+            t.start()
+        inicio = time.perf_counter()
+        for t in threads_escrita:
+            t.start()
+        for t in threads_escrita:
+            t.join()
+        duracao = time.perf_counter() - inicio
+        parar_leitura.set()
+        for t in threads_leitura:
+            t.join()
+        engine.dispose()
+
+    total = escritores * operacoes
+    return {
+        "perfil": perfil,
+        "commits_por_segundo": (total - erros["escrita"]) / duracao,
+        "falhas_escrita": erros["escrita"],
+        "falhas_leitura": erros["leitura"],
+        "duracao_s": duracao,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritores", type=int, default=8)
+    parser.add_argument("--leitores", type=int, default=8)
+    parser.add_argument("--operacoes", type=int, default=300, help="inserções por escritor")
+    parser.add_argument("--perfis", nargs="+", default=list(PERFIS_SQLITE))
+    args = parser.parse_args()
+
+    print(f"{'perfil':<8} {'commits/s':>10} {'falhas escrita':>15} {'falhas leitura':>15} {'duração (s)':>12}")
+    for perfil in args.perfis:
+        r = rodar(perfil, args.escritores, args.leitores, args.operacoes)
+        print(f"{r['perfil']:<8} {r['commits_por_segundo']:>10.0f} {r['falhas_escrita']:>15} "
+              f"{r['falhas_leitura']:>15} {r['duracao_s']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark do cálculo de valor extra: AluguelController.calcula_valores_extra (NumPy) contra
+calcula_valor_extra chamado aluguel por aluguel.
+
+Gera N aluguéis sintéticos (padrão 10 milhões), mede a versão vetorizada sobre todos e a versão
+escalar sobre uma amostra (extrapolando o tempo), e confere que os resultados da amostra são idênticos.
+
+    python benchmarks/bench_tarifas.py --alugueis 10000000 --amostra 500000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from src.controllers import AluguelController  # noqa: E402
+
+
+def gerar(n: int, semente: int = 42):
+    rng = np.random.default_rng(semente)
+    base = np.datetime64("2024-01-01T00:00:00", "us")
+    inicios = base + rng.integers(0, 365 * 86400 * 10**6, n).astype("timedelta64[us]")
+    # maioria das viagens curtas, cauda longa, e alguns valores exatamente na fronteira da meia hora
+    duracoes = rng.exponential(25 * 60 * 10**6, n).astype(np.int64)
+    fronteira = rng.random(n) < 0.05
+    duracoes[fronteira] = rng.integers(0, 12, fronteira.sum()) * 30 * 60 * 10**6
+    return inicios, inicios + duracoes.astype("timedelta64[us]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alugueis", type=int, default=10_000_000)
+    parser.add_argument("--amostra", type=int, default=500_000)
+    args = parser.parse_args()
+
+    inicios, fins = gerar(args.alugueis)
+
+    t = time.perf_counter()
+    valores = AluguelController.calcula_valores_extra(inicios, fins)
+    tempo_vetorizado = time.perf_counter() - t
+
+    amostra = min(args.amostra, args.alugueis)
+    inicios_py = inicios[:amostra].tolist()  # datetime.datetime
+    fins_py = fins[:amostra].tolist()
+    t = time.perf_counter()
+    escalar = [AluguelController.calcula_valor_extra(a, b) for a, b in zip(inicios_py, fins_py)]
+    tempo_amostra = time.perf_counter() - t
+    tempo_escalar = tempo_amostra * args.alugueis / amostra
+
+    iguais = bool(np.array_equal(valores[:amostra], np.array(escalar, dtype=np.int64)))
+    print(f"aluguéis:            {args.alugueis:,}")
+    print(f"vetorizado:          {tempo_vetorizado:.2f} s ({args.alugueis / tempo_vetorizado / 1e6:.1f} M/s)")
+    print(f"escalar (estimado):  {tempo_escalar:.2f} s (medido em {amostra:,} aluguéis)")
+    print(f"ganho:               {tempo_escalar / tempo_vetorizado:.0f}x")
+    print(f"resultados idênticos na amostra: {iguais}")
+    if not iguais:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
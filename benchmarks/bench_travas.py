@@ -0,0 +1,138 @@
+"""
+Disputa nas travas do aluguel: trava global contra travas por chave com listras (src/services/travas.py).
+
+Cada requisição simulada pega a trava da sua chave (ciclista) e segura por --latencia-ms, o tempo das
+chamadas ao equipamento e ao pagamento dentro da seção crítica. As chaves são sorteadas entre --chaves
+ciclistas; com --chaves 1 todas disputam a mesma. Para cada esquema mostra duração total, vazão, espera
+p50/p99 e "sobreposições": vezes em que duas requisições da mesma chave estavam na seção crítica ao
+mesmo tempo (o aluguel duplo). Sem trava elas aparecem; com trava devem ser zero.
+
+    python benchmarks/bench_travas.py --requisicoes 2000 --concorrencia 200 --chaves 5000 --latencia-ms 20
+    python benchmarks/bench_travas.py --modo threads --concorrencia 32 --chaves 1
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, asynccontextmanager, contextmanager
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from src.services.travas import TravasPorChave, TravasPorChaveAsync  # noqa: E402
+
+
+class _Global:
+    """Uma trava só para tudo: o que seria um lock no serviço inteiro."""
+    def __init__(self, fabrica):
+        self.trava = fabrica()
+
+    @asynccontextmanager
+    async def travar_async(self, *chaves):
+        async with self.trava:
+            yield
+
+    @contextmanager
+    def travar(self, *chaves):
+        with self.trava:
+            yield
+
+
+class _Sem:
+    @asynccontextmanager
+    async def travar_async(self, *chaves):
+        yield
+
+    def travar(self, *chaves):
+        return nullcontext()
+
+
+def esquemas(modo: str) -> dict:
+    if modo == "async":
+        return {"sem trava": _Sem().travar_async, "global": _Global(asyncio.Lock).travar_async,
+                "listras": TravasPorChaveAsync().travar}
+    return {"sem trava": _Sem().travar, "global": _Global(threading.Lock).travar, "listras": TravasPorChave().travar}
+
+
+def resumo(duracao: float, esperas: list, sobreposicoes: int) -> dict:
+    esperas.sort()
+    return {"duracao_s": duracao, "vazao": len(esperas) / duracao,
+            "espera_p50_ms": statistics.median(esperas) * 1000,
+            "espera_p99_ms": esperas[int(len(esperas) * 0.99) - 1] * 1000, "sobreposicoes": sobreposicoes}
+
+
+async def rodar_async(travar, chaves: list, concorrencia: int, latencia: float) -> dict:
+    ativos, sobreposicoes, esperas = Counter(), [0], []
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def requisicao(chave):
+        async with semaforo:
+            inicio = time.perf_counter()
+            async with travar(("ciclista", chave)):
+                esperas.append(time.perf_counter() - inicio)
+                ativos[chave] += 1
+                if ativos[chave] > 1:
+                    sobreposicoes[0] += 1
+                await asyncio.sleep(latencia)
+                ativos[chave] -= 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(requisicao(chave) for chave in chaves))
+    return resumo(time.perf_counter() - inicio, esperas, sobreposicoes[0])
+
+
+def rodar_threads(travar, chaves: list, concorrencia: int, latencia: float) -> dict:
+    ativos, sobreposicoes, esperas = Counter(), [0], []
+    contador = threading.Lock()
+
+    def requisicao(chave):
+        inicio = time.perf_counter()
+        with travar(("ciclista", chave)):
+            esperas.append(time.perf_counter() - inicio)
+            with contador:
+                ativos[chave] += 1
+                if ativos[chave] > 1:
+                    sobreposicoes[0] += 1
+            time.sleep(latencia)
+            with contador:
+                ativos[chave] -= 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        list(executor.map(requisicao, chaves))
+    return resumo(time.perf_counter() - inicio, esperas, sobreposicoes[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=("async", "threads"), default="async")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=200)
+    parser.add_argument("--chaves", type=int, default=5000, help="ciclistas distintos sorteados (1 = todos iguais)")
+    parser.add_argument("--latencia-ms", type=float, default=20, help="tempo dentro da seção crítica")
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.semente)
+    chaves = [random.randrange(args.chaves) for _ in range(args.requisicoes)]
+    latencia = args.latencia_ms / 1000
+
+    print(f"{'esquema':<10} {'duração s':>10} {'req/s':>8} {'espera p50 ms':>14} {'espera p99 ms':>14} "
+          f"{'sobreposições':>14}")
+    for nome, travar in esquemas(args.modo).items():
+        if args.modo == "async":
+            r = asyncio.run(rodar_async(travar, chaves, args.concorrencia, latencia))
+        else:
+            r = rodar_threads(travar, chaves, args.concorrencia, latencia)
+        print(f"{nome:<10} {r['duracao_s']:>10.2f} {r['vazao']:>8.0f} {r['espera_p50_ms']:>14.2f} "
+              f"{r['espera_p99_ms']:>14.2f} {r['sobreposicoes']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Teste de carga do app com os serviços externos simulados (benchmarks/stubs.py).
+
+Sobe os stubs, cria e semeia um banco temporário na escala pedida, sobe o app com uvicorn apontando
+para tudo isso e dispara os cenários com concorrência fixa. Para cada rota informa vazão e latências
+p50/p95/p99, e grava o resultado em JSON (por padrão em benchmarks/resultados/<commit>.json) para
+comparar entre commits:
+
+    python benchmarks/carga.py --concorrencia 16 --duracao 20 --ciclistas 20000 --historico 200000
+    python benchmarks/carga.py --comparar benchmarks/resultados/abc1234.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from database import aplicar_migracoes  # noqa: E402
+
+CENARIOS = ("permiteAluguel", "aluguel_devolucao", "cadastro")
+TRANCA_BASE = 100_000
+
+
+def semear(caminho: str, ciclistas: int, historico: int):
+    """Banco do restaurar_banco.sql + migrações + `ciclistas` confirmados com cartão e `historico` aluguéis encerrados."""
+    conn = sqlite3.connect(caminho)
+    with open(os.path.join(RAIZ, "restaurar_banco.sql")) as f:
+        conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO ciclista (id, nome, email, nacionalidade, nascimento, senha, cpf, status) "
+        "VALUES (?, ?, ?, 'BRASILEIRO', '1990-01-01', 'x', '12345678901', 'CONFIRMADO')",
+        ((i, f"Carga {i}", f"carga{i}@example.com") for i in range(10, ciclistas + 10)),
+    )
+    conn.executemany(
+        "INSERT INTO cartao_credito (ciclista_id, numero, validade, cvv, nomeTitular) "
+        "VALUES (?, '4539620659922097', '2030-12-01', '132', 'Carga')",
+        ((i,) for i in range(10, ciclistas + 10)),
+    )
+    inicio = datetime.datetime(2023, 1, 1)
+    conn.executemany(
+        "INSERT INTO aluguel (ciclista_id, horaInicio, horaFim, trancaInicio, trancaFim, cobranca, bicicleta) "
+        "VALUES (?, ?, ?, 1, 2, 1, ?)",
+        ((random.randint(10, ciclistas + 9), (inicio + datetime.timedelta(minutes=i)).isoformat(" "),
+          (inicio + datetime.timedelta(minutes=i + 20)).isoformat(" "), random.randint(1, 5000))
+         for i in range(historico)),
+    )
+    conn.commit()
+    conn.close()
+    aplicar_migracoes(create_engine(f"sqlite:///{caminho}"))
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def subir_app(porta: int, env: dict, workers: int) -> subprocess.Popen:
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=RAIZ, env={**os.environ, **env},
+    )
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            if httpx.get(f"http://127.0.0.1:{porta}/docs", timeout=1).status_code == 200:
+                return processo
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError("app não subiu em 30s")
+
+
+class Coletor:
+    def __init__(self):
+        self.amostras = {}  # rota -> lista de (latência em s, status)
+        self.lock = threading.Lock()
+
+    def medir(self, rota: str, funcao):
+        inicio = time.perf_counter()
+        try:
+            status = funcao().status_code
+        except httpx.HTTPError:
+            status = 0
+        with self.lock:
+            self.amostras.setdefault(rota, []).append((time.perf_counter() - inicio, status))
+        return status
+
+
+def usuario(cenario: str, cliente: httpx.Client, coletor: Coletor, indice: int, ciclistas: int, fim: float):
+    # cada usuário virtual tem seu ciclista, sua bicicleta e seu par de trancas, para não disputar
+    # o mesmo aluguel; a cada ciclo a bicicleta volta para a outra tranca. Os ids começam em
+    # TRANCA_BASE para não esbarrar nos aluguéis em aberto do restaurar_banco.sql
+    id_ciclista = 10 + indice
+    bicicleta = tranca_ocupada = TRANCA_BASE + 2 * indice + 1
+    tranca_livre = TRANCA_BASE + 2 * indice + 2
+    sequencia = 0
+    while time.time() < fim:
+        sequencia += 1
+        if cenario == "permiteAluguel":
+            id_aleatorio = random.randint(10, ciclistas + 9)
+            coletor.medir("GET /ciclista/{id}/permiteAluguel",
+                          lambda: cliente.get(f"/ciclista/{id_aleatorio}/permiteAluguel"))
+        elif cenario == "aluguel_devolucao":
+            coletor.medir("POST /aluguel", lambda: cliente.post(
+                "/aluguel", json={"ciclista": id_ciclista, "trancaInicio": tranca_ocupada}))
+            coletor.medir("POST /devolucao", lambda: cliente.post(
+                "/devolucao", json={"idTranca": tranca_livre, "idBicicleta": bicicleta}))
+            tranca_ocupada, tranca_livre = tranca_livre, tranca_ocupada
+        elif cenario == "cadastro":
+            email = f"novo-{indice}-{sequencia}-{time.time_ns()}@example.com"
+            coletor.medir("POST /ciclista", lambda: cliente.post("/ciclista", json={
+                "ciclista": {"nome": "Novo", "email": email, "nacionalidade": "BRASILEIRO",
+                             "nascimento": "1990-01-01", "senha": "x", "cpf": "12345678901",
+                             "urlFotoDocumento": "https://example.com/doc.png"},
+                "meioDePagamento": {"numero": "4539620659922097", "validade": "2030-12-01", "cvv": "132",
+                                    "nomeTitular": "Novo"},
+            }))
+
+
+def rodar_cenario(cenario: str, url: str, concorrencia: int, duracao: float, ciclistas: int) -> dict:
+    coletor = Coletor()
+    fim = time.time() + duracao
+    limites = httpx.Limits(max_connections=concorrencia)
+    with httpx.Client(base_url=url, limits=limites, timeout=30) as cliente:
+        threads = [threading.Thread(target=usuario, args=(cenario, cliente, coletor, i, ciclistas, fim))
+                   for i in range(concorrencia)]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        decorrido = time.perf_counter() - inicio
+
+    resultado = {}
+    for rota, amostras in coletor.amostras.items():
+        latencias = np.array([a[0] for a in amostras]) * 1000
+        erros = sum(1 for a in amostras if not 200 <= a[1] < 300)
+        p50, p95, p99 = np.percentile(latencias, [50, 95, 99])
+        resultado[rota] = {"requisicoes": len(amostras), "erros": erros, "rps": len(amostras) / decorrido,
+                           "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+    return resultado
+
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def imprimir(resultados: dict, anterior: dict = None):
+    print(f"{'rota':<36} {'req':>7} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for rota, r in resultados.items():
+        linha = (f"{rota:<36} {r['requisicoes']:>7} {r['erros']:>6} {r['rps']:>8.1f} "
+                 f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+        if anterior and rota in anterior:
+            a = anterior[rota]
+            delta_rps = (r["rps"] / a["rps"] - 1) * 100 if a["rps"] else 0.0
+            delta_p99 = (r["p99_ms"] / a["p99_ms"] - 1) * 100 if a["p99_ms"] else 0.0
+            alerta = "  <- regressão" if delta_rps < -10 or delta_p99 > 10 else ""
+            linha += f"   (req/s {delta_rps:+.0f}%, p99 {delta_p99:+.0f}%){alerta}"
+        print(linha)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cenarios", nargs="+", default=list(CENARIOS), choices=CENARIOS)
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=15, help="segundos por cenário")
+    parser.add_argument("--ciclistas", type=int, default=10_000)
+    parser.add_argument("--historico", type=int, default=100_000, help="aluguéis encerrados no banco semeado")
+    parser.add_argument("--workers", type=int, default=1, help="workers do uvicorn")
+    parser.add_argument("--latencia-ms", type=float, default=10, help="latência dos serviços simulados")
+    parser.add_argument("--erro", type=float, default=0.0, help="taxa de erro dos serviços simulados")
+    parser.add_argument("--saida", help="arquivo JSON do resultado (padrão: benchmarks/resultados/<commit>.json)")
+    parser.add_argument("--comparar", help="resultado JSON anterior para comparação")
+    args = parser.parse_args()
+    if args.concorrencia > args.ciclistas:
+        parser.error("--concorrencia não pode passar de --ciclistas")
+
+    externo, _ = stubs.iniciar(stubs.rotas_externo, latencia_ms=args.latencia_ms, erro=args.erro)
+    equipamento, _ = stubs.iniciar(stubs.rotas_equipamento, latencia_ms=args.latencia_ms, erro=args.erro)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        banco = os.path.join(tmp, "carga.db")
+        print(f"semeando {args.ciclistas} ciclistas e {args.historico} aluguéis...")
+        semear(banco, args.ciclistas, args.historico)
+        porta = porta_livre()
+        app = subir_app(porta, {
+            "DATABASE_URL": f"sqlite:///{banco}",
+            "URL_EXTERNO": f"http://127.0.0.1:{externo.server_port}",
+            "URL_EQUIPAMENTO": f"http://127.0.0.1:{equipamento.server_port}",
+        }, args.workers)
+        try:
+            resultados = {}
+            for cenario in args.cenarios:
+                print(f"cenário {cenario}: {args.concorrencia} usuários por {args.duracao:.0f}s")
+                resultados.update(rodar_cenario(cenario, f"http://127.0.0.1:{porta}", args.concorrencia,
+                                                args.duracao, args.ciclistas))
+        finally:
+            app.terminate()
+            app.wait(timeout=10)
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)["resultados"]
+    imprimir(resultados, anterior)
+
+    commit = commit_atual()
+    saida = args.saida or os.path.join(RAIZ, "benchmarks", "resultados", f"{commit}.json")
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    with open(saida, "w") as f:
+        json.dump({
+            "commit": commit,
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "config": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+            "resultados": resultados,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"resultado gravado em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Tempo de subida do worker: perfil de import do main.py e partida a frio até a primeira requisição atendida.
+
+1. Import: roda `python -X importtime -c "import main"` em processos novos e soma, por módulo, o tempo
+   acumulado (mediana das repetições). Mostra os módulos mais caros, do projeto e de terceiros.
+2. Partida a frio: sobe o uvicorn num banco semeado e mede do início do processo até o primeiro
+   GET /ciclista/{id} com resposta 200 (import + lifespan + primeira consulta).
+
+Com --orcamento-import-ms / --orcamento-partida-ms o script sai com código 1 se a mediana passar do
+orçamento, para rodar na CI. O resultado vai para benchmarks/resultados/partida-<commit>.json:
+
+    python benchmarks/partida.py --repeticoes 7 --orcamento-import-ms 900 --orcamento-partida-ms 2500
+    python benchmarks/partida.py --comparar benchmarks/resultados/partida-abc1234.json
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from carga import semear, porta_livre, commit_atual  # noqa: E402
+
+# prefixos do próprio projeto no relatório de import
+MODULOS_PROJETO = ("main", "database", "src")
+
+
+def ambiente(banco: str) -> dict:
+    # URLs que nunca são chamadas: a subida só cria os pools, não fala com os serviços
+    return {**os.environ, "DATABASE_URL": f"sqlite:///{banco}", "URL_EXTERNO": "http://127.0.0.1:9",
+            "URL_EQUIPAMENTO": "http://127.0.0.1:9"}
+
+
+def perfil_import(banco: str) -> dict:
+    """Tempo acumulado (ms) de cada módulo importado por `import main`, num processo novo."""
+    saida = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=RAIZ,
+                           env=ambiente(banco), capture_output=True, text=True, check=True).stderr
+    tempos = {}
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, modulo = linha[len("import time:"):].split("|")
+        tempos[modulo.strip()] = int(acumulado) / 1000
+    return tempos
+
+
+def partida_fria(banco: str, id_ciclista: int) -> float:
+    """Milissegundos do Popen até o primeiro GET /ciclista/{id} com 200."""
+    porta = porta_livre()
+    # cliente criado antes e tentativas espaçadas: a sondagem não pode roubar CPU do worker subindo
+    cliente = httpx.Client(base_url=f"http://127.0.0.1:{porta}", timeout=1)
+    inicio = time.perf_counter()
+    processo = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta),
+                                 "--log-level", "warning"], cwd=RAIZ, env=ambiente(banco))
+    try:
+        limite = time.time() + 30
+        while time.time() < limite:
+            try:
+                if cliente.get(f"/ciclista/{id_ciclista}").status_code == 200:
+                    return (time.perf_counter() - inicio) * 1000
+            except httpx.HTTPError:
+                time.sleep(0.02)
+        raise RuntimeError("app não subiu em 30s")
+    finally:
+        cliente.close()
+        processo.terminate()
+        processo.wait(timeout=10)
+
+
+def imprimir(resultado: dict, anterior: dict = None, top: int = 15):
+    def delta(chave):
+        if not anterior or not anterior.get(chave):
+            return ""
+        return f"   ({(resultado[chave] / anterior[chave] - 1) * 100:+.0f}%)"
+
+    print(f"import main:   mediana {resultado['import_ms']:8.1f} ms{delta('import_ms')}")
+    print(f"partida a frio: mediana {resultado['partida_ms']:8.1f} ms{delta('partida_ms')}")
+    print(f"\n{'módulo (acumulado)':<48} {'ms':>8}")
+    for modulo, ms in list(resultado["modulos"].items())[:top]:
+        projeto = "  *" if modulo.split(".")[0] in MODULOS_PROJETO else ""
+        print(f"{modulo:<48} {ms:>8.1f}{projeto}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--ciclistas", type=int, default=10_000, help="ciclistas no banco semeado")
+    parser.add_argument("--top", type=int, default=15, help="módulos listados no perfil de import")
+    parser.add_argument("--orcamento-import-ms", type=float, help="falha se a mediana do import passar disso")
+    parser.add_argument("--orcamento-partida-ms", type=float, help="falha se a mediana da partida passar disso")
+    parser.add_argument("--saida", help="arquivo JSON do resultado (padrão: benchmarks/resultados/partida-<commit>.json)")
+    parser.add_argument("--comparar", help="resultado JSON anterior para comparação")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        banco = os.path.join(tmp, "partida.db")
+        semear(banco, args.ciclistas, 0)
+        perfil_import(banco)  # aquece o cache de bytecode (.pyc), que não é custo de cada worker
+        perfis = [perfil_import(banco) for _ in range(args.repeticoes)]
+        partidas = [partida_fria(banco, 10) for _ in range(args.repeticoes)]
+
+    modulos = {m: statistics.median(p.get(m, 0.0) for p in perfis) for m in perfis[0]}
+    # só os módulos "de topo" de cada pacote, senão o relatório fica cheio de submódulos internos
+    modulos = {m: ms for m, ms in modulos.items()
+               if m.split(".")[0] in MODULOS_PROJETO or "." not in m}
+    resultado = {
+        "import_ms": modulos.pop("main"),
+        "partida_ms": statistics.median(partidas),
+        "modulos": dict(sorted(modulos.items(), key=lambda item: -item[1])),
+    }
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar) as f:
+            anterior = json.load(f)["resultados"]
+    imprimir(resultado, anterior, args.top)
+
+    commit = commit_atual()
+    saida = args.saida or os.path.join(RAIZ, "benchmarks", "resultados", f"partida-{commit}.json")
+    os.makedirs(os.path.dirname(saida), exist_ok=True)
+    with open(saida, "w") as f:
+        json.dump({
+            "commit": commit,
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "config": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar")},
+            "resultados": resultado,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nresultado gravado em {saida}")
+
+    estourou = []
+    if args.orcamento_import_ms and resultado["import_ms"] > args.orcamento_import_ms:
+        estourou.append(f"import {resultado['import_ms']:.0f} ms > {args.orcamento_import_ms:.0f} ms")
+    if args.orcamento_partida_ms and resultado["partida_ms"] > args.orcamento_partida_ms:
+        estourou.append(f"partida {resultado['partida_ms']:.0f} ms > {args.orcamento_partida_ms:.0f} ms")
+    if estourou:
+        print("orçamento de subida estourado: " + "; ".join(estourou))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Servidores falsos dos serviços externo (email, cartão, cobrança) e equipamento (trancas e bicicletas),
+com latência e taxa de erro configuráveis. Usados pelos benchmarks; também rodam sozinhos:
+
+    python benchmarks/stubs.py --porta-externo 8001 --porta-equipamento 8002 --latencia-ms 20 --erro 0.01
+
+O equipamento guarda estado: no início as trancas de id ímpar estão OCUPADAS (com a bicicleta de
+mesmo número) e as pares DISPONÍVEIS; destrancar libera a tranca e põe a bicicleta EM_USO, trancar faz
+o contrário. Assim um par (tranca ímpar, tranca par) serve para ciclos aluguel -> devolução alternando
+as trancas. Bicicletas nunca vistas são tratadas como EM_USO. GET /tranca e GET /bicicleta listam as
+trancas e bicicletas já vistas (carga completa do espelho do equipamento).
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class ConfigStub:
+    def __init__(self, latencia_ms: float = 0.0, erro: float = 0.0):
+        self.latencia_ms = latencia_ms
+        self.erro = erro  # fração das requisições que responde 500
+        self.contador = itertools.count(1)
+        self.requisicoes = 0
+
+
+def _bicicleta(numero: int, status: str) -> dict:
+    return {"id": numero, "numero": numero, "marca": "Caloi", "modelo": "Urbana", "ano": "2023", "status": status}
+
+
+def _handler(config: ConfigStub, rotas):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, como o serviço real
+        # cabeçalho e corpo num envio só: em dois, Nagle + ACK atrasado do cliente somam ~40 ms por resposta
+        wbufsize = 64 * 1024
+
+        def log_message(self, *args):
+            pass
+
+        def _responder(self, codigo: int, corpo):
+            dados = json.dumps(corpo).encode()
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def _tratar(self, metodo: str):
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            corpo = json.loads(self.rfile.read(tamanho) or b"null")
+            config.requisicoes += 1
+            if config.latencia_ms:
+                time.sleep(config.latencia_ms / 1000)
+            if config.erro and random.random() < config.erro:
+                return self._responder(500, {"erro": "falha simulada"})
+            codigo, resposta = rotas(metodo, self.path.strip("/").split("/"), corpo)
+            self._responder(codigo, resposta)
+
+        def do_GET(self):
+            self._tratar("GET")
+
+        def do_POST(self):
+            self._tratar("POST")
+
+    return Handler
+
+
+def rotas_externo(config: ConfigStub):
+    def rotas(metodo, partes, corpo):
+        if metodo == "POST" and partes[0] in ("enviarEmail", "validaCartaoDeCredito"):
+            return 200, {}
+        if metodo == "POST" and partes[0] in ("cobranca", "filaCobranca"):
+            if isinstance(corpo, list):
+                return 200, [{"id": next(config.contador), **c} for c in corpo]
+            return 200, {"id": next(config.contador), **corpo}
+        return 404, {}
+    return rotas
+
+
+def rotas_equipamento(config: ConfigStub):
+    trancas = {}  # id -> número da bicicleta presa, ou None
+    status_bicicletas = {}
+    lock = threading.Lock()
+
+    def bicicleta_na_tranca(id_tranca):
+        if id_tranca not in trancas:
+            trancas[id_tranca] = id_tranca if id_tranca % 2 else None
+        return trancas[id_tranca]
+
+    def rotas(metodo, partes, corpo):
+        with lock:
+            if metodo == "GET" and partes == ["tranca"]:
+                return 200, [{"id": id_tranca, "status": "OCUPADA" if numero else "DISPONIVEL", "bicicleta": numero}
+                             for id_tranca, numero in trancas.items()]
+            if metodo == "GET" and partes == ["bicicleta"]:
+                numeros = {numero for numero in trancas.values() if numero} | set(status_bicicletas)
+                return 200, [_bicicleta(numero, status_bicicletas.get(numero, "EM_USO")) for numero in numeros]
+            if partes[0] == "tranca" and len(partes) >= 2:
+                id_tranca = int(partes[1])
+                numero = bicicleta_na_tranca(id_tranca)
+                if metodo == "GET" and len(partes) == 2:
+                    return 200, {"tranca": {"id": id_tranca, "status": "OCUPADA" if numero else "DISPONIVEL"}}
+                if metodo == "GET" and partes[2] == "bicicleta":
+                    if numero is None:
+                        return 404, {}
+                    return 200, {"bicicleta": _bicicleta(numero, status_bicicletas.get(numero, "DISPONIVEL"))}
+                if metodo == "POST" and partes[2] == "destrancar":
+                    trancas[id_tranca] = None
+                    status_bicicletas[corpo["bicicleta"]] = "EM_USO"
+                    return 200, {"tranca": {"id": id_tranca, "status": "DISPONIVEL"}}
+                if metodo == "POST" and partes[2] == "trancar":
+                    trancas[id_tranca] = corpo["bicicleta"]
+                    status_bicicletas[corpo["bicicleta"]] = "DISPONIVEL"
+                    return 200, {"tranca": {"id": id_tranca, "status": "OCUPADA"}}
+            if metodo == "GET" and partes[0] == "bicicleta" and len(partes) == 2:
+                numero = int(partes[1])
+                return 200, {"bicicleta": _bicicleta(numero, status_bicicletas.get(numero, "EM_USO"))}
+        return 404, {}
+    return rotas
+
+
+def iniciar(rotas_fabrica, porta: int = 0, latencia_ms: float = 0.0, erro: float = 0.0):
+    """Sobe um stub numa thread. Retorna (servidor, config); a porta real fica em servidor.server_port."""
+    config = ConfigStub(latencia_ms, erro)
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), _handler(config, rotas_fabrica(config)))
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta-externo", type=int, default=8001)
+    parser.add_argument("--porta-equipamento", type=int, default=8002)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--erro", type=float, default=0.0)
+    args = parser.parse_args()
+    iniciar(rotas_externo, args.porta_externo, args.latencia_ms, args.erro)
+    iniciar(rotas_equipamento, args.porta_equipamento, args.latencia_ms, args.erro)
+    print(f"externo em http://127.0.0.1:{args.porta_externo}, equipamento em http://127.0.0.1:{args.porta_equipamento}")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,196 @@
-from sqlalchemy import create_engine
+import os
+import sqlite3
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
+from src.metricas import (instrumentar_engine, QueuePoolMedido, AsyncQueuePoolMedido, QueuePoolLeituraMedido,
+                          AsyncQueuePoolLeituraMedido)
 
 # URL do banco de dados
-DATABASE_URL = "sqlite:///./banco_de_dados.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./banco_de_dados.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})  # `check_same_thread`
+# Perfil de ajuste do SQLite aplicado em cada conexão nova.
+# "legado" mantém o comportamento antigo (rollback journal, sem busy_timeout);
+# "wal" permite leitores simultâneos a um escritor e espera o lock em vez de falhar na hora.
+PERFIS_SQLITE = {
+    "legado": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",  # seguro com WAL: só perde o último commit numa queda de energia
+        "busy_timeout": 5000,  # ms
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negativo = KiB, ou seja 64 MiB por conexão
+        "temp_store": "MEMORY",
+    },
+}
+DB_PERFIL = os.getenv("DB_PERFIL", "wal")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+
+# Engine separado, só de leitura, para as rotas que não escrevem (get_read_db / get_async_read_db no main):
+# "principal": conexões somente leitura (mode=ro) no próprio arquivo. Com WAL, leitores não esperam escritores
+#   e enxergam todo commit já feito;
+# "replica": cópia do banco em DB_REPLICA_CAMINHO, refeita periodicamente pela ReplicaLeitura. Tira as leituras
+#   do arquivo principal, mas elas podem ver dados atrasados em até DB_REPLICA_INTERVALO segundos;
+# "desligado": leituras usam o engine de escrita (comportamento antigo).
+DB_LEITURA_MODO = os.getenv("DB_LEITURA_MODO", "principal")
+DB_REPLICA_CAMINHO = os.getenv("DB_REPLICA_CAMINHO")  # padrão: <banco>-replica.db, ao lado do principal
+DB_LEITURA_POOL_SIZE = int(os.getenv("DB_LEITURA_POOL_SIZE", DB_POOL_SIZE))
+
+
+def pragmas_do_perfil(perfil: str = DB_PERFIL) -> dict:
+    """
+    Pragmas do perfil, com sobrescritas por variável de ambiente (DB_BUSY_TIMEOUT, DB_MMAP_SIZE, DB_CACHE_SIZE...).
+    """
+    pragmas = dict(PERFIS_SQLITE[perfil])
+    for nome in ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "temp_store"):
+        valor = os.getenv(f"DB_{nome.upper()}")
+        if valor is not None:
+            pragmas[nome] = valor
+    return pragmas
+
+
+def pragmas_somente_leitura(pragmas: dict) -> dict:
+    """Tira os pragmas que mudam o arquivo (journal_mode, synchronous) e liga o query_only por garantia."""
+    leitura = {nome: valor for nome, valor in pragmas.items() if nome not in ("journal_mode", "synchronous")}
+    leitura["query_only"] = 1
+    return leitura
+
+
+def arquivo_banco(url: str = DATABASE_URL) -> str | None:
+    """Caminho absoluto do arquivo SQLite da URL, ou None (banco em memória ou outro SGBD)."""
+    url_banco = make_url(url)
+    if not url_banco.drivername.startswith("sqlite") or url_banco.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url_banco.database)
+
+
+def arquivo_replica(url: str = DATABASE_URL) -> str | None:
+    principal = arquivo_banco(url)
+    if DB_REPLICA_CAMINHO or principal is None:
+        return DB_REPLICA_CAMINHO
+    return f"{os.path.splitext(principal)[0]}-replica.db"
+
+
+def url_leitura(url: str = DATABASE_URL, modo: str = DB_LEITURA_MODO) -> str | None:
+    """
+    URL somente leitura (URI do SQLite com mode=ro) do banco principal ou da réplica.
+    None quando as leituras ficam no engine de escrita (modo "desligado", banco em memória ou outro SGBD).
+    """
+    if modo == "desligado" or arquivo_banco(url) is None:
+        return None
+    caminho = arquivo_replica(url) if modo == "replica" else arquivo_banco(url)
+    url_ro = make_url(url).set(database=f"file:{caminho}", query={"mode": "ro", "uri": "true"})
+    return url_ro.render_as_string(hide_password=False)
+
+
+def instalar_pragmas(engine_alvo, pragmas: dict):
+    """
+    Executa os pragmas toda vez que o pool abre uma conexão nova.
+    """
+    @event.listens_for(engine_alvo, "connect")
+    def _aplicar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nome} = {valor}")
+        cursor.close()
+
+
+def criar_engine(url: str = DATABASE_URL, perfil: str = DB_PERFIL, somente_leitura: bool = False, **kwargs):
+    kwargs.setdefault("pool_size", DB_LEITURA_POOL_SIZE if somente_leitura else DB_POOL_SIZE)
+    kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+    kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+    kwargs.setdefault("poolclass", QueuePoolLeituraMedido if somente_leitura else QueuePoolMedido)
+    novo_engine = create_engine(url, connect_args={"check_same_thread": False}, **kwargs)  # `check_same_thread`
+    pragmas = pragmas_do_perfil(perfil)
+    instalar_pragmas(novo_engine, pragmas_somente_leitura(pragmas) if somente_leitura else pragmas)
+    instrumentar_engine(novo_engine, "leitura" if somente_leitura else "sync")
+    return novo_engine
+
+
+def criar_async_engine(url: str = ASYNC_DATABASE_URL, perfil: str = DB_PERFIL, somente_leitura: bool = False,
+                       **kwargs):
+    kwargs.setdefault("pool_size", DB_LEITURA_POOL_SIZE if somente_leitura else DB_POOL_SIZE)
+    kwargs.setdefault("max_overflow", DB_MAX_OVERFLOW)
+    kwargs.setdefault("pool_timeout", DB_POOL_TIMEOUT)
+    kwargs.setdefault("poolclass", AsyncQueuePoolLeituraMedido if somente_leitura else AsyncQueuePoolMedido)
+    novo_engine = create_async_engine(url, **kwargs)
+    # eventos de conexão ficam no engine síncrono por baixo do async
+    pragmas = pragmas_do_perfil(perfil)
+    instalar_pragmas(novo_engine.sync_engine, pragmas_somente_leitura(pragmas) if somente_leitura else pragmas)
+    instrumentar_engine(novo_engine.sync_engine, "async_leitura" if somente_leitura else "async")
+    return novo_engine
+
+
+engine = criar_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# engine assíncrono (aiosqlite) para as rotas async (aluguel e leituras de ciclista, cartão e funcionário)
+async_engine = criar_async_engine()
+
+# expire_on_commit=False: em sessões async não dá para recarregar atributos de forma preguiçosa
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# engines só de leitura (ver DB_LEITURA_MODO); sem URL de leitura, as sessões de leitura usam os engines acima
+URL_LEITURA = url_leitura(DATABASE_URL)
+ASYNC_URL_LEITURA = url_leitura(ASYNC_DATABASE_URL)
+engine_leitura = criar_engine(URL_LEITURA, somente_leitura=True) if URL_LEITURA else engine
+async_engine_leitura = criar_async_engine(ASYNC_URL_LEITURA, somente_leitura=True) if ASYNC_URL_LEITURA else async_engine
+
+SessionLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
+AsyncSessionLeitura = async_sessionmaker(bind=async_engine_leitura, autoflush=False, expire_on_commit=False)
+
 # Base para os modelos
 Base = declarative_base()
+
+# Migrações versionadas: migrations/NNNN_descricao.sql, versão guardada no PRAGMA user_version
+MIGRACOES_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+MIGRACOES_ESPERA_MS = 60_000  # quanto um worker espera outro terminar as migrações
+
+
+def comandos_sql(script: str):
+    """Separa o script nos ";" que fecham comandos: os de dentro de um CREATE TRIGGER ... END ficam no comando."""
+    comando = ""
+    for trecho in script.split(";"):
+        comando += trecho + ";"
+        if sqlite3.complete_statement(comando):
+            if comando.strip().rstrip(";").strip():
+                yield comando
+            comando = ""
+
+
+def aplicar_migracoes(engine_alvo=None) -> int:
+    """
+    Aplica em ordem as migrações com número maior que a versão atual do banco, numa transação só.
+    A versão é lida depois do BEGIN IMMEDIATE: com dois workers subindo juntos, o segundo espera o
+    primeiro terminar e já encontra a versão nova. Nem toda migração pode rodar duas vezes (a 0008
+    recria a tabela aluguel), então essa trava é o que impede a aplicação em dobro.
+    :return: a versão do banco após as migrações
+    """
+    engine_alvo = engine_alvo or engine
+    arquivos = sorted(f for f in os.listdir(MIGRACOES_DIR) if f.endswith(".sql"))
+    with engine_alvo.connect() as conn:
+        # o perfil "legado" não tem busy_timeout: sem isso o segundo worker falharia em vez de esperar
+        espera_anterior = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        conn.exec_driver_sql(f"PRAGMA busy_timeout = {max(espera_anterior, MIGRACOES_ESPERA_MS)}")
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            versao = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            for arquivo in arquivos:
+                numero = int(arquivo.split("_", 1)[0])
+                if numero <= versao:
+                    continue
+                with open(os.path.join(MIGRACOES_DIR, arquivo), "r") as f:
+                    for comando in comandos_sql(f.read()):
+                        conn.exec_driver_sql(comando)
+                conn.exec_driver_sql(f"PRAGMA user_version = {numero}")
+                versao = numero
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.exec_driver_sql(f"PRAGMA busy_timeout = {espera_anterior}")
+            conn.commit()
+    return versao
@@ -1,21 +1,98 @@
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends, Body
-from fastapi.openapi.utils import status_code_ranges
+import hmac
+import json
+import httpx
+import requests
+from fastapi import FastAPI, HTTPException, Depends, Body, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
 from pydantic import ValidationError, EmailStr
 from sqlalchemy.orm import Session
-from starlette.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import JSONResponse, StreamingResponse, PlainTextResponse, FileResponse
 from typing import List
+import datetime
 from sqlalchemy import text
-from database import SessionLocal
+from database import (SessionLocal, AsyncSessionLocal, SessionLeitura, AsyncSessionLeitura, aplicar_migracoes, engine,
+                      MIGRACOES_DIR, DB_LEITURA_MODO, URL_LEITURA, arquivo_replica)
 from src.schemas import (NovoCiclista, Ciclista, NovoCartaoDeCredito, CartaoCredito, Funcionario,
-                         NovoFuncionario, NovoCiclistaPut, NovoFuncionarioPut, Bicicleta, Aluguel, Devolucao)
-from src.services import CiclistaService
+                         NovoFuncionario, NovoCiclistaPut, NovoFuncionarioPut, Bicicleta, Aluguel, Devolucao,
+                         ResultadoCadastroLote, EventosEquipamento)
+from src.services import (CiclistaService, CiclistaServiceAsync, DespachanteEmail, estatisticas_outbox,
+                          ConciliacaoService, RestauracaoBanco, RESTAURAR_MODO, GuardaIdempotencia,
+                          DespachanteCobranca, estatisticas_cobrancas_pendentes, indice_emails,
+                          RespostaRapida, SAIDA_RAPIDA, ReplicaLeitura, EscritorBanco, ESCRITOR_UNICO,
+                          travas_aluguel_async, espelho_equipamento, ESPELHO_TOKEN)
+from src.clients import (configurar_cliente, fechar_clientes, configurar_cliente_async, fechar_clientes_async,
+                         cache_equipamento, DependenciaIndisponivel, estado_dependencias)
+from src.metricas import (registro, MiddlewareMetricas, MiddlewarePerfil, PERFIL_ATIVO, PERFIL_TOKEN, listar_perfis, arquivo_perfil,
+                          relatorio_perfil)
 load_dotenv()
 URL_EXTERNO=os.getenv('URL_EXTERNO')
 URL_EQUIPAMENTO=os.getenv("URL_EQUIPAMENTO")
 
-app = FastAPI()
+POOL_EXTERNO = int(os.getenv("POOL_EXTERNO", 20))
+POOL_EQUIPAMENTO = int(os.getenv("POOL_EQUIPAMENTO", 20))
+
+# cópia periódica do banco para o engine de leitura, só no DB_LEITURA_MODO=replica
+replica = ReplicaLeitura(engine, arquivo_replica()) if DB_LEITURA_MODO == "replica" and URL_LEITURA else None
+
+# fila única de escrita com group commit: CiclistaService, aluguel/devolução async, Idempotency-Key e despachantes;
+# com ESCRITOR_UNICO=0 cada um commita na própria sessão
+escritor = EscritorBanco(SessionLocal) if ESCRITOR_UNICO else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pools de conexão por serviço, compartilhados por todas as instâncias de CiclistaService(Async)
+    configurar_cliente(URL_EXTERNO, tamanho_pool=POOL_EXTERNO)
+    configurar_cliente(URL_EQUIPAMENTO, tamanho_pool=POOL_EQUIPAMENTO)
+    configurar_cliente_async(URL_EXTERNO, tamanho_pool=POOL_EXTERNO)
+    configurar_cliente_async(URL_EQUIPAMENTO, tamanho_pool=POOL_EQUIPAMENTO)
+    aplicar_migracoes()
+    if replica:
+        replica.iniciar()
+    if escritor:
+        escritor.iniciar()
+    # estado de trancas e bicicletas para validar aluguel/devolução sem ir ao equipamento
+    espelho_equipamento.iniciar(SessionLocal, escritor, URL_EQUIPAMENTO)
+    # emails já cadastrados em memória para o /ciclista/existeEmail; até terminar, a resposta vem do banco
+    indice_emails.aquecer_em_segundo_plano(SessionLocal)
+    despachantes = []
+    if URL_EXTERNO:
+        despachantes = [DespachanteEmail(SessionLocal, URL_EXTERNO, escritor=escritor),
+                        DespachanteCobranca(SessionLocal, URL_EXTERNO, escritor=escritor)]
+        for despachante in despachantes:
+            despachante.iniciar()
+    yield
+    for despachante in despachantes:
+        despachante.parar()
+    espelho_equipamento.parar()
+    if escritor:
+        escritor.parar()
+    if replica:
+        replica.parar()
+    fechar_clientes()
+    await fechar_clientes_async()
+
+app = FastAPI(lifespan=lifespan)
+# latência por rota para o /metrics
+app.add_middleware(MiddlewareMetricas)
+# cProfile por requisição (X-Perfil-Token ou PERFIL_AMOSTRAGEM); sem configuração o middleware nem entra
+if PERFIL_ATIVO:
+    app.add_middleware(MiddlewarePerfil)
+
+# circuito aberto ou bulkhead cheio: falha rápida em vez de prender o worker esperando o serviço
+@app.exception_handler(DependenciaIndisponivel)
+async def dependencia_indisponivel(request: Request, erro: DependenciaIndisponivel):
+    headers = {"Retry-After": str(max(int(erro.tentar_em or 1), 1))}
+    return JSONResponse(status_code=503, content={"detail": str(erro)}, headers=headers)
+
+# o serviço não respondeu dentro do timeout da dependência
+@app.exception_handler(requests.Timeout)
+@app.exception_handler(httpx.TimeoutException)
+async def dependencia_sem_resposta(request: Request, erro: Exception):
+    return JSONResponse(status_code=504, content={"detail": "Serviço externo não respondeu a tempo."})
 
 # Dependency para injetar o banco de dados
 def get_db():
@@ -25,24 +102,44 @@ def get_db():
     finally:
         db.close()
 
-import os
+# Versão assíncrona (aiosqlite), para as rotas async: o aluguel e as leituras mais chamadas.
+# As outras rotas continuam no get_db e podem migrar uma a uma para o CiclistaServiceAsync.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
 
-@app.post("/restaurarBanco", status_code=200, tags=["Aluguel"], description="Banco restaurado.")
-def restaurar_banco(db: Session = Depends(get_db)):
-    sql_file_path = os.path.join(os.path.dirname(__file__), 'restaurar_banco.sql')
+# Sessões do engine somente leitura (ver DB_LEITURA_MODO no database.py), para rotas que não escrevem.
+# Não disputam conexões com o aluguel e um INSERT/UPDATE por engano falha em vez de gravar.
+def get_read_db():
+    db = SessionLeitura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db():
+    async with AsyncSessionLeitura() as db:
+        yield db
 
-    with open(sql_file_path, 'r') as file:
-        sql_commands = file.read()
+import os
+
+# banco dourado do restaurar_banco.sql, montado na primeira restauração
+restauracao = RestauracaoBanco(engine, os.path.join(os.path.dirname(__file__), 'restaurar_banco.sql'), MIGRACOES_DIR,
+                               aplicar_migracoes)
 
-    # Dividir o conteúdo em comandos separados por ponto e vírgula
-    sql_commands = sql_commands.split(';') # maluquice do sqlite
+@app.post("/restaurarBanco", status_code=200, tags=["Aluguel"], description="Banco restaurado.")
+def restaurar_banco(modo: str = Query(RESTAURAR_MODO, pattern="^(snapshot|sql)$",
+                                      description="snapshot: cópia do banco dourado; sql: roda o script"),
+                    db: Session = Depends(get_db)):
     try:
-        for command in sql_commands:
-            command = command.strip()
-            if command:
-                db.execute(text(command)) # peculiaridade do sqlalchemy
-        db.commit()
-        return {"message": "Banco restaurado com sucesso!"}
+        duracao = restauracao.restaurar(modo, db)
+        if replica:
+            replica.atualizar()
+        indice_emails.recarregar(db)
+        # estado do equipamento de antes da restauração; os outros workers percebem na próxima sincronia
+        espelho_equipamento.reiniciar()
+        cache_equipamento.limpar()
+        return {"message": "Banco restaurado com sucesso!", "modo": modo, "duracaoMs": round(duracao * 1000, 3)}
     except Exception as e:
         raise HTTPException(500, "Deu errado")
 
@@ -53,78 +150,137 @@ def cadastrar_ciclista(
     meioDePagamento: NovoCartaoDeCredito = Body(...),
     db: Session = Depends(get_db),
 ):
-    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO)
+    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO, escritor=escritor)
     try:
         novo_ciclista = ciclista_service.cadastrar_ciclista(ciclista, meioDePagamento)
         return novo_ciclista
     except ValidationError:
         raise HTTPException(status_code=422, detail="Parâmetros incorretos.")
+    except (DependenciaIndisponivel, requests.Timeout):
+        raise
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
 
+@app.post("/ciclista/lote", response_model=List[ResultadoCadastroLote], status_code=200, tags=["Aluguel"],
+          description="Cadastro em lote: array JSON ou NDJSON (application/x-ndjson) de {ciclista, meioDePagamento}.")
+async def cadastrar_ciclistas_em_lote(request: Request, db: Session = Depends(get_db)):
+    corpo = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            linhas = [json.loads(linha) for linha in corpo.splitlines() if linha.strip()]
+        else:
+            linhas = json.loads(corpo)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Corpo não é JSON/NDJSON válido.")
+    if not isinstance(linhas, list):
+        raise HTTPException(status_code=422, detail="Esperado um array de ciclistas.")
+
+    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO, escritor=escritor)
+    # validação de cartões e inserts são bloqueantes: roda fora do event loop
+    return await run_in_threadpool(ciclista_service.cadastrar_ciclistas_em_lote, linhas)
+
 @app.get("/ciclista/{idCiclista}", status_code=200, response_model=Ciclista, tags=["Aluguel"])
-def recupera_ciclista(
+async def recupera_ciclista(
         idCiclista: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_read_db)
 ):
-    ciclista_service = CiclistaService(db)
-    ciclista = ciclista_service.recupera_ciclista_por_id(idCiclista)
+    ciclista_service = CiclistaServiceAsync(db)
+    if SAIDA_RAPIDA:
+        dados = await ciclista_service.recupera_ciclista_resposta(idCiclista)
+        if dados is None:
+            raise HTTPException(status_code=404, detail="Ciclista não encontrado.")
+        return RespostaRapida(dados)
+    ciclista = await ciclista_service.recupera_ciclista_por_id(idCiclista, com_passaporte=True)
     if not ciclista:
         raise HTTPException(status_code=404, detail="Ciclista não encontrado.")
     return ciclista
 
 @app.put("/ciclista/{idCiclista}", response_model=Ciclista, status_code=200, tags=["Aluguel"])
 def atualizar_ciclista(idCiclista: int, ciclista: NovoCiclistaPut = Body(...), db: Session = Depends(get_db)):
-    service = CiclistaService(db, url_externo=URL_EXTERNO)
+    service = CiclistaService(db, url_externo=URL_EXTERNO, escritor=escritor)
     dados_atualizados = ciclista.model_dump(exclude_unset=True)  # Só inclui os campos que foram enviados
     ciclista_atualizado = service.atualizar_ciclista(idCiclista, dados_atualizados)
     return ciclista_atualizado
 
 @app.post("/ciclista/{idCiclista}/ativar", status_code=200, response_model=Ciclista, tags=["Aluguel"])
 def ativar_ciclista(idCiclista: int, db: Session = Depends(get_db)):
-    service = CiclistaService(db)
+    service = CiclistaService(db, escritor=escritor)
     ciclista = service.ativar_ciclista(idCiclista)
     return ciclista
 
+# fica no engine de escrita: com réplica, o "talvez" do índice de emails seria confirmado num banco atrasado
 @app.post("/ciclista/existeEmail/{email}", status_code=200, response_model=bool, tags=['Aluguel'])
-def conferir_email_ja_foi_utilizado(email: EmailStr, db: Session = Depends(get_db)):
-    service = CiclistaService(db)
-    return service.conferir_email_ja_foi_utilizado(email)
+async def conferir_email_ja_foi_utilizado(email: EmailStr, db: AsyncSession = Depends(get_async_db)):
+    service = CiclistaServiceAsync(db)
+    return await service.conferir_email_ja_foi_utilizado(email)
 
 @app.get("/ciclista/{idCiclista}/permiteAluguel", status_code=200, tags=['Aluguel'], response_model=bool)
-def ciclista_pode_alugar(idCiclista: int, db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO, url_equipamento=URL_EQUIPAMENTO)
-    resp = ciclista_service.ciclista_pode_alugar(idCiclista)
+async def ciclista_pode_alugar(idCiclista: int, db: AsyncSession = Depends(get_async_db)):
+    ciclista_service = CiclistaServiceAsync(db, url_externo=URL_EXTERNO, url_equipamento=URL_EQUIPAMENTO)
+    resp = await ciclista_service.ciclista_pode_alugar(idCiclista)
     return resp
 
 @app.get("/ciclista/{idCiclista}/bicicletaAlugada", status_code=200, tags=['Aluguel'], response_model=Bicicleta|None)
-def buscar_bicicleta_alugada_atualmente(idCiclista: int, db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db)
-    resp = ciclista_service.busca_bicicleta_alugada(idCiclista)
+async def buscar_bicicleta_alugada_atualmente(idCiclista: int, db: AsyncSession = Depends(get_async_read_db)):
+    ciclista_service = CiclistaServiceAsync(db, url_equipamento=URL_EQUIPAMENTO)
+    resp = await ciclista_service.busca_bicicleta_alugada(idCiclista)
     return resp
 
 @app.get("/cartaoDeCredito/{idCiclista}", status_code=200, response_model=CartaoCredito, tags=['Aluguel'])
-def busca_cartao(idCiclista:int, db: Session = Depends(get_db)):
-    service = CiclistaService(db)
-    cartao = service.busca_cartao(idCiclista)
+async def busca_cartao(idCiclista:int, db: AsyncSession = Depends(get_async_read_db)):
+    service = CiclistaServiceAsync(db)
+    if SAIDA_RAPIDA:
+        return RespostaRapida(await service.busca_cartao_resposta(idCiclista))
+    cartao = await service.busca_cartao(idCiclista)
     return cartao
 
 @app.put("/cartaoDeCredito/{idCiclista}", status_code=200, tags=['Aluguel'])
 def editar_cartao(idCiclista:int, cartao: NovoCartaoDeCredito = Body(...), db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO)
+    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO, escritor=escritor)
     ciclista_service.edita_cartao(idCiclista, cartao)
 
 @app.get("/funcionario", status_code=200, tags=['Aluguel'], response_model=List[Funcionario])
-def recupera_funcionarios(db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db)
-    return ciclista_service.recupera_funcionarios()
+async def recupera_funcionarios(
+        limit: int | None = Query(None, ge=1, le=1000, description="Tamanho da página."),
+        after: int | None = Query(None, description="Matrícula do último funcionário da página anterior."),
+        campos: str | None = Query(None, description="Campos separados por vírgula; a matrícula sempre vem."),
+        stream: bool = Query(False, description="Envia o JSON aos poucos, conforme as linhas saem do banco."),
+        db: AsyncSession = Depends(get_async_read_db),
+):
+    lista_campos = [c.strip() for c in campos.split(",") if c.strip()] if campos else None
+    # valida os campos antes de começar a responder
+    CiclistaService.consulta_funcionarios(limit, after, lista_campos)
+
+    if stream:
+        # o streaming continua no SessionLocal: o gerador síncrono roda no threadpool do Starlette
+        return StreamingResponse(_stream_funcionarios(limit, after, lista_campos), media_type="application/json")
+
+    funcionarios = await CiclistaServiceAsync(db).recupera_funcionarios(limit, after, lista_campos)
+    headers = {}
+    if limit is not None and len(funcionarios) == limit:
+        headers["X-Proximo-Cursor"] = str(funcionarios[-1]["matricula"])
+    # as linhas já vêm do banco no formato da resposta; não passa de novo pelo response_model
+    if SAIDA_RAPIDA:
+        return RespostaRapida(funcionarios, headers=headers)
+    return JSONResponse(funcionarios, headers=headers)
+
+def _stream_funcionarios(limit, after, campos):
+    # a sessão do Depends é fechada antes do corpo ser enviado, então o streaming abre a sua
+    db = SessionLeitura()
+    try:
+        yield "["
+        for i, funcionario in enumerate(CiclistaService(db).itera_funcionarios(limit, after, campos)):
+            yield ("," if i else "") + json.dumps(funcionario, ensure_ascii=False)
+        yield "]"
+    finally:
+        db.close()
 
 @app.post("/funcionario", response_model=Funcionario, status_code=200, tags=["Aluguel"])
 def cadastrar_funcionario(
     funcionario: NovoFuncionario = Body(...),
     db: Session = Depends(get_db),
 ):
-    ciclista_service = CiclistaService(db)
+    ciclista_service = CiclistaService(db, escritor=escritor)
     try:
         novo_funcionario = ciclista_service.cadastrar_funcionario(funcionario)
         return novo_funcionario
@@ -132,16 +288,21 @@ def cadastrar_funcionario(
         raise HTTPException(status_code=422, detail="Parâmetros incorretos.")
 
 @app.get("/funcionario/{idFuncionario}", response_model=Funcionario, status_code=200, tags=['Aluguel'])
-def recuperar_funcionario(idFuncionario: int, db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db)
-    funcionario = ciclista_service.recupera_funcionario(idFuncionario)
+async def recuperar_funcionario(idFuncionario: int, db: AsyncSession = Depends(get_async_read_db)):
+    ciclista_service = CiclistaServiceAsync(db)
+    if SAIDA_RAPIDA:
+        dados = await ciclista_service.recupera_funcionario_resposta(idFuncionario)
+        if dados is None:
+            raise HTTPException(status_code=404, detail='Funcionário não existe.')
+        return RespostaRapida(dados)
+    funcionario = await ciclista_service.recupera_funcionario(idFuncionario)
     if not funcionario:
         raise HTTPException(status_code=404, detail='Funcionário não existe.')
     return funcionario
 
 @app.put("/funcionario/{idFuncionario}", response_model=Funcionario, status_code=200, tags=["Aluguel"])
 def editar_funcionario(idFuncionario, novo_funcionario: NovoFuncionarioPut = Body(...), db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db)
+    ciclista_service = CiclistaService(db, escritor=escritor)
     dados_atualizados = novo_funcionario.model_dump(exclude_unset=True)  # Só inclui os campos que foram enviados
     funcionaro_atualizado = ciclista_service.editar_funcionario(idFuncionario, dados_atualizados)
     if not funcionaro_atualizado:
@@ -151,19 +312,143 @@ def editar_funcionario(idFuncionario, novo_funcionario: NovoFuncionarioPut = Bod
 @app.delete("/funcionario/{idFuncionario}", status_code=200, tags=["Aluguel"], response_model=None,
             response_description="Dados removidos.")
 def delete_funcionario(idFuncionario: int, db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db)
+    ciclista_service = CiclistaService(db, escritor=escritor)
     resultado = ciclista_service.delete_funcionario(idFuncionario)
     if not resultado:
         raise HTTPException(status_code=404, detail="Funcionário não encontrado")
 
+# respostas de /aluguel e /devolucao por Idempotency-Key: repetições do app não cobram nem destrancam de novo
+idempotencia = GuardaIdempotencia(AsyncSessionLocal, escritor=escritor)
+
 @app.post("/aluguel", status_code=200, response_model=Aluguel, tags=["Aluguel"])
-def realizar_aluguel(ciclista: int = Body(...), trancaInicio: int = Body(...), db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db, url_equipamento=URL_EQUIPAMENTO, url_externo=URL_EXTERNO)
-    resultado = ciclista_service.realizar_aluguel(ciclista, trancaInicio)
+async def realizar_aluguel(ciclista: int = Body(...), trancaInicio: int = Body(...),
+                          idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=250),
+                          db: AsyncSession = Depends(get_async_db)):
+    ciclista_service = CiclistaServiceAsync(db, url_equipamento=URL_EQUIPAMENTO, url_externo=URL_EXTERNO,
+                                            escritor=escritor)
+    resultado = await idempotencia.executar(
+        "/aluguel", idempotency_key, {"ciclista": ciclista, "trancaInicio": trancaInicio},
+        lambda: ciclista_service.realizar_aluguel(ciclista, trancaInicio))
     return resultado
 
 @app.post("/devolucao", status_code=200, response_model=Devolucao, tags=["Aluguel"])
-def realizar_devolucao(idTranca: int = Body(...), idBicicleta: int = Body(...), db: Session = Depends(get_db)):
-    ciclista_service = CiclistaService(db, url_externo=URL_EXTERNO, url_equipamento=URL_EQUIPAMENTO)
-    resp = ciclista_service.realizar_devolucao(idBicicleta, idTranca)
-    return resp
\ No newline at end of file
+async def realizar_devolucao(idTranca: int = Body(...), idBicicleta: int = Body(...),
+                            idempotency_key: str | None = Header(None, alias="Idempotency-Key", max_length=250),
+                            db: AsyncSession = Depends(get_async_db)):
+    ciclista_service = CiclistaServiceAsync(db, url_externo=URL_EXTERNO, url_equipamento=URL_EQUIPAMENTO,
+                                            escritor=escritor)
+    resp = await idempotencia.executar(
+        "/devolucao", idempotency_key, {"idTranca": idTranca, "idBicicleta": idBicicleta},
+        lambda: ciclista_service.realizar_devolucao(idBicicleta, idTranca))
+    return resp
+
+def token_confere(recebido: str | None, esperado: str | None) -> bool:
+    """Compara em tempo constante; sem token configurado nada confere."""
+    return bool(esperado) and recebido is not None and hmac.compare_digest(recebido.encode(), esperado.encode())
+
+# estado empurrado pelo equipamento (ou por quem o represente) para o espelho local do aluguel/devolução
+@app.post("/equipamento/eventos", status_code=200, tags=["Equipamento"],
+          description="Aplica estados de trancas e bicicletas; campos omitidos ficam como estavam. "
+                      "Exige X-Equipamento-Token igual a ESPELHO_TOKEN.")
+def receber_eventos_do_equipamento(eventos: EventosEquipamento = Body(...),
+                                   token: str | None = Header(None, alias="X-Equipamento-Token")):
+    # o aluguel confia nesse estado por ESPELHO_VALIDADE segundos: sem ESPELHO_TOKEN configurado, ninguém empurra
+    if not token_confere(token, ESPELHO_TOKEN):
+        raise HTTPException(status_code=401, detail="Token do equipamento inválido.")
+    return espelho_equipamento.aplicar([tranca.model_dump(exclude_unset=True) for tranca in eventos.trancas],
+                                       [bicicleta.model_dump(exclude_unset=True) for bicicleta in eventos.bicicletas])
+
+@app.post("/equipamento/ressincronizar", status_code=200, tags=["Admin"],
+          description="Carga completa de trancas e bicicletas do equipamento para o espelho, sem esperar o intervalo. "
+                      "Exige X-Equipamento-Token igual a ESPELHO_TOKEN.")
+def ressincronizar_espelho(token: str | None = Header(None, alias="X-Equipamento-Token")):
+    # dispara uma carga completa no equipamento: nunca anônimo, mesmo sem ESPELHO_TOKEN configurado
+    if not token_confere(token, ESPELHO_TOKEN):
+        raise HTTPException(status_code=401, detail="Token do equipamento inválido.")
+    if not URL_EQUIPAMENTO:
+        raise HTTPException(status_code=422, detail="URL_EQUIPAMENTO não configurada.")
+    try:
+        return espelho_equipamento.ressincronizar()
+    except requests.RequestException:
+        raise HTTPException(status_code=502, detail="Equipamento não respondeu à carga completa.")
+
+@app.get("/equipamento/espelho/estatisticas", status_code=200, tags=["Admin"],
+         description="Espelho do equipamento: registros, leituras atendidas localmente e cargas completas.")
+def estatisticas_do_espelho():
+    return espelho_equipamento.estatisticas()
+
+@app.get("/outbox/estatisticas", status_code=200, tags=["Admin"])
+def estatisticas_da_outbox(db: Session = Depends(get_read_db)):
+    return estatisticas_outbox(db)
+
+@app.get("/cobrancas/pendentes/estatisticas", status_code=200, tags=["Admin"],
+         description="Cobranças adiadas por falha do pagamento que ainda não chegaram ao /filaCobranca.")
+def estatisticas_das_cobrancas_pendentes(db: Session = Depends(get_read_db)):
+    return estatisticas_cobrancas_pendentes(db)
+
+@app.get("/escritor/estatisticas", status_code=200, tags=["Admin"],
+         description="Fila única de escrita: lotes gravados, unidades por commit e erros.")
+def estatisticas_do_escritor():
+    return escritor.estatisticas() if escritor else {"ativo": False}
+
+@app.get("/travas/estatisticas", status_code=200, tags=["Admin"],
+         description="Travas por chave do aluguel/devolução: aquisições e quantas esperaram outra requisição.")
+def estatisticas_das_travas():
+    return {"async": travas_aluguel_async.estatisticas()}
+
+@app.get("/cache/estatisticas", status_code=200, tags=["Admin"])
+def estatisticas_do_cache():
+    return cache_equipamento.estatisticas()
+
+@app.get("/ciclista/indiceEmails/estatisticas", status_code=200, tags=["Admin"])
+def estatisticas_do_indice_de_emails():
+    return indice_emails.estatisticas()
+
+@app.get("/banco/leitura/estado", status_code=200, tags=["Admin"],
+         description="Modo do engine de leitura e, com réplica, o atraso e a duração da última cópia.")
+def estado_do_banco_de_leitura():
+    return {"modo": DB_LEITURA_MODO if URL_LEITURA else "desligado",
+            "replica": replica.estatisticas() if replica else None}
+
+@app.get("/dependencias/estado", status_code=200, tags=["Admin"],
+         description="Timeouts, estado do circuit breaker e ocupação do bulkhead de cada serviço externo.")
+def estado_das_dependencias():
+    return estado_dependencias()
+
+@app.get("/metrics", tags=["Admin"], response_class=PlainTextResponse,
+         description="Métricas no formato texto do Prometheus: latência por rota, chamadas aos serviços, SQL e pool.")
+def metricas():
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# perfis mostram caminhos do código, nomes de funções e tempos: só com o mesmo token que os dispara
+def exigir_token_perfil(token: str | None = Header(None, alias="X-Perfil-Token")):
+    if not token_confere(token, PERFIL_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de perfil inválido.")
+
+@app.get("/perfis", status_code=200, tags=["Admin"], dependencies=[Depends(exigir_token_perfil)],
+         description="Perfis de requisição mais recentes: rota, duração, consultas SQL, chamadas HTTP e funções mais caras. "
+                     "Exige X-Perfil-Token igual a PERFIL_TOKEN.")
+def perfis_recentes(limite: int = Query(50, ge=1, le=1000)):
+    return {"ativo": PERFIL_ATIVO, "perfis": listar_perfis(limite)}
+
+@app.get("/perfis/{nome}", tags=["Admin"], response_class=PlainTextResponse, dependencies=[Depends(exigir_token_perfil)],
+         description="Relatório do pstats do perfil, ou o .prof (formato=prof) para abrir no snakeviz.")
+def perfil_da_requisicao(nome: str, formato: str = Query("texto", pattern="^(texto|prof)$"),
+                         ordenar: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+                         limite: int = Query(40, ge=1, le=1000)):
+    if formato == "prof":
+        caminho = arquivo_perfil(nome)
+        if caminho is None:
+            raise HTTPException(status_code=404, detail="Perfil não encontrado")
+        return FileResponse(caminho, media_type="application/octet-stream", filename=f"{nome}.prof")
+    relatorio = relatorio_perfil(nome, ordenar, limite)
+    if relatorio is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return PlainTextResponse(relatorio)
+
+@app.get("/relatorios/conciliacao", status_code=200, tags=["Admin"],
+         description="Recalcula as cobranças adicionais dos aluguéis encerrados no período e lista as divergências.")
+def relatorio_conciliacao(inicio: datetime.datetime | None = None, fim: datetime.datetime | None = None,
+                          limite: int = Query(1000, ge=0, description="Máximo de divergências listadas."),
+                          db: Session = Depends(get_read_db)):
+    return ConciliacaoService(db).conciliar(inicio, fim, max_divergencias=limite)
\ No newline at end of file
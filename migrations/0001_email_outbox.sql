@@ -0,0 +1,14 @@
+-- Tabela da outbox de emails (ver src/services/outbox_service.py)
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id integer NOT NULL CONSTRAINT email_outbox_pk PRIMARY KEY AUTOINCREMENT,
+    email varchar(250) NOT NULL,
+    assunto varchar(250) NOT NULL,
+    mensagem text NOT NULL,
+    status varchar(250) NOT NULL DEFAULT 'PENDENTE',
+    tentativas integer NOT NULL DEFAULT 0,
+    criadoEm datetime NOT NULL,
+    proximaTentativa datetime NOT NULL,
+    enviadoEm datetime,
+    ultimoErro varchar(250)
+);
+CREATE INDEX IF NOT EXISTS email_outbox_pendentes ON email_outbox (status, proximaTentativa);
@@ -0,0 +1,14 @@
+-- Índices parciais para as consultas de "aluguel em aberto".
+-- Só as linhas abertas entram no índice, então o tamanho dele não cresce com o histórico.
+
+-- ciclista_pode_alugar e busca_bicicleta_alugada: ciclista_id = ? AND horaFim IS NULL
+CREATE INDEX IF NOT EXISTS aluguel_ciclista_aberto ON aluguel (ciclista_id) WHERE horaFim IS NULL;
+
+-- realizar_aluguel: ciclista_id = ? AND trancaFim IS NULL
+CREATE INDEX IF NOT EXISTS aluguel_ciclista_tranca_aberta ON aluguel (ciclista_id) WHERE trancaFim IS NULL;
+
+-- realizar_devolucao: bicicleta = ? AND trancaFim IS NULL AND horaFim IS NULL
+CREATE INDEX IF NOT EXISTS aluguel_bicicleta_aberto ON aluguel (bicicleta) WHERE trancaFim IS NULL AND horaFim IS NULL;
+
+-- conferir_email_ja_foi_utilizado
+CREATE INDEX IF NOT EXISTS ciclista_email ON ciclista (email);
@@ -0,0 +1,13 @@
+-- Respostas guardadas por Idempotency-Key (ver src/services/idempotencia_service.py)
+CREATE TABLE IF NOT EXISTS idempotencia (
+    chave varchar(250) NOT NULL,
+    rota varchar(250) NOT NULL,
+    hashCorpo varchar(64) NOT NULL,
+    status varchar(250) NOT NULL DEFAULT 'EM_ANDAMENTO',
+    codigoHttp integer,
+    resposta text,
+    criadoEm datetime NOT NULL,
+    expiraEm datetime NOT NULL,
+    CONSTRAINT idempotencia_pk PRIMARY KEY (chave, rota)
+);
+CREATE INDEX IF NOT EXISTS idempotencia_expiracao ON idempotencia (expiraEm);
@@ -0,0 +1,18 @@
+-- Cobranças adiadas quando o serviço de pagamento falha (ver src/services/cobranca_pendente_service.py)
+CREATE TABLE IF NOT EXISTS cobranca_pendente (
+    id integer NOT NULL CONSTRAINT cobranca_pendente_pk PRIMARY KEY AUTOINCREMENT,
+    ciclista_id integer NOT NULL,
+    aluguel_id integer NOT NULL,
+    campo varchar(250) NOT NULL,
+    valor double NOT NULL,
+    status varchar(250) NOT NULL DEFAULT 'PENDENTE',
+    lote varchar(64),
+    cobrancaId integer,
+    tentativas integer NOT NULL DEFAULT 0,
+    criadoEm datetime NOT NULL,
+    proximaTentativa datetime NOT NULL,
+    enviadaEm datetime,
+    ultimoErro varchar(250)
+);
+CREATE INDEX IF NOT EXISTS cobranca_pendente_fila ON cobranca_pendente (status, proximaTentativa);
+CREATE INDEX IF NOT EXISTS cobranca_pendente_lote ON cobranca_pendente (lote);
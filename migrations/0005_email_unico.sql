@@ -0,0 +1,6 @@
+-- Email de ciclista único sem diferenciar maiúsculas (ver src/services/indice_emails.py).
+-- Se o banco já tiver emails repetidos (ex.: "Ana@x.com" e "ana@x.com") esta migração falha:
+-- junte os cadastros duplicados antes de subir a aplicação.
+-- O índice simples da 0002 fica coberto por este.
+DROP INDEX IF EXISTS ciclista_email;
+CREATE UNIQUE INDEX IF NOT EXISTS ciclista_email_unico ON ciclista (lower(email));
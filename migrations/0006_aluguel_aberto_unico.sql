@@ -0,0 +1,10 @@
+-- No máximo um aluguel em aberto por ciclista e por bicicleta (ver src/services/travas.py).
+-- As travas por chave serializam as requisições do mesmo processo e estes índices barram a
+-- duplicata que passar entre workers diferentes.
+-- Se o banco já tiver dois aluguéis abertos para o mesmo ciclista ou a mesma bicicleta esta
+-- migração falha: encerre os duplicados antes de subir a aplicação.
+-- Os índices parciais da 0002 com a mesma condição ficam cobertos por estes.
+DROP INDEX IF EXISTS aluguel_ciclista_aberto;
+CREATE UNIQUE INDEX IF NOT EXISTS aluguel_ciclista_aberto_unico ON aluguel (ciclista_id) WHERE horaFim IS NULL;
+DROP INDEX IF EXISTS aluguel_bicicleta_aberto;
+CREATE UNIQUE INDEX IF NOT EXISTS aluguel_bicicleta_aberta_unico ON aluguel (bicicleta) WHERE horaFim IS NULL;
@@ -0,0 +1,23 @@
+-- Estado de trancas e bicicletas recebido do serviço de equipamento (ver src/services/espelho_equipamento.py).
+-- Colunas de estado podem ficar NULL: eventos são parciais e só o que chegou é gravado.
+CREATE TABLE IF NOT EXISTS tranca_espelho (
+    id integer NOT NULL CONSTRAINT tranca_espelho_pk PRIMARY KEY,
+    status varchar(250),
+    bicicleta integer,
+    versao integer,
+    confirmadoEm double,
+    alteradoEm double NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tranca_espelho_alterado ON tranca_espelho (alteradoEm);
+CREATE TABLE IF NOT EXISTS bicicleta_espelho (
+    id integer NOT NULL CONSTRAINT bicicleta_espelho_pk PRIMARY KEY,
+    numero integer,
+    marca varchar(250),
+    modelo varchar(250),
+    ano varchar(250),
+    status varchar(250),
+    versao integer,
+    confirmadoEm double,
+    alteradoEm double NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bicicleta_espelho_alterado ON bicicleta_espelho (alteradoEm);
@@ -0,0 +1,32 @@
+-- aluguel.cobranca passa a aceitar NULL: com o pagamento fora do ar a cobrança vai para a
+-- cobranca_pendente e o aluguel fica sem id até o DespachanteCobranca gravar o definitivo.
+-- Antes a coluna era NOT NULL e guardava o -id da pendência, que vazava na resposta do POST /aluguel.
+-- O SQLite não altera restrição de coluna, então a tabela é refeita (ids e sequência preservados)
+-- e os ids negativos já gravados viram NULL.
+CREATE TABLE IF NOT EXISTS aluguel_novo (
+    id integer NOT NULL CONSTRAINT aluguel_pk PRIMARY KEY AUTOINCREMENT,
+    ciclista_id integer NOT NULL,
+    horaInicio datetime NOT NULL,
+    horaFim datetime,
+    trancaInicio integer NOT NULL,
+    trancaFim integer,
+    cobranca integer,
+    bicicleta integer NOT NULL,
+    cobranca_adicional integer,
+    CONSTRAINT aluguel_ciclista FOREIGN KEY (ciclista_id)
+    REFERENCES ciclista (id)
+);
+INSERT INTO aluguel_novo (id, ciclista_id, horaInicio, horaFim, trancaInicio, trancaFim, cobranca, bicicleta,
+                          cobranca_adicional)
+SELECT id, ciclista_id, horaInicio, horaFim, trancaInicio, trancaFim,
+       CASE WHEN cobranca < 0 THEN NULL ELSE cobranca END, bicicleta, cobranca_adicional
+FROM aluguel;
+UPDATE sqlite_sequence SET seq = (SELECT seq FROM sqlite_sequence WHERE name = 'aluguel')
+WHERE name = 'aluguel_novo' AND EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'aluguel');
+DROP TABLE aluguel;
+ALTER TABLE aluguel_novo RENAME TO aluguel;
+CREATE INDEX IF NOT EXISTS aluguel_ciclista_tranca_aberta ON aluguel (ciclista_id) WHERE trancaFim IS NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS aluguel_ciclista_aberto_unico ON aluguel (ciclista_id) WHERE horaFim IS NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS aluguel_bicicleta_aberta_unico ON aluguel (bicicleta) WHERE horaFim IS NULL;
+-- conciliação: pendência em aberto de cada aluguel
+CREATE INDEX IF NOT EXISTS cobranca_pendente_aluguel ON cobranca_pendente (aluguel_id);
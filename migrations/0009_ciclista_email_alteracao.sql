@@ -0,0 +1,22 @@
+-- Registro de emails de ciclista cadastrados ou trocados, preenchido por gatilhos em qualquer worker.
+-- O IndiceEmails (src/services/indice_emails.py) lê daqui o que mudou desde a última sincronização,
+-- inclusive o email trocado por PUT, que a busca por id novo não via.
+-- Começa com os emails já cadastrados, então ler o registro inteiro equivale a ler a tabela ciclista.
+-- O /restaurarBanco refaz a tabela, e o índice percebe pela falta da última alteração que leu.
+CREATE TABLE IF NOT EXISTS ciclista_email_alteracao (
+    seq integer NOT NULL CONSTRAINT ciclista_email_alteracao_pk PRIMARY KEY AUTOINCREMENT,
+    email varchar(250) NOT NULL
+);
+INSERT INTO ciclista_email_alteracao (email)
+SELECT email FROM ciclista
+WHERE NOT EXISTS (SELECT 1 FROM ciclista_email_alteracao)
+ORDER BY id;
+CREATE TRIGGER IF NOT EXISTS ciclista_email_inserido AFTER INSERT ON ciclista
+BEGIN
+    INSERT INTO ciclista_email_alteracao (email) VALUES (NEW.email);
+END;
+CREATE TRIGGER IF NOT EXISTS ciclista_email_alterado AFTER UPDATE OF email ON ciclista
+WHEN NEW.email IS NOT OLD.email
+BEGIN
+    INSERT INTO ciclista_email_alteracao (email) VALUES (NEW.email);
+END;
@@ -7,6 +7,12 @@ DROP TABLE IF EXISTS aluguel;
 DROP TABLE IF EXISTS cartao_credito;
 DROP TABLE IF EXISTS passaporte;
 DROP TABLE IF EXISTS funcionario;
+DROP TABLE IF EXISTS email_outbox;
+DROP TABLE IF EXISTS idempotencia;
+DROP TABLE IF EXISTS cobranca_pendente;
+DROP TABLE IF EXISTS ciclista_email_alteracao;
+DROP TABLE IF EXISTS tranca_espelho;
+DROP TABLE IF EXISTS bicicleta_espelho;
 
 
 -- Table: ciclista
@@ -105,5 +111,8 @@ CREATE TABLE passaporte (
     REFERENCES ciclista (id)
 );
 
+-- Tabelas e índices posteriores a este arquivo ficam em migrations/ (aplicadas a partir da versão 0)
+PRAGMA user_version = 0;
+
 -- End of file.
 
@@ -0,0 +1,5 @@
+from .http import ClienteHttp, configurar_cliente, obter_cliente, fechar_clientes
+from .http_async import ClienteHttpAsync, configurar_cliente_async, obter_cliente_async, fechar_clientes_async
+from .cache import CacheTTL, cache_equipamento
+from .resiliencia import (DependenciaIndisponivel, CircuitBreaker, Bulkhead, Dependencia, dependencias,
+                          estado_dependencias)
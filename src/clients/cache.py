@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheTTL:
+    """
+    Cache em memória com limite de itens (LRU) e tempo de vida por entrada.
+    Seguro para uso entre threads; guarda contadores de acertos, faltas, remoções por LRU e expirações.
+    """
+    def __init__(self, max_itens: int = 10_000, ttl: float = 5.0):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._itens: OrderedDict = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+        self.remocoes = 0
+        self.expiracoes = 0
+
+    def obter(self, chave):
+        """Retorna o valor ou None se não estiver no cache (ou tiver expirado)."""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.faltas += 1
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                self.expiracoes += 1
+                self.faltas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def guardar(self, chave, valor, ttl: float = None):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + (self.ttl if ttl is None else ttl), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.remocoes += 1
+
+    def invalidar(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                "itens": len(self._itens),
+                "maxItens": self.max_itens,
+                "ttlSegundos": self.ttl,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "remocoes": self.remocoes,
+                "expiracoes": self.expiracoes,
+                "taxaAcerto": self.acertos / consultas if consultas else 0.0,
+            }
+
+
+# cache compartilhado das leituras do serviço de equipamento (trancas e bicicletas)
+cache_equipamento = CacheTTL(max_itens=int(os.getenv("CACHE_EQUIPAMENTO_MAX", 10_000)),
+                             ttl=float(os.getenv("CACHE_EQUIPAMENTO_TTL", 5)))
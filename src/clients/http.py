@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from ..metricas import registrar_chamada
+from .resiliencia import dependencias
+
+# (conexão, leitura) em segundos
+TIMEOUT_PADRAO = (float(os.getenv("HTTP_TIMEOUT_CONEXAO", 3)), float(os.getenv("HTTP_TIMEOUT_LEITURA", 10)))
+TAMANHO_POOL_PADRAO = int(os.getenv("HTTP_TAMANHO_POOL", 10))
+TENTATIVAS_GET_PADRAO = int(os.getenv("HTTP_TENTATIVAS_GET", 2))
+
+
+class ClienteHttp:
+    """
+    Sessão HTTP com pool de conexões keep-alive para um serviço externo (externo ou equipamento).
+    Apenas GETs são repetidos em caso de falha; POSTs (cobrança, destrancar...) nunca são reenviados.
+    """
+    def __init__(self, url_base: str, tamanho_pool: int = TAMANHO_POOL_PADRAO, timeout=TIMEOUT_PADRAO,
+                 tentativas_get: int = TENTATIVAS_GET_PADRAO):
+        self.url_base = url_base.rstrip("/")
+        self.timeout = timeout
+        self.sessao = requests.Session()
+        retry = Retry(
+            total=tentativas_get,
+            backoff_factor=0.1,
+            allowed_methods=frozenset({"GET"}),
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool, max_retries=retry)
+        self.sessao.mount("http://", adapter)
+        self.sessao.mount("https://", adapter)
+
+    def _requisitar(self, metodo: str, caminho: str, dependencia: str = None, **kwargs) -> requests.Response:
+        """
+        :param dependencia: "equipamento", "pagamento" ou "email"; aplica o timeout, o circuit breaker e o
+            bulkhead da dependência (src/clients/resiliencia.py). Pode levantar DependenciaIndisponivel.
+        """
+        if dependencia is None:
+            return self._enviar(metodo, caminho, **kwargs)
+        politica = dependencias[dependencia]
+        kwargs.setdefault("timeout", politica.timeout)
+        with politica.chamada():
+            resposta = self._enviar(metodo, caminho, **kwargs)
+        politica.registrar_resultado(resposta.status_code)
+        return resposta
+
+    def _enviar(self, metodo: str, caminho: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        inicio = time.perf_counter()
+        try:
+            resposta = self.sessao.request(metodo, self.url_base + caminho, **kwargs)
+        except requests.RequestException:
+            registrar_chamada(metodo, inicio, "erro")
+            raise
+        registrar_chamada(metodo, inicio, resposta.status_code)
+        return resposta
+
+    def get(self, caminho: str, dependencia: str = None, **kwargs) -> requests.Response:
+        return self._requisitar("GET", caminho, dependencia, **kwargs)
+
+    def post(self, caminho: str, dependencia: str = None, **kwargs) -> requests.Response:
+        return self._requisitar("POST", caminho, dependencia, **kwargs)
+
+    def fechar(self):
+        self.sessao.close()
+
+
+# um cliente por url base, compartilhado pelo processo inteiro
+_clientes: dict[str, ClienteHttp] = {}
+_lock = threading.Lock()
+
+
+def configurar_cliente(url_base: str | None, **opcoes) -> ClienteHttp | None:
+    """
+    Cria (ou recria) o cliente de uma url base com as opções dadas. Chamado na inicialização do app.
+    """
+    if not url_base:
+        return None
+    with _lock:
+        antigo = _clientes.get(url_base)
+        _clientes[url_base] = ClienteHttp(url_base, **opcoes)
+    if antigo:
+        antigo.fechar()
+    return _clientes[url_base]
+
+
+def obter_cliente(url_base: str | None) -> ClienteHttp | None:
+    """
+    Retorna o cliente compartilhado da url base, criando-o com as opções padrão se ainda não existir.
+    """
+    if not url_base:
+        return None
+    cliente = _clientes.get(url_base)
+    if cliente is None:
+        with _lock:
+            cliente = _clientes.get(url_base)
+            if cliente is None:
+                cliente = _clientes[url_base] = ClienteHttp(url_base)
+    return cliente
+
+
+def fechar_clientes():
+    with _lock:
+        clientes = list(_clientes.values())
+        _clientes.clear()
+    for cliente in clientes:
+        cliente.fechar()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import httpx
+from .http import TIMEOUT_PADRAO, TAMANHO_POOL_PADRAO, TENTATIVAS_GET_PADRAO
+from ..metricas import registrar_chamada
+from .resiliencia import dependencias
+
+_contexto_ssl = None
+
+
+def contexto_ssl(url_base: str):
+    """
+    Contexto TLS dos AsyncClient. Cada AsyncClient criado com o padrão relê o bundle do certifi (~40 ms
+    na subida do worker); aqui as urls https dividem um contexto só e as http nem carregam certificados,
+    já que as chamadas usam caminhos relativos à url base e não seguem redirecionamentos.
+    """
+    global _contexto_ssl
+    if not url_base.startswith("https://"):
+        return False
+    if _contexto_ssl is None:
+        _contexto_ssl = httpx.create_ssl_context()
+    return _contexto_ssl
+
+
+class ClienteHttpAsync:
+    """
+    Versão assíncrona do ClienteHttp (httpx.AsyncClient), usada pelo CiclistaServiceAsync.
+    Mesmas regras: pool keep-alive por serviço, timeout padrão e repetição apenas de GETs.
+    """
+    def __init__(self, url_base: str, tamanho_pool: int = TAMANHO_POOL_PADRAO, timeout=TIMEOUT_PADRAO,
+                 tentativas_get: int = TENTATIVAS_GET_PADRAO):
+        self.url_base = url_base.rstrip("/")
+        self.tentativas_get = tentativas_get
+        conexao, leitura = timeout
+        self.cliente = httpx.AsyncClient(
+            base_url=self.url_base,
+            timeout=httpx.Timeout(leitura, connect=conexao),
+            limits=httpx.Limits(max_connections=tamanho_pool, max_keepalive_connections=tamanho_pool),
+            verify=contexto_ssl(self.url_base),
+        )
+
+    async def _requisitar(self, metodo: str, caminho: str, dependencia: str = None, **kwargs) -> httpx.Response:
+        if dependencia is None:
+            return await self._enviar(metodo, caminho, **kwargs)
+        politica = dependencias[dependencia]
+        conexao, leitura = politica.timeout
+        kwargs.setdefault("timeout", httpx.Timeout(leitura, connect=conexao))
+        async with politica.chamada_async():
+            resposta = await self._enviar(metodo, caminho, **kwargs)
+        politica.registrar_resultado(resposta.status_code)
+        return resposta
+
+    async def _enviar(self, metodo: str, caminho: str, **kwargs) -> httpx.Response:
+        inicio = time.perf_counter()
+        try:
+            resposta = await self.cliente.request(metodo, caminho, **kwargs)
+        except httpx.HTTPError:
+            registrar_chamada(metodo, inicio, "erro")
+            raise
+        registrar_chamada(metodo, inicio, resposta.status_code)
+        return resposta
+
+    async def get(self, caminho: str, dependencia: str = None, **kwargs) -> httpx.Response:
+        for tentativa in range(self.tentativas_get + 1):
+            ultima = tentativa == self.tentativas_get
+            try:
+                resp = await self._requisitar("GET", caminho, dependencia, **kwargs)
+            except httpx.TransportError:
+                if ultima:
+                    raise
+            else:
+                if resp.status_code not in (502, 503, 504) or ultima:
+                    return resp
+            await asyncio.sleep(0.1 * 2 ** tentativa)
+
+    async def post(self, caminho: str, dependencia: str = None, **kwargs) -> httpx.Response:
+        return await self._requisitar("POST", caminho, dependencia, **kwargs)
+
+    async def fechar(self):
+        await self.cliente.aclose()
+
+
+# um cliente por url base; criados e fechados dentro do event loop do app (lifespan)
+_clientes: dict[str, ClienteHttpAsync] = {}
+
+
+def configurar_cliente_async(url_base: str | None, **opcoes) -> ClienteHttpAsync | None:
+    if not url_base:
+        return None
+    _clientes[url_base] = ClienteHttpAsync(url_base, **opcoes)
+    return _clientes[url_base]
+
+
+def obter_cliente_async(url_base: str | None) -> ClienteHttpAsync | None:
+    if not url_base:
+        return None
+    cliente = _clientes.get(url_base)
+    if cliente is None:
+        cliente = _clientes[url_base] = ClienteHttpAsync(url_base)
+    return cliente
+
+
+async def fechar_clientes_async():
+    clientes = list(_clientes.values())
+    _clientes.clear()
+    for cliente in clientes:
+        await cliente.fechar()
@@ -0,0 +1,242 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+
+BREAKER_FALHAS = int(os.getenv("BREAKER_FALHAS", 5))  # falhas seguidas para abrir o circuito
+BREAKER_ABERTO_SEGUNDOS = float(os.getenv("BREAKER_ABERTO_SEGUNDOS", 30))
+BULKHEAD_ESPERA = float(os.getenv("BULKHEAD_ESPERA", 0.5))  # segundos esperando vaga antes de desistir
+
+FECHADO = "FECHADO"
+ABERTO = "ABERTO"
+MEIO_ABERTO = "MEIO_ABERTO"
+
+
+class DependenciaIndisponivel(Exception):
+    """Chamada recusada sem ir à rede: circuito aberto ou sem vaga no bulkhead da dependência."""
+    def __init__(self, dependencia: str, motivo: str, tentar_em: float = None):
+        super().__init__(f"Serviço {dependencia} indisponível ({motivo})")
+        self.dependencia = dependencia
+        self.motivo = motivo
+        self.tentar_em = tentar_em  # segundos até o circuito aceitar nova tentativa
+
+
+class CircuitBreaker:
+    """
+    Abre depois de `limite_falhas` falhas seguidas (erro de rede, timeout ou 5xx) e recusa chamadas por
+    `aberto_segundos`. Passado esse tempo deixa passar uma chamada de teste (MEIO_ABERTO): sucesso fecha,
+    falha abre de novo. Sucessos que chegam com o circuito ABERTO são ignorados.
+    """
+    def __init__(self, nome: str, limite_falhas: int = BREAKER_FALHAS, aberto_segundos: float = BREAKER_ABERTO_SEGUNDOS):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.aberto_segundos = aberto_segundos
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self.recusadas = 0
+        self._teste_em_andamento = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == FECHADO:
+                return
+            agora = time.monotonic()
+            if self.estado == ABERTO and agora >= self.aberto_ate:
+                self.estado = MEIO_ABERTO
+            if self.estado == MEIO_ABERTO and not self._teste_em_andamento:
+                self._teste_em_andamento = True
+                return
+            self.recusadas += 1
+            raise DependenciaIndisponivel(self.nome, "circuito aberto", max(self.aberto_ate - agora, 0.0))
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self.estado == ABERTO:
+                # chamada lenta que saiu antes de o circuito abrir: não reabre o tráfego, quem decide é o teste
+                return
+            self.estado = FECHADO
+            self.falhas_seguidas = 0
+            self._teste_em_andamento = False
+
+    def liberar_teste(self):
+        """A chamada de teste foi cancelada sem resultado: a próxima pode testar."""
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self.falhas_seguidas += 1
+            if self.estado == MEIO_ABERTO or self.falhas_seguidas >= self.limite_falhas:
+                self.estado = ABERTO
+                self.aberto_ate = time.monotonic() + self.aberto_segundos
+            self._teste_em_andamento = False
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "falhasSeguidas": self.falhas_seguidas,
+                "abertoPorMaisSegundos": max(self.aberto_ate - time.monotonic(), 0.0) if self.estado == ABERTO else 0.0,
+                "recusadas": self.recusadas,
+            }
+
+
+class Bulkhead:
+    """
+    Limite de chamadas simultâneas a uma dependência. Quem não consegue vaga em `espera` segundos
+    recebe DependenciaIndisponivel, em vez de prender mais uma thread do servidor.
+    O limite vale separadamente para as threads (ClienteHttp) e para cada event loop (ClienteHttpAsync):
+    um asyncio.Semaphore só funciona no loop em que foi usado pela primeira vez.
+    """
+    def __init__(self, nome: str, limite: int, espera: float = BULKHEAD_ESPERA):
+        self.nome = nome
+        self.limite = limite
+        self.espera = espera
+        self.em_uso = 0
+        self.rejeitadas = 0
+        self._semaforo = threading.BoundedSemaphore(limite)
+        self._semaforos_async = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
+        self._lock = threading.Lock()
+
+    def _ocupar(self, conseguiu: bool):
+        with self._lock:
+            if conseguiu:
+                self.em_uso += 1
+            else:
+                self.rejeitadas += 1
+        if not conseguiu:
+            raise DependenciaIndisponivel(self.nome, "limite de chamadas simultâneas")
+
+    def _liberar(self):
+        with self._lock:
+            self.em_uso -= 1
+
+    @contextmanager
+    def vaga(self):
+        self._ocupar(self._semaforo.acquire(timeout=self.espera))
+        try:
+            yield
+        finally:
+            self._liberar()
+            self._semaforo.release()
+
+    def _semaforo_do_loop(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaforo = self._semaforos_async.get(loop)
+            if semaforo is None:
+                semaforo = self._semaforos_async[loop] = asyncio.Semaphore(self.limite)
+            return semaforo
+
+    async def _adquirir(self, semaforo: asyncio.Semaphore) -> bool:
+        """
+        Espera a vaga por até `espera` segundos. Sem wait_for: a vaga que chega junto com o timeout
+        fica com quem esperou (e é devolvida no fim da chamada) em vez de se perder.
+        """
+        if not semaforo.locked():
+            return await semaforo.acquire()  # há vaga: retorna sem suspender
+        aquisicao = asyncio.ensure_future(semaforo.acquire())
+        try:
+            await asyncio.wait({aquisicao}, timeout=self.espera)
+        except asyncio.CancelledError:
+            # quem chamou foi cancelado: a vaga, se já veio, volta para o semáforo
+            if aquisicao.done() and not aquisicao.cancelled():
+                semaforo.release()
+            else:
+                aquisicao.cancel()
+            raise
+        if aquisicao.done():
+            return True
+        aquisicao.cancel()
+        try:
+            await aquisicao
+        except asyncio.CancelledError:
+            return False
+        return True
+
+    @asynccontextmanager
+    async def vaga_async(self):
+        semaforo = self._semaforo_do_loop()
+        self._ocupar(await self._adquirir(semaforo))
+        try:
+            yield
+        finally:
+            self._liberar()
+            semaforo.release()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"limite": self.limite, "emUso": self.em_uso, "rejeitadas": self.rejeitadas}
+
+
+class Dependencia:
+    """Política de uma dependência externa: timeout próprio, circuit breaker e bulkhead."""
+    def __init__(self, nome: str, timeout, limite_concorrencia: int):
+        self.nome = nome
+        self.timeout = timeout  # (conexão, leitura)
+        self.breaker = CircuitBreaker(nome)
+        self.bulkhead = Bulkhead(nome, limite_concorrencia)
+
+    def registrar_resultado(self, status: int):
+        # 4xx é resposta de negócio (cartão recusado, tranca inexistente...): o serviço está de pé
+        if status >= 500:
+            self.breaker.registrar_falha()
+        else:
+            self.breaker.registrar_sucesso()
+
+    @contextmanager
+    def chamada(self):
+        """Envolve uma chamada síncrona; o chamador informa o status com registrar_resultado."""
+        with self.bulkhead.vaga():
+            self.breaker.permitir()
+            try:
+                yield
+            except Exception:
+                self.breaker.registrar_falha()
+                raise
+            except BaseException:
+                # KeyboardInterrupt/SystemExit não dizem nada da dependência
+                self.breaker.liberar_teste()
+                raise
+
+    @asynccontextmanager
+    async def chamada_async(self):
+        async with self.bulkhead.vaga_async():
+            self.breaker.permitir()
+            try:
+                yield
+            except Exception:
+                self.breaker.registrar_falha()
+                raise
+            except BaseException:
+                # CancelledError (cliente desconectou, wait_for de quem chamou) não é falha do upstream
+                self.breaker.liberar_teste()
+                raise
+
+    def estatisticas(self) -> dict:
+        conexao, leitura = self.timeout
+        return {"timeoutConexao": conexao, "timeoutLeitura": leitura,
+                **self.breaker.estatisticas(), **self.bulkhead.estatisticas()}
+
+
+def _dependencia_do_ambiente(nome: str, leitura_padrao: float, concorrencia_padrao: int) -> Dependencia:
+    prefixo = f"DEP_{nome.upper()}"
+    timeout = (float(os.getenv(f"{prefixo}_TIMEOUT_CONEXAO", 2)),
+               float(os.getenv(f"{prefixo}_TIMEOUT_LEITURA", leitura_padrao)))
+    return Dependencia(nome, timeout, int(os.getenv(f"{prefixo}_CONCORRENCIA", concorrencia_padrao)))
+
+
+# equipamento e pagamento ficam no caminho do aluguel/devolução; email só roda no DespachanteEmail
+dependencias = {
+    "equipamento": _dependencia_do_ambiente("equipamento", 3, 32),
+    "pagamento": _dependencia_do_ambiente("pagamento", 5, 16),
+    "email": _dependencia_do_ambiente("email", 10, 4),
+}
+
+
+def estado_dependencias() -> dict:
+    return {nome: dependencia.estatisticas() for nome, dependencia in dependencias.items()}
@@ -0,0 +1,5 @@
+from .registro import Contador, Histograma, Registro, registro
+from .instrumentacao import (medir_upstream, registrar_chamada, MiddlewareMetricas, instrumentar_engine,
+                             QueuePoolMedido, AsyncQueuePoolMedido, QueuePoolLeituraMedido,
+                             AsyncQueuePoolLeituraMedido)
+from .perfil import (MiddlewarePerfil, PERFIL_ATIVO, PERFIL_TOKEN, listar_perfis, arquivo_perfil, relatorio_perfil)
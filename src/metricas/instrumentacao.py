@@ -0,0 +1,141 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from .registro import requisicao_duracao, upstream_duracao, db_consulta_duracao, db_pool_espera, db_pool_timeouts
+from .perfil import PERFIL_ATIVO, somar_consulta, somar_upstream
+
+# nome do helper do CiclistaService que está fazendo a chamada; lido pelos clientes HTTP
+operacao_upstream: ContextVar[str] = ContextVar("operacao_upstream", default="outra")
+
+
+def medir_upstream(nome: str):
+    """
+    Marca um helper (síncrono ou async) como operação de upstream: as chamadas HTTP feitas dentro dele
+    entram em upstream_chamada_duracao_segundos com operacao=nome. Acertos de cache não geram amostra.
+    """
+    def decorador(funcao):
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envoltorio_async(*args, **kwargs):
+                token = operacao_upstream.set(nome)
+                try:
+                    return await funcao(*args, **kwargs)
+                finally:
+                    operacao_upstream.reset(token)
+            return envoltorio_async
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            token = operacao_upstream.set(nome)
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                operacao_upstream.reset(token)
+        return envoltorio
+    return decorador
+
+
+def registrar_chamada(metodo: str, inicio: float, status):
+    """Chamado pelos clientes HTTP ao fim de cada requisição; status é o código HTTP ou "erro"."""
+    duracao = time.perf_counter() - inicio
+    upstream_duracao.observar(duracao, operacao_upstream.get(), metodo, status)
+    if PERFIL_ATIVO:
+        somar_upstream(duracao)
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI puro (sem BaseHTTPMiddleware, que custa uma task por requisição) que mede cada
+    requisição pelo template da rota, não pelo caminho, para não explodir a cardinalidade.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        status = 500
+
+        async def send_com_status(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            rota = scope.get("route")
+            requisicao_duracao.observar(time.perf_counter() - inicio, scope["method"],
+                                        rota.path if rota is not None else "nao_encontrada", status)
+
+
+TIPOS_COMANDO = {"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "CREATE", "DROP", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def _tipo_comando(sql: str) -> str:
+    sql = sql.lstrip()
+    while sql.startswith("--"):  # comentários no começo (ex.: restaurar_banco.sql)
+        sql = sql.partition("\n")[2].lstrip()
+    palavra = sql[:8].split(None, 1)
+    tipo = palavra[0].upper() if palavra else ""
+    return tipo if tipo in TIPOS_COMANDO else "OUTRO"
+
+
+def instrumentar_engine(engine_alvo, nome: str):
+    """Mede a duração de cada comando SQL executado pelo engine (síncrono; no async, passar .sync_engine)."""
+    @event.listens_for(engine_alvo, "before_cursor_execute")
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("inicio_comandos", []).append(time.perf_counter())
+
+    @event.listens_for(engine_alvo, "after_cursor_execute")
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - conn.info["inicio_comandos"].pop()
+        db_consulta_duracao.observar(duracao, nome, _tipo_comando(statement))
+        if PERFIL_ATIVO:
+            somar_consulta(duracao)
+
+    @event.listens_for(engine_alvo, "handle_error")
+    def _erro(contexto):
+        pilha = contexto.connection.info.get("inicio_comandos") if contexto.connection is not None else None
+        if pilha:
+            pilha.pop()
+
+
+class _EsperaMedida:
+    """
+    Mede Pool.connect, a API pública que o engine usa a cada checkout: espera por conexão livre, abertura
+    de uma nova e os eventos de checkout. Não depende dos métodos internos do QueuePool.
+    """
+    nome_engine = "sync"
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            db_pool_timeouts.incrementar(self.nome_engine)
+            raise
+        finally:
+            db_pool_espera.observar(time.perf_counter() - inicio, self.nome_engine)
+
+
+class QueuePoolMedido(_EsperaMedida, QueuePool):
+    """QueuePool que mede o tempo de checkout (espera por conexão livre ou abertura de uma nova)."""
+
+
+class AsyncQueuePoolMedido(_EsperaMedida, AsyncAdaptedQueuePool):
+    nome_engine = "async"
+
+
+# pools dos engines somente leitura, com rótulo próprio nas métricas
+class QueuePoolLeituraMedido(QueuePoolMedido):
+    nome_engine = "leitura"
+
+
+class AsyncQueuePoolLeituraMedido(AsyncQueuePoolMedido):
+    nome_engine = "async_leitura"
@@ -0,0 +1,202 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import time
+from contextvars import ContextVar
+
+PERFIL_TOKEN = os.getenv("PERFIL_TOKEN")  # requisição com o header X-Perfil-Token igual a este valor é perfilada
+PERFIL_AMOSTRAGEM = float(os.getenv("PERFIL_AMOSTRAGEM", 0))  # fração das requisições de PERFIL_ROTAS perfiladas
+PERFIL_ROTAS = tuple(r for r in os.getenv("PERFIL_ROTAS", "/aluguel,/devolucao").split(",") if r)
+PERFIL_DIR = os.getenv("PERFIL_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), "perfis"))
+PERFIL_MAX_ARQUIVOS = int(os.getenv("PERFIL_MAX_ARQUIVOS", 200))  # perfis guardados; os mais antigos são apagados
+# desligado, o middleware nem entra na pilha e os contadores de SQL/upstream não são somados
+PERFIL_ATIVO = bool(PERFIL_TOKEN) or PERFIL_AMOSTRAGEM > 0
+
+NOME_VALIDO = re.compile(r"^\d+-\d+$")
+FUNCOES_NO_RESUMO = 10
+
+
+class MedicaoPerfil:
+    """Consultas e chamadas HTTP feitas no contexto da requisição perfilada."""
+    __slots__ = ("consultas", "tempo_sql", "chamadas_upstream", "tempo_upstream")
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.chamadas_upstream = 0
+        self.tempo_upstream = 0.0
+
+
+medicao_perfil: ContextVar[MedicaoPerfil | None] = ContextVar("medicao_perfil", default=None)
+
+
+def somar_consulta(duracao: float):
+    medicao = medicao_perfil.get()
+    if medicao is not None:
+        medicao.consultas += 1
+        medicao.tempo_sql += duracao
+
+
+def somar_upstream(duracao: float):
+    medicao = medicao_perfil.get()
+    if medicao is not None:
+        medicao.chamadas_upstream += 1
+        medicao.tempo_upstream += duracao
+
+
+class MiddlewarePerfil:
+    """
+    Perfila com cProfile a requisição que traz X-Perfil-Token (igual a PERFIL_TOKEN) ou que cai na
+    amostragem (PERFIL_AMOSTRAGEM das rotas em PERFIL_ROTAS). Grava em PERFIL_DIR o .prof (pstats,
+    abre no snakeviz) e um .json com rota, status, duração, consultas SQL e chamadas HTTP, mantendo
+    os PERFIL_MAX_ARQUIVOS mais recentes. Com o header, a resposta traz o nome do perfil em X-Perfil.
+
+    Um perfil por vez: enquanto um roda, as outras requisições passam direto. O cProfile vê a thread
+    do event loop, então as corrotinas de outras requisições que rodarem no meio também aparecem;
+    rotas síncronas e asyncio.to_thread rodam em outras threads e aparecem só como espera. Consultas
+    gravadas pelo EscritorBanco (thread própria) não entram na contagem.
+    """
+    def __init__(self, app, diretorio: str = PERFIL_DIR, token: str = PERFIL_TOKEN,
+                 amostragem: float = PERFIL_AMOSTRAGEM, rotas: tuple = PERFIL_ROTAS,
+                 max_arquivos: int = PERFIL_MAX_ARQUIVOS):
+        self.app = app
+        self.diretorio = diretorio
+        self.token = token.encode() if token else None
+        self.amostragem = amostragem
+        self.rotas = rotas
+        self.max_arquivos = max_arquivos
+        self._ocupado = False
+        self._sequencia = itertools.count(1)
+
+    def _motivo(self, scope) -> str | None:
+        if self.token:
+            for nome, valor in scope["headers"]:
+                if nome == b"x-perfil-token":
+                    return "header" if hmac.compare_digest(valor, self.token) else None
+        if self.amostragem and scope["path"] in self.rotas and random.random() < self.amostragem:
+            return "amostra"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        motivo = self._motivo(scope)
+        if motivo is None or self._ocupado:
+            return await self.app(scope, receive, send)
+
+        self._ocupado = True
+        nome = f"{int(time.time() * 1000)}-{next(self._sequencia)}"
+        status = 500
+
+        async def send_com_status(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                if motivo == "header":
+                    mensagem["headers"] = [*mensagem.get("headers", []), (b"x-perfil", nome.encode())]
+            await send(mensagem)
+
+        medicao = MedicaoPerfil()
+        contexto = medicao_perfil.set(medicao)
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            perfil.disable()
+            duracao = time.perf_counter() - inicio
+            medicao_perfil.reset(contexto)
+            self._ocupado = False
+            rota = scope.get("route")
+            dados = {
+                "nome": nome,
+                "criadoEm": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "motivo": motivo,
+                "metodo": scope["method"],
+                "caminho": scope["path"],
+                "rota": rota.path if rota is not None else None,
+                "status": status,
+                "duracaoMs": round(duracao * 1000, 3),
+                "consultas": medicao.consultas,
+                "sqlMs": round(medicao.tempo_sql * 1000, 3),
+                "chamadasUpstream": medicao.chamadas_upstream,
+                "upstreamMs": round(medicao.tempo_upstream * 1000, 3),
+            }
+            # dump e rotação fora do event loop
+            await asyncio.to_thread(self._salvar, perfil, dados)
+
+    def _salvar(self, perfil: cProfile.Profile, dados: dict):
+        os.makedirs(self.diretorio, exist_ok=True)
+        estatisticas = pstats.Stats(perfil)
+        # funções com mais tempo próprio: onde o tempo foi (validação, hidratação do ORM, espera de rede...)
+        mais_caras = sorted(estatisticas.stats.items(), key=lambda item: -item[1][2])[:FUNCOES_NO_RESUMO]
+        dados["funcoes"] = [
+            {"funcao": pstats.func_std_string(funcao), "chamadas": nc, "proprioMs": round(tt * 1000, 3),
+             "acumuladoMs": round(ct * 1000, 3)}
+            for funcao, (_, nc, tt, ct, _) in mais_caras
+        ]
+        estatisticas.dump_stats(os.path.join(self.diretorio, f"{dados['nome']}.prof"))
+        with open(os.path.join(self.diretorio, f"{dados['nome']}.json"), "w") as arquivo:
+            json.dump(dados, arquivo)
+        self._rotacionar()
+
+    def _rotacionar(self):
+        nomes = sorted(_nomes(self.diretorio), key=_ordem)
+        for nome in nomes[:max(len(nomes) - self.max_arquivos, 0)]:
+            for extensao in (".json", ".prof"):
+                try:
+                    os.remove(os.path.join(self.diretorio, nome + extensao))
+                except FileNotFoundError:
+                    pass
+
+
+def _nomes(diretorio: str) -> list:
+    try:
+        arquivos = os.listdir(diretorio)
+    except FileNotFoundError:
+        return []
+    return [arquivo[:-5] for arquivo in arquivos if arquivo.endswith(".json") and NOME_VALIDO.match(arquivo[:-5])]
+
+
+def _ordem(nome: str):
+    return tuple(int(parte) for parte in nome.split("-"))
+
+
+def listar_perfis(limite: int = 50, diretorio: str = PERFIL_DIR) -> list:
+    """Resumo (.json) dos perfis mais recentes primeiro."""
+    perfis = []
+    for nome in sorted(_nomes(diretorio), key=_ordem, reverse=True)[:limite]:
+        try:
+            with open(os.path.join(diretorio, f"{nome}.json")) as arquivo:
+                perfis.append(json.load(arquivo))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass  # apagado pela rotação ou ainda sendo escrito
+    return perfis
+
+
+def arquivo_perfil(nome: str, diretorio: str = PERFIL_DIR) -> str | None:
+    """Caminho do .prof, ou None se o nome não for de um perfil (inclusive nomes com / ou ..)."""
+    if not NOME_VALIDO.match(nome):
+        return None
+    caminho = os.path.join(diretorio, f"{nome}.prof")
+    return caminho if os.path.exists(caminho) else None
+
+
+def relatorio_perfil(nome: str, ordenar: str = "cumulative", limite: int = 40,
+                     diretorio: str = PERFIL_DIR) -> str | None:
+    """Saída do pstats (print_stats) do perfil, ordenada por "cumulative", "tottime" ou "calls"."""
+    caminho = arquivo_perfil(nome, diretorio)
+    if caminho is None:
+        return None
+    saida = io.StringIO()
+    pstats.Stats(caminho, stream=saida).sort_stats(ordenar).print_stats(limite)
+    return saida.getvalue()
@@ -0,0 +1,119 @@
+import bisect
+import threading
+
+# limites (em segundos) dos histogramas de latência
+BUCKETS_REQUISICAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTA = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+
+def _escapa(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formata_rotulos(nomes, valores, extra: str = "") -> str:
+    pares = [f'{n}="{_escapa(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formata_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monotônico com rótulos, no formato do Prometheus."""
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores: dict = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores_rotulos, quantidade: float = 1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + quantidade
+
+    def linhas(self):
+        with self._lock:
+            itens = list(self._valores.items())
+        for valores, total in sorted(itens):
+            yield f"{self.nome}{_formata_rotulos(self.rotulos, valores)} {_formata_numero(total)}"
+
+
+class Histograma:
+    """
+    Histograma com buckets fixos e rótulos. observar() custa uma busca binária e um lock curto,
+    barato o bastante para ficar ligado em produção.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos=(), buckets=BUCKETS_REQUISICAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict = {}  # rótulos -> [contagens por bucket (+Inf no fim), soma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores_rotulos):
+        posicao = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+
+    def linhas(self):
+        with self._lock:
+            itens = [(valores, list(contagens), soma) for valores, (contagens, soma) in self._series.items()]
+        for valores, contagens, soma in sorted(itens):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+                acumulado += contagem
+                rotulos = _formata_rotulos(self.rotulos, valores, f'le="{_formata_numero(limite)}"')
+                yield f"{self.nome}_bucket{rotulos} {acumulado}"
+            rotulos = _formata_rotulos(self.rotulos, valores)
+            yield f"{self.nome}_sum{rotulos} {_formata_numero(soma)}"
+            yield f"{self.nome}_count{rotulos} {acumulado}"
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+
+    def registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        """Todas as métricas no formato texto de exposição do Prometheus (versão 0.0.4)."""
+        saida = []
+        for metrica in self.metricas:
+            saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            saida.extend(metrica.linhas())
+        return "\n".join(saida) + "\n"
+
+
+registro = Registro()
+
+requisicao_duracao = registro.registrar(Histograma(
+    "http_requisicao_duracao_segundos", "Duração das requisições HTTP por rota",
+    ("metodo", "rota", "status")))
+upstream_duracao = registro.registrar(Histograma(
+    "upstream_chamada_duracao_segundos", "Duração das chamadas aos serviços externo e equipamento por operação",
+    ("operacao", "metodo", "status")))
+db_consulta_duracao = registro.registrar(Histograma(
+    "db_consulta_duracao_segundos", "Duração dos comandos SQL por tipo", ("engine", "tipo"),
+    buckets=BUCKETS_CONSULTA))
+db_pool_espera = registro.registrar(Histograma(
+    "db_pool_espera_segundos", "Tempo esperando uma conexão do pool (inclui abrir conexão nova)", ("engine",),
+    buckets=BUCKETS_CONSULTA))
+db_pool_timeouts = registro.registrar(Contador(
+    "db_pool_timeouts_total", "Checkouts do pool que estouraram DB_POOL_TIMEOUT", ("engine",)))
@@ -1,3 +1,7 @@
-from .models_ciclista import Ciclista, Passaporte, CartaoCreditoDB, AluguelDB
+from .models_ciclista import Ciclista, CiclistaEmailAlteracaoDB, Passaporte, CartaoCreditoDB, AluguelDB
 from .funcionario import FuncionarioDB
+from .outbox import EmailOutboxDB
+from .idempotencia import IdempotenciaDB
+from .cobranca_pendente import CobrancaPendenteDB
+from .espelho_equipamento import TrancaEspelhoDB, BicicletaEspelhoDB
 from .errors import HTTPError
\ No newline at end of file
@@ -0,0 +1,26 @@
+import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Double, Index
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class CobrancaPendenteDB(Base):
+    __tablename__ = "cobranca_pendente"
+    __table_args__ = (Index("cobranca_pendente_fila", "status", "proximaTentativa"),
+                      Index("cobranca_pendente_lote", "lote"),
+                      Index("cobranca_pendente_aluguel", "aluguel_id"))
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    ciclista_id = Column(Integer, nullable=False)
+    aluguel_id = Column(Integer, nullable=False)
+    # campo do AluguelDB que recebe o id da cobrança: "cobranca" ou "cobranca_adicional" (NULL até o envio)
+    campo = Column(String, nullable=False)
+    valor = Column(Double, nullable=False)
+    status = Column(String, default="PENDENTE", nullable=False)  # PENDENTE, ENVIANDO, ENVIADA ou FALHOU
+    lote = Column(String, nullable=True)  # Idempotency-Key do envio agregado ao /filaCobranca
+    cobrancaId = Column(Integer, nullable=True)
+    tentativas = Column(Integer, default=0, nullable=False)
+    criadoEm = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    proximaTentativa = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    enviadaEm = Column(DateTime, nullable=True)
+    ultimoErro = Column(String, nullable=True)
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Double, Index
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+# cópia local do estado de trancas e bicicletas do serviço de equipamento (ver EspelhoEquipamento)
+
+class TrancaEspelhoDB(Base):
+    __tablename__ = "tranca_espelho"
+    __table_args__ = (Index("tranca_espelho_alterado", "alteradoEm"),)
+
+    id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=True)
+    bicicleta = Column(Integer, nullable=True)  # id da bicicleta presa; NULL se vazia
+    versao = Column(Integer, nullable=True)  # versão mandada pelo equipamento, para descartar evento atrasado
+    confirmadoEm = Column(Double, nullable=True)  # epoch da última confirmação do equipamento (evento ou carga)
+    alteradoEm = Column(Double, nullable=False)  # epoch da última gravação; os outros workers leem a partir dela
+
+
+class BicicletaEspelhoDB(Base):
+    __tablename__ = "bicicleta_espelho"
+    __table_args__ = (Index("bicicleta_espelho_alterado", "alteradoEm"),)
+
+    id = Column(Integer, primary_key=True)
+    numero = Column(Integer, nullable=True)
+    marca = Column(String, nullable=True)
+    modelo = Column(String, nullable=True)
+    ano = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+    versao = Column(Integer, nullable=True)
+    confirmadoEm = Column(Double, nullable=True)
+    alteradoEm = Column(Double, nullable=False)
@@ -0,0 +1,18 @@
+import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class IdempotenciaDB(Base):
+    __tablename__ = "idempotencia"
+    __table_args__ = (Index("idempotencia_expiracao", "expiraEm"),)
+
+    chave = Column(String, primary_key=True)
+    rota = Column(String, primary_key=True)
+    hashCorpo = Column(String, nullable=False)
+    status = Column(String, default="EM_ANDAMENTO", nullable=False)  # EM_ANDAMENTO ou CONCLUIDA
+    codigoHttp = Column(Integer, nullable=True)
+    resposta = Column(Text, nullable=True)  # corpo JSON da resposta original
+    criadoEm = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    expiraEm = Column(DateTime, nullable=False)
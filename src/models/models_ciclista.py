@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Date, DateTime, Double
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Date, DateTime, Double, Index, text, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -27,6 +27,18 @@ class Ciclista(Base):
     aluguel = relationship("AluguelDB", back_populates="ciclista", uselist=False)
 
 
+# email único sem diferenciar maiúsculas (migração 0005)
+Index("ciclista_email_unico", func.lower(Ciclista.email), unique=True)
+
+
+class CiclistaEmailAlteracaoDB(Base):
+    """Email cadastrado ou trocado; preenchida pelos gatilhos da migração 0009."""
+    __tablename__ = "ciclista_email_alteracao"
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    email = Column(String, nullable=False)
+
+
 class Passaporte(Base):
     __tablename__ = "passaporte"
 
@@ -55,6 +67,13 @@ class CartaoCreditoDB(Base):
 
 class AluguelDB(Base):
     __tablename__ = "aluguel"
+    # índices parciais dos aluguéis em aberto (migrations/0002_indices_aluguel.sql); os dois únicos
+    # garantem um aluguel aberto por ciclista e por bicicleta (0006_aluguel_aberto_unico.sql)
+    __table_args__ = (
+        Index("aluguel_ciclista_aberto_unico", "ciclista_id", unique=True, sqlite_where=text('"horaFim" IS NULL')),
+        Index("aluguel_ciclista_tranca_aberta", "ciclista_id", sqlite_where=text('"trancaFim" IS NULL')),
+        Index("aluguel_bicicleta_aberta_unico", "bicicleta", unique=True, sqlite_where=text('"horaFim" IS NULL')),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     ciclista_id = Column(Integer, ForeignKey("ciclista.id"), nullable=False)
@@ -62,7 +81,7 @@ class AluguelDB(Base):
     horaFim = Column(DateTime, nullable=True)
     trancaInicio = Column(Integer, nullable=False)
     trancaFim = Column(Integer, nullable=True)
-    cobranca = Column(Double, nullable=False)
+    cobranca = Column(Double, nullable=True)  # NULL enquanto a cobrança está na cobranca_pendente
     bicicleta = Column(Integer, nullable=False)
     cobranca_adicional = Column(Integer, nullable=True)
 
@@ -0,0 +1,20 @@
+import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.ext.declarative import declarative_base
+
+Base = declarative_base()
+
+class EmailOutboxDB(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("email_outbox_pendentes", "status", "proximaTentativa"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    email = Column(String, nullable=False)
+    assunto = Column(String, nullable=False)
+    mensagem = Column(Text, nullable=False)
+    status = Column(String, default="PENDENTE", nullable=False)  # PENDENTE, ENVIANDO (reservado), ENVIADO ou FALHOU
+    tentativas = Column(Integer, default=0, nullable=False)
+    criadoEm = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    proximaTentativa = Column(DateTime, default=datetime.datetime.now, nullable=False)
+    enviadoEm = Column(DateTime, nullable=True)
+    ultimoErro = Column(String, nullable=True)
@@ -1,5 +1,6 @@
-from .ciclista import NovoCiclista, Ciclista, Passaporte, NovoCiclistaPut
+from .ciclista import NovoCiclista, Ciclista, Passaporte, NovoCiclistaPut, NovoCiclistaLote, ResultadoCadastroLote
 from .aluguel import Aluguel, Devolucao
 from .meio_de_pagamento import NovoCartaoDeCredito, CartaoCredito
 from .funcionario import NovoFuncionario, Funcionario, NovoFuncionarioPut
-from .bicicleta import Bicicleta
\ No newline at end of file
+from .bicicleta import Bicicleta
+from .equipamento import EstadoTranca, EstadoBicicleta, EventosEquipamento
\ No newline at end of file
@@ -8,7 +8,7 @@ class Aluguel(BaseModel):
     horaInicio: datetime.datetime
     trancaFim: Optional[int] = None
     horaFim: Optional[datetime.datetime] = None
-    cobranca: int
+    cobranca: Optional[int] = None  # None enquanto a cobrança aguarda o pagamento voltar
     ciclista: int
     trancaInicio: int
 
@@ -20,5 +20,5 @@ class Devolucao(BaseModel):
     horaInicio: datetime.datetime
     horaFim: datetime.datetime
     trancaFim: int
-    cobranca: int
+    cobranca: Optional[int] = None  # só existe quando houve cobrança adicional
     ciclista: int
\ No newline at end of file
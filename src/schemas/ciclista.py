@@ -1,7 +1,8 @@
 from pydantic import BaseModel, EmailStr, ValidationError, field_validator, constr, Field, AnyUrl, FutureDate, PastDate
-from pydantic_extra_types.country import CountryAlpha2
+from .paises import PaisAlpha2
 from typing import Optional, Annotated
 from ..models import Passaporte as PassaporteDB
+from .meio_de_pagamento import NovoCartaoDeCredito
 from enum import Enum
 
 class Nacionalidade(str, Enum):
@@ -11,7 +12,7 @@ class Nacionalidade(str, Enum):
 class Passaporte(BaseModel):
     numero: str
     validade: FutureDate
-    pais: CountryAlpha2
+    pais: PaisAlpha2
     class Meta:
         from_attributes = PassaporteDB
 
@@ -49,3 +50,16 @@ class NovoCiclistaPut(BaseModel):
     class Config:
         from_attributes = True
 
+
+class NovoCiclistaLote(BaseModel):
+    """Uma linha da importação em lote (mesmo corpo do POST /ciclista)."""
+    ciclista: NovoCiclista
+    meioDePagamento: NovoCartaoDeCredito
+
+
+class ResultadoCadastroLote(BaseModel):
+    linha: int
+    status: str  # CRIADO ou ERRO
+    id: Optional[int] = None
+    email: Optional[str] = None
+    erro: Optional[str] = None
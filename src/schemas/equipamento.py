@@ -0,0 +1,23 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+# eventos do serviço de equipamento para o espelho local: só os campos enviados são aplicados
+
+class EstadoTranca(BaseModel):
+    id: int
+    status: Optional[str] = None
+    bicicleta: Optional[int] = Field(None, description="Id da bicicleta presa; null se a tranca ficou vazia.")
+    versao: Optional[int] = Field(None, description="Crescente por tranca; evento com versão menor é ignorado.")
+
+class EstadoBicicleta(BaseModel):
+    id: int
+    numero: Optional[int] = None
+    marca: Optional[str] = None
+    modelo: Optional[str] = None
+    ano: Optional[str] = None
+    status: Optional[str] = None
+    versao: Optional[int] = None
+
+class EventosEquipamento(BaseModel):
+    trancas: List[EstadoTranca] = []
+    bicicletas: List[EstadoBicicleta] = []
@@ -0,0 +1,28 @@
+from typing import Annotated
+from pydantic import AfterValidator, StringConstraints
+from pydantic_core import PydanticCustomError
+
+# Códigos ISO 3166-1 alpha-2 (pycountry 26.2.16). Tabela fixa para não carregar o JSON do pycountry,
+# que o CountryAlpha2 do pydantic_extra_types carrega inteiro na primeira validação (~7 ms).
+# Para atualizar: sorted(c.alpha_2 for c in pycountry.countries)
+CODIGOS_PAISES = frozenset("""
+    AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM BN BO BQ BR
+    BS BT BV BW BY BZ CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX CY CZ DE DJ DK DM DO DZ
+    EC EE EG EH ER ES ET FI FJ FK FM FO FR GA GB GD GE GF GG GH GI GL GM GN GP GQ GR GS GT GU GW
+    GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR IS IT JE JM JO JP KE KG KH KI KM KN KP KR KW KY
+    KZ LA LB LC LI LK LR LS LT LU LV LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ MR MS MT MU MV
+    MW MX MY MZ NA NC NE NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR PS PT PW PY
+    QA RE RO RS RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF TG
+    TH TJ TK TL TM TN TO TR TT TV TW TZ UA UG UM US UY UZ VA VC VE VG VI VN VU WF WS YE YT ZA ZM
+    ZW
+""".split())
+
+
+def _valida_pais(codigo: str) -> str:
+    if codigo not in CODIGOS_PAISES:
+        raise PydanticCustomError("country_alpha2", "Invalid country alpha2 code")
+    return codigo
+
+
+# mesmo comportamento do CountryAlpha2: aceita minúsculas e devolve o código em maiúsculas
+PaisAlpha2 = Annotated[str, StringConstraints(to_upper=True), AfterValidator(_valida_pais)]
@@ -1 +1,13 @@
-from .ciclista_service import CiclistaService
\ No newline at end of file
+from .ciclista_service import CiclistaService
+from .ciclista_service_async import CiclistaServiceAsync
+from .outbox_service import DespachanteEmail, estatisticas_outbox
+from .conciliacao_service import ConciliacaoService
+from .restauracao_service import RestauracaoBanco, RESTAURAR_MODO
+from .idempotencia_service import GuardaIdempotencia
+from .cobranca_pendente_service import DespachanteCobranca, estatisticas_cobrancas_pendentes
+from .indice_emails import IndiceEmails, indice_emails
+from .saida_rapida import RespostaRapida, SAIDA_RAPIDA
+from .replica_service import ReplicaLeitura
+from .escritor_service import EscritorBanco, ESCRITOR_UNICO
+from .travas import TravasPorChave, TravasPorChaveAsync, travas_aluguel_async
+from .espelho_equipamento import EspelhoEquipamento, espelho_equipamento, ESPELHO_TOKEN
\ No newline at end of file
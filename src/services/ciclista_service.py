@@ -1,22 +1,67 @@
-import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import HTTPException
+from pydantic import ValidationError
 from typing import List
-from fastapi.openapi.utils import status_code_ranges
+from sqlalchemy import select, insert, exists, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
-from ..models import Ciclista, CartaoCreditoDB, Passaporte, FuncionarioDB, AluguelDB
-from ..schemas import NovoCiclista, NovoCartaoDeCredito, NovoFuncionario, Funcionario, Aluguel, Devolucao, Bicicleta
-from ..controllers import AluguelController
-import requests
+from ..models import Ciclista, CartaoCreditoDB, Passaporte, FuncionarioDB, EmailOutboxDB
+from ..schemas import (NovoCiclista, NovoCartaoDeCredito, NovoFuncionario, Funcionario, Bicicleta,
+                       NovoCiclistaLote)
+from ..clients import ClienteHttp, obter_cliente, CacheTTL, cache_equipamento
+from ..metricas import medir_upstream
+from .consultas import (consulta_elegibilidade, consulta_ciclista, consulta_ciclista_resposta, consulta_cartao,
+                        consulta_cartao_resposta, consulta_email_utilizado, consulta_aluguel_aberto,
+                        consulta_funcionarios, consulta_funcionario, consulta_funcionario_resposta, CAMPOS_FUNCIONARIO)
+from .indice_emails import IndiceEmails, indice_emails, normalizar_email
+from .saida_rapida import CAMPOS_CARTAO, dto_ciclista, dto_simples
+from .escritor_service import EscritorBanco
+from .espelho_equipamento import EspelhoEquipamento, espelho_equipamento
+
+# importação em lote de ciclistas
+LOTE_TAMANHO_TRANSACAO = int(os.getenv("LOTE_TAMANHO_TRANSACAO", 500))
+LOTE_VALIDACOES_PARALELAS = int(os.getenv("LOTE_VALIDACOES_PARALELAS", 8))
+LOTE_CHUNK_CONSULTA = 900  # abaixo do limite de parâmetros por consulta do SQLite
 
 
 class CiclistaService:
-    def __init__(self, db: Session, url_externo:str = None, url_equipamento: str = None):
+    def __init__(self, db: Session, url_externo:str = None, url_equipamento: str = None,
+                 http_externo: ClienteHttp = None, http_equipamento: ClienteHttp = None,
+                 cache: CacheTTL = cache_equipamento, indice: IndiceEmails = indice_emails,
+                 escritor: EscritorBanco = None, espelho: EspelhoEquipamento = espelho_equipamento):
         self.db = db
         self.url_externo = url_externo
         self.url_equipamento = url_equipamento
+        # clientes com pool de conexões compartilhados pelo processo
+        self.http_externo = http_externo or obter_cliente(url_externo)
+        self.http_equipamento = http_equipamento or obter_cliente(url_equipamento)
+        # leituras de trancas e bicicletas; o destranca/tranca do CiclistaServiceAsync mantém as entradas coerentes
+        self.cache = cache
+        # emails já cadastrados, para responder "não existe" sem ir ao banco
+        self.indice_emails = indice
+        # fila única de escrita; sem ela as unidades gravam na sessão da requisição
+        self.escritor = escritor
+        # estado local de trancas e bicicletas alimentado por eventos; sem registro válido, vai ao equipamento
+        self.espelho = espelho
+
+    def _escrever(self, unidade):
+        """
+        Aplica uma unidade de escrita (função que recebe a Session e grava, sem commit): pelo EscritorBanco,
+        em group commit com as das outras threads, ou na sessão da requisição com um commit só.
+        """
+        if self.escritor is not None:
+            return self.escritor.executar(unidade)
+        try:
+            resultado = unidade(self.db)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return resultado
 
+    @medir_upstream("enviar_email")
     def enviar_email(self, assunto, mensagem, endereco_email):
-        url = self.url_externo + "/enviarEmail"
         # Dados do corpo da requisição
         corpo = {
             "email": endereco_email,
@@ -26,12 +71,16 @@ class CiclistaService:
         headers = {
             "Content-Type": "application/json"  # Certifique-se de enviar como JSON
         }
-        response = requests.post(url, json=corpo, headers=headers)
+        response = self.http_externo.post("/enviarEmail", dependencia="email", json=corpo, headers=headers)
         # verificando a resposta
         return response.status_code == 200
 
+    def enfileirar_email(self, assunto, mensagem, endereco_email, db: Session = None):
+        # grava na outbox dentro da transação atual; o DespachanteEmail faz o envio depois do commit
+        (db or self.db).add(EmailOutboxDB(email=endereco_email, assunto=assunto, mensagem=mensagem))
+
+    @medir_upstream("validar_cartao")
     def validar_cartao(self, cartao:NovoCartaoDeCredito):
-        url = self.url_externo + "/validaCartaoDeCredito"
         corpo = {
             "numero": cartao.numero,
             "validade": cartao.validade.isoformat(),
@@ -41,83 +90,67 @@ class CiclistaService:
         headers = {
             "Content-Type": "application/json"
         }
-        response = requests.post(url, json=corpo, headers=headers)
+        response = self.http_externo.post("/validaCartaoDeCredito", dependencia="pagamento",
+                                          json=corpo, headers=headers)
         return response.status_code == 200
 
+    @medir_upstream("busca_tranca")
     def busca_tranca(self, id_tranca: int):
-        url = self.url_equipamento + f"/tranca/{id_tranca}"
+        tranca = self.espelho.tranca(id_tranca)
+        if tranca is not None:
+            return tranca
+        tranca = self.cache.obter(("tranca", id_tranca))
+        if tranca is not None:
+            return tranca
         headers = {'accept': 'application/json'}
-        resp = requests.get(url, headers=headers)
+        resp = self.http_equipamento.get(f"/tranca/{id_tranca}", dependencia="equipamento", headers=headers)
         if resp.status_code != 200:
             return None
-        return resp.json()['tranca']
+        tranca = resp.json()['tranca']
+        self.cache.guardar(("tranca", id_tranca), tranca)
+        return tranca
 
+    @medir_upstream("busca_bicicleta")
     def busca_bicicleta(self, id_tranca: int):
-        url = self.url_equipamento + f"/tranca/{id_tranca}/bicicleta"
+        bicicleta = self.espelho.bicicleta_na_tranca(id_tranca)
+        if bicicleta is not None:
+            return bicicleta
+        bicicleta = self.cache.obter(("bicicleta_na_tranca", id_tranca))
+        if bicicleta is not None:
+            return bicicleta
         headers = {'accept': 'application/json'}
-        resp = requests.get(url, headers=headers)
+        resp = self.http_equipamento.get(f"/tranca/{id_tranca}/bicicleta", dependencia="equipamento", headers=headers)
         if resp.status_code != 200:
             return None
-        return resp.json()['bicicleta']
+        bicicleta = resp.json()['bicicleta']
+        self.cache.guardar(("bicicleta_na_tranca", id_tranca), bicicleta)
+        return bicicleta
 
+    @medir_upstream("busca_bicicleta_por_id")
     def busca_bicicleta_por_id(self, id_bicicleta):
-        url = self.url_equipamento + f"/bicicleta/{id_bicicleta}"
+        bicicleta = self.espelho.bicicleta(id_bicicleta)
+        if bicicleta is not None:
+            return bicicleta
+        bicicleta = self.cache.obter(("bicicleta", id_bicicleta))
+        if bicicleta is not None:
+            return bicicleta
         headers = {'accept': 'application/json'}
-        resp = requests.get(url, headers=headers)
+        resp = self.http_equipamento.get(f"/bicicleta/{id_bicicleta}", dependencia="equipamento", headers=headers)
         if resp.status_code != 200:
             return None
-        return resp.json()['bicicleta']
+        bicicleta = resp.json()['bicicleta']
+        self.cache.guardar(("bicicleta", id_bicicleta), bicicleta)
+        return bicicleta
 
     def bicicleta_em_uso(self, id_bicleta: int):
-        url = self.url_equipamento + f"/bicicleta/{id_bicleta}"
-        headers = {'accept': 'application/json'}
-        resp = requests.get(url, headers=headers)
-        if resp.status_code != 200:
+        # mesma consulta (e mesma entrada de cache) de busca_bicicleta_por_id
+        bicicleta = self.busca_bicicleta_por_id(id_bicleta)
+        if bicicleta is None:
             return False
-        return resp.json()['bicicleta']['status']=='EM_USO'
-
-    def destranca(self, id_tranca, id_bicicleta):
-        url = self.url_equipamento + f"/tranca/{id_tranca}/destrancar"
-        corpo = {
-            "bicicleta": id_bicicleta,
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, json=corpo, headers=headers)
-        if response.status_code != 200:
-            return None
-        return response.json()['tranca']
+        return bicicleta['status']=='EM_USO'
 
-    def tranca(self, id_tranca, id_bicicleta):
-        url = self.url_equipamento + f"/tranca/{id_tranca}/trancar"
-        corpo = {
-            "bicicleta": id_bicicleta,
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, json=corpo, headers=headers)
-        if response.status_code != 200:
-            return None
-        return response.json()['tranca']
-
-    def fazer_cobranca(self, id_ciclista, valor):
-        url = self.url_externo + "/cobranca"
-        corpo = {
-            "ciclista": id_ciclista,
-            "valor": valor
-        }
-        headers = {
-            "Content-Type": "application/json"
-        }
-        response = requests.post(url, json=corpo, headers=headers)
-        if response.status_code != 200:
-            return None
-        return response.json()
-
-    def fazer_cobranca_pendente(self, id_ciclista, valor):
-        url = self.url_externo + "/filaCobranca"
+    @medir_upstream("fazer_cobranca_pendente")
+    def fazer_cobranca_pendente(self, id_ciclista, valor, chave_idempotencia: str = None):
         corpo = {
             "ciclista": id_ciclista,
             "valor": valor
@@ -125,19 +158,29 @@ class CiclistaService:
         headers = {
             "Content-Type": "application/json"  # Certifique-se de enviar como JSON
         }
-        response = requests.post(url, json=corpo, headers=headers)
+        if chave_idempotencia:
+            headers["Idempotency-Key"] = chave_idempotencia
+        response = self.http_externo.post("/filaCobranca", dependencia="pagamento", json=corpo, headers=headers)
         if response.status_code != 200:
             return None
         return response.json()
 
-
-    def cadastrar_ciclista(self, ciclista: NovoCiclista, meio_de_pagamento: NovoCartaoDeCredito):
-
+    @staticmethod
+    def _confere_documentos(ciclista: NovoCiclista):
         if not ciclista.nacionalidade == 'BRASILEIRO' and ciclista.passaporte is None:
             raise Exception("Estrangeiro sem passaporte.")
         if ciclista.nacionalidade.lower() == 'ESTRANGEIRO' and ciclista.cpf is None:
             raise Exception("Brasileiro sem cpf.")
 
+    @staticmethod
+    def _mensagem_cadastro(nome: str) -> str:
+        return (f"Caro {nome},<br><br> Sua inscrição no sistema de bicletas do grupo A precisa ser validada agora"
+                f"<br><br>Cordialmente, <br>Grupo A")
+
+    def cadastrar_ciclista(self, ciclista: NovoCiclista, meio_de_pagamento: NovoCartaoDeCredito):
+
+        self._confere_documentos(ciclista)
+
         if self.conferir_email_ja_foi_utilizado(ciclista.email):
             raise Exception("Outro ciclista possui este email.")
 
@@ -157,42 +200,152 @@ class CiclistaService:
         if not cartao_valido:
             raise HTTPException(status_code=422, detail="Cartão de crédito inválido.")
 
-        # Adicionar o Ciclista ao banco de dados
-        self.db.add(novo_ciclista)
-        self.db.commit()
-        self.db.refresh(novo_ciclista)
-
-        # Criar o objeto de meio de pagamento associado ao ciclista
-        meio_de_pagamento_data = meio_de_pagamento.model_dump()
-        novo_meio_de_pagamento = CartaoCreditoDB(**meio_de_pagamento_data, ciclista_id=novo_ciclista.id)
-        self.db.add(novo_meio_de_pagamento)
-        self.db.commit()
+        def gravar(db: Session):
+            # Adicionar o Ciclista ao banco de dados (flush para obter o id sem fechar a transação)
+            db.add(novo_ciclista)
+            try:
+                db.flush()
+            except IntegrityError:
+                # cadastro simultâneo com o mesmo email: o índice único do banco decide
+                raise Exception("Outro ciclista possui este email.")
+
+            # Criar o objeto de meio de pagamento associado ao ciclista
+            meio_de_pagamento_data = meio_de_pagamento.model_dump()
+            db.add(CartaoCreditoDB(**meio_de_pagamento_data, ciclista_id=novo_ciclista.id))
+
+            # email para novo ciclista, no mesmo commit do cadastro
+            self.enfileirar_email(assunto="Cadastro de ciclista -- Grupo A",
+                                  mensagem=self._mensagem_cadastro(ciclista.nome),
+                                  endereco_email=ciclista.email, db=db)
+            db.flush()
+            db.refresh(novo_ciclista)
+            novo_ciclista.passaporte  # carregado antes de a sessão do escritor fechar
+            return novo_ciclista
+
+        novo_ciclista = self._escrever(gravar)
+        self.indice_emails.adicionar(novo_ciclista.email)
 
-        mensagem = (
-            f"Caro {ciclista.nome},<br><br> Sua inscrição no sistema de bicletas do grupo A precisa ser validada agora"
-            f"<br><br>Cordialmente, <br>Grupo A")
+        return novo_ciclista
 
-        # enviar email para novo ciclista
-        enviou_email = self.enviar_email(assunto="Cadastro de ciclista -- Grupo A",
-                                         mensagem=mensagem,
-                                         endereco_email=ciclista.email)
+    def emails_ja_utilizados(self, emails) -> set:
+        """
+        Quais dos emails (normalizados) já pertencem a algum ciclista. Só os que o índice em memória
+        não descarta vão ao banco, em poucas consultas IN.
+        """
+        self.indice_emails.sincronizar(self.db)
+        emails = [email for email in emails if self.indice_emails.pode_existir(email)]
+        usados = set()
+        for i in range(0, len(emails), LOTE_CHUNK_CONSULTA):
+            trecho = [func.lower(email) for email in emails[i:i + LOTE_CHUNK_CONSULTA]]
+            usados.update(normalizar_email(email) for email in self.db.execute(
+                select(Ciclista.email).where(func.lower(Ciclista.email).in_(trecho))).scalars())
+        return usados
+
+    def cadastrar_ciclistas_em_lote(self, linhas: List[dict]) -> List[dict]:
+        """
+        Importação em lote: valida cada linha, confere todos os emails de uma vez, valida os cartões
+        com concorrência limitada e grava em transações de LOTE_TAMANHO_TRANSACAO linhas com insert em massa.
+        Os emails de boas-vindas vão para a outbox. Retorna o resultado de cada linha, na ordem recebida.
+        """
+        resultados = [{"linha": i, "status": "ERRO", "id": None, "email": None, "erro": None}
+                      for i in range(len(linhas))]
+        validas = {}  # linha -> NovoCiclistaLote
+
+        for i, linha in enumerate(linhas):
+            try:
+                item = NovoCiclistaLote.model_validate(linha)
+                self._confere_documentos(item.ciclista)
+            except ValidationError as e:
+                resultados[i]["erro"] = "Parâmetros incorretos: " + "; ".join(
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                continue
+            except Exception as e:
+                resultados[i]["erro"] = str(e)
+                continue
+            resultados[i]["email"] = item.ciclista.email
+            validas[i] = item
+
+        # emails repetidos no próprio arquivo ou já cadastrados
+        usados = self.emails_ja_utilizados({item.ciclista.email for item in validas.values()})
+        vistos = set()
+        for i, item in list(validas.items()):
+            email = normalizar_email(item.ciclista.email)
+            if email in usados or email in vistos:
+                resultados[i]["erro"] = "Outro ciclista possui este email."
+                del validas[i]
+            vistos.add(email)
+
+        with ThreadPoolExecutor(max_workers=LOTE_VALIDACOES_PARALELAS) as executor:
+            cartoes_validos = dict(zip(validas, executor.map(
+                lambda item: self._valida_cartao_lote(item.meioDePagamento), validas.values())))
+        for i, erro in cartoes_validos.items():
+            if erro:
+                resultados[i]["erro"] = erro
+                del validas[i]
+
+        pendentes = list(validas.items())
+        for inicio in range(0, len(pendentes), LOTE_TAMANHO_TRANSACAO):
+            trecho = pendentes[inicio:inicio + LOTE_TAMANHO_TRANSACAO]
+            itens = [item for _, item in trecho]
+            try:
+                ids = self._escrever(lambda db: self._insere_lote(itens, db))
+                self.indice_emails.adicionar(*(item.ciclista.email for item in itens))
+            except Exception as e:
+                for i, _ in trecho:
+                    resultados[i]["erro"] = f"Erro ao gravar: {e.__class__.__name__}"
+                continue
+            for (i, _), id_ciclista in zip(trecho, ids):
+                resultados[i].update(status="CRIADO", id=id_ciclista)
+
+        return resultados
+
+    def _valida_cartao_lote(self, cartao: NovoCartaoDeCredito) -> str | None:
+        try:
+            return None if self.validar_cartao(cartao) else "Cartão de crédito inválido."
+        except Exception as e:
+            return f"Não foi possível validar o cartão: {e.__class__.__name__}"
+
+    @classmethod
+    def _insere_lote(cls, itens: List[NovoCiclistaLote], db: Session) -> List[int]:
+        dados_ciclistas = []
+        for item in itens:
+            dados = item.ciclista.model_dump(exclude={"passaporte"})
+            if dados["urlFotoDocumento"] is not None:
+                dados["urlFotoDocumento"] = str(dados["urlFotoDocumento"])
+            dados_ciclistas.append(dados)
+
+        ids = db.execute(
+            insert(Ciclista).returning(Ciclista.id, sort_by_parameter_order=True), dados_ciclistas
+        ).scalars().all()
+
+        db.execute(insert(CartaoCreditoDB), [
+            {**item.meioDePagamento.model_dump(), "ciclista_id": id_ciclista} for item, id_ciclista in zip(itens, ids)
+        ])
+        passaportes = [{**item.ciclista.passaporte.model_dump(), "ciclista_id": id_ciclista}
+                       for item, id_ciclista in zip(itens, ids) if item.ciclista.passaporte]
+        if passaportes:
+            db.execute(insert(Passaporte), passaportes)
+        db.execute(insert(EmailOutboxDB), [
+            {"email": item.ciclista.email, "assunto": "Cadastro de ciclista -- Grupo A",
+             "mensagem": cls._mensagem_cadastro(item.ciclista.nome)} for item in itens
+        ])
+        return ids
 
-        if not enviou_email:
-            raise HTTPException(422, "Não foi possível enviar o email")
+    def recupera_ciclista_por_id(self, id_ciclista:int):
+        return self.db.execute(consulta_ciclista(id_ciclista)).scalars().first()
 
-        return novo_ciclista
+    def recupera_ciclista_resposta(self, id_ciclista: int) -> dict | None:
+        """Caminho rápido do GET /ciclista/{id}: só as colunas da resposta, sem montar Ciclista nem validar."""
+        linha = self.db.execute(consulta_ciclista_resposta(id_ciclista)).mappings().first()
+        return dto_ciclista(linha) if linha else None
 
-    def recupera_ciclista_por_id(self, id_ciclista:int):
-        ciclista = (
-            self.db.query(Ciclista)
-            .options(joinedload(Ciclista.passaporte))
-            .filter(Ciclista.id == id_ciclista)
-            .first()
-        )
+    def atualizar_ciclista(self, id_ciclista: int, dados_ciclista: dict):
+        ciclista = self._escrever(lambda db: self._atualiza_ciclista(db, id_ciclista, dados_ciclista))
+        self.indice_emails.adicionar(ciclista.email)
         return ciclista
 
-    def atualizar_ciclista(self, id_ciclista: int, dados_ciclista: dict):
-        ciclista = self.recupera_ciclista_por_id(id_ciclista)
+    def _atualiza_ciclista(self, db: Session, id_ciclista: int, dados_ciclista: dict):
+        ciclista = db.execute(consulta_ciclista(id_ciclista)).scalars().first()
 
         if not ciclista:
             raise HTTPException(404, "Ciclista não encontrado")
@@ -219,65 +372,72 @@ class CiclistaService:
                             setattr(ciclista.passaporte, key, value)
                 else:
                     passaporte = Passaporte(**passaporte_dados, ciclista_id=ciclista.id)
-                    self.db.add(passaporte)
+                    db.add(passaporte)
                     ciclista.passaporte = passaporte
             else:
                 passaporte = ciclista.passaporte
-                self.db.delete(passaporte)
-                self.db.commit()
+                db.delete(passaporte)
                 ciclista.passaporte = None
 
-        self.db.commit()
-        self.db.refresh(ciclista)
-
         assunto = "Atualização de dados"
         mensagem = (f"Prezado {ciclista.nome},<br><br> Informamos que seus dados foram atualizados com sucesso"
                     f"<br><br>Cordialmente, <br>Grupo A")
 
-        enviou_email = self.enviar_email(assunto=assunto, mensagem=mensagem, endereco_email=ciclista.email)
-        if not enviou_email:
-            raise HTTPException(422, "Email não pode ser enviado.")
+        self.enfileirar_email(assunto=assunto, mensagem=mensagem, endereco_email=ciclista.email, db=db)
+
+        try:
+            db.flush()
+        except IntegrityError:
+            raise HTTPException(422, "Outro ciclista possui este email.")
+        db.refresh(ciclista)
+        ciclista.passaporte  # carregado antes de a sessão do escritor fechar
 
         return ciclista
 
     def ativar_ciclista(self, id_ciclista: int):
 
-        ciclista = self.recupera_ciclista_por_id(id_ciclista)
+        def ativar(db: Session):
+            ciclista = db.execute(consulta_ciclista(id_ciclista)).scalars().first()
 
-        if not ciclista:
-            raise HTTPException(status_code=404, detail="Cicilista não encontrado.")
+            if not ciclista:
+                raise HTTPException(status_code=404, detail="Cicilista não encontrado.")
 
-        if ciclista.status == 'CONFIRMADO':
-            raise HTTPException(status_code=422, detail="Ciclista já confirmado.")
+            if ciclista.status == 'CONFIRMADO':
+                raise HTTPException(status_code=422, detail="Ciclista já confirmado.")
 
-        ciclista.status = 'CONFIRMADO'
+            ciclista.status = 'CONFIRMADO'
+            db.flush()
+            return ciclista
 
         try:
-            self.db.commit()
-            self.db.refresh(ciclista)
+            return self._escrever(ativar)
+        except HTTPException:
+            raise
         except Exception as e:
-            self.db.rollback()
             raise HTTPException(status_code=500, detail="Erro ao ativar o ciclista.") from e
 
-        return ciclista
-
     def busca_cartao(self, id_ciclista: int):
         ciclista = self.recupera_ciclista_por_id(id_ciclista)
 
         if not ciclista:
             raise HTTPException(404, "Ciclista não encontrado")
 
-        cartao = (
-            self.db.query(CartaoCreditoDB)
-            .filter(CartaoCreditoDB.ciclista_id == ciclista.id)
-            .first()
-        )
+        cartao = self.db.execute(consulta_cartao(ciclista.id)).scalars().first()
 
         if not cartao:
             raise HTTPException(status_code=404, detail="Ciclista não tem cartão")
 
         return cartao
 
+    def busca_cartao_resposta(self, id_ciclista: int) -> dict:
+        """Caminho rápido do GET /cartaoDeCredito/{id}: ciclista e cartão numa consulta só."""
+        linha = self.db.execute(consulta_cartao_resposta(id_ciclista)).mappings().first()
+        if linha is None:
+            raise HTTPException(404, "Ciclista não encontrado")
+        if linha["id"] is None:
+            raise HTTPException(status_code=404, detail="Ciclista não tem cartão")
+        return dto_simples(linha, CAMPOS_CARTAO)
+
     def edita_cartao(self, id_ciclista: int, novo_cartao: NovoCartaoDeCredito):
         ciclista = self.recupera_ciclista_por_id(id_ciclista)
         if not ciclista:
@@ -291,51 +451,43 @@ class CiclistaService:
         if not cartao_valido:
             raise HTTPException(422, "Cartão de crédito inválido.")
 
-        cartao = (
-            self.db.query(CartaoCreditoDB)
-            .filter(CartaoCreditoDB.ciclista_id == ciclista.id)
-            .first()
-        )
-
         dados_cartao = novo_cartao.model_dump(exclude_unset=True)
-        for key, value in dados_cartao.items():
-            setattr(cartao, key, value)
+        nome, email = ciclista.nome, ciclista.email
 
-        self.db.commit()
-        self.db.refresh(cartao)
+        def gravar(db: Session):
+            cartao = db.execute(consulta_cartao(id_ciclista)).scalars().first()
+            for key, value in dados_cartao.items():
+                setattr(cartao, key, value)
 
-        enviou_email = self.enviar_email(assunto="Edição de Cartão -- Grupo A",
-                                         mensagem=f"Prezado {ciclista.nome},<br><br>"
-                                                  f"O cartão de crédito foi editado com sucesso.<br><br>"
-                                                  f"Cordialmente,<br>Grupo A",
-                                         endereco_email=ciclista.email)
-        if not enviou_email:
-            raise HTTPException(422, "Email não enviado.")
+            self.enfileirar_email(assunto="Edição de Cartão -- Grupo A",
+                                  mensagem=f"Prezado {nome},<br><br>"
+                                           f"O cartão de crédito foi editado com sucesso.<br><br>"
+                                           f"Cordialmente,<br>Grupo A",
+                                  endereco_email=email, db=db)
+
+        self._escrever(gravar)
 
     def conferir_email_ja_foi_utilizado(self, email):
-        return self.db.query(Ciclista).filter(Ciclista.email == email).first() is not None
+        # "não" sai do índice em memória; "talvez" é confirmado com EXISTS no índice único lower(email)
+        self.indice_emails.sincronizar(self.db)
+        if not self.indice_emails.pode_existir(email):
+            return False
+        return self.db.execute(consulta_email_utilizado(email)).scalar()
 
     def ciclista_pode_alugar(self, id_ciclista):
-        ciclista = self.recupera_ciclista_por_id(id_ciclista)
-        if ciclista is None:
+        linha = self.db.execute(consulta_elegibilidade(id_ciclista)).first()
+        if linha is None:
             raise HTTPException(404, "Ciclista não encontrado")
 
-        aluguel = self.db.query(AluguelDB).filter(AluguelDB.ciclista_id == id_ciclista, AluguelDB.horaFim.is_(None)).first()
-
-        if not aluguel and ciclista.status == 'CONFIRMADO':
-            return True
-        return False
+        status, tem_aluguel = linha
+        return not tem_aluguel and status == 'CONFIRMADO'
 
     def busca_bicicleta_alugada(self, id_ciclista):
         ciclista = self.recupera_ciclista_por_id(id_ciclista)
         if not ciclista:
             raise Exception("Ciclista não encontrado.")
 
-        aluguel = (
-            self.db.query(AluguelDB)
-            .filter(AluguelDB.ciclista_id == id_ciclista, AluguelDB.horaFim.is_(None))
-            .first()
-        )
+        aluguel = self.db.execute(consulta_aluguel_aberto(id_ciclista)).scalars().first()
         if aluguel is None:
             return None
         bicicleta_id = aluguel.bicicleta
@@ -352,170 +504,65 @@ class CiclistaService:
         return bicicleta
 
 
-    def recupera_funcionarios(self) -> List[Funcionario]:
-        funcionarios = self.db.query(FuncionarioDB).all()
-        return [Funcionario.model_validate(func) for func in funcionarios]
+    consulta_funcionarios = staticmethod(consulta_funcionarios)
+
+    def recupera_funcionarios(self, limite: int = None, apos: int = None, campos: List[str] = None) -> List[dict]:
+        # linhas direto do cursor, sem montar FuncionarioDB nem Funcionario
+        consulta = self.consulta_funcionarios(limite, apos, campos)
+        return [dict(linha._mapping) for linha in self.db.execute(consulta)]
+
+    def itera_funcionarios(self, limite: int = None, apos: int = None, campos: List[str] = None):
+        """Mesmo que recupera_funcionarios, mas lendo o cursor aos poucos (para respostas em streaming)."""
+        consulta = self.consulta_funcionarios(limite, apos, campos)
+        for linha in self.db.execute(consulta, execution_options={"yield_per": 500}):
+            yield dict(linha._mapping)
 
     def cadastrar_funcionario(self, funcionario: NovoFuncionario) -> Funcionario:
         # Cria o objeto Ciclista
         novo_funcionario = FuncionarioDB(**funcionario.model_dump())
-        self.db.add(novo_funcionario)
-        self.db.commit()
-        self.db.refresh(novo_funcionario)
-
-        return novo_funcionario
 
-    def recupera_funcionario(self, id_funcionario):
-        funcionario = self.db.query(FuncionarioDB).filter(FuncionarioDB.matricula == id_funcionario).first()
-        return funcionario
+        def gravar(db: Session):
+            db.add(novo_funcionario)
+            db.flush()
+            db.refresh(novo_funcionario)
+            return novo_funcionario
 
-    def editar_funcionario(self, id_funcionario, dados_funcionario):
-        funcionario = self.recupera_funcionario(id_funcionario)
-        if not funcionario:
-            return None
-        # altera eventuais os campos do funcionário
-        for key, value in dados_funcionario.items():
-            if hasattr(funcionario, key):
-                setattr(funcionario, key, value)
+        return self._escrever(gravar)
 
-        self.db.commit()
-        self.db.refresh(funcionario)
-        return self.db.query(FuncionarioDB).filter(FuncionarioDB.matricula == id_funcionario).first()
+    def recupera_funcionario(self, id_funcionario):
+        return self.db.execute(consulta_funcionario(id_funcionario)).scalars().first()
 
-    def delete_funcionario(self, id_funcionario: int):
-        # Recupera o funcionário pelo ID
-        funcionario = self.db.query(FuncionarioDB).filter(FuncionarioDB.matricula == id_funcionario).first()
+    def recupera_funcionario_resposta(self, id_funcionario: int) -> dict | None:
+        linha = self.db.execute(consulta_funcionario_resposta(id_funcionario)).mappings().first()
+        return dto_simples(linha, CAMPOS_FUNCIONARIO) if linha else None
 
-        if not funcionario:
-            return None
+    def editar_funcionario(self, id_funcionario, dados_funcionario):
 
-        # Deleta o funcionário
-        self.db.delete(funcionario)
-        self.db.commit()
+        def gravar(db: Session):
+            funcionario = db.execute(consulta_funcionario(id_funcionario)).scalars().first()
+            if not funcionario:
+                return None
+            # altera eventuais os campos do funcionário
+            for key, value in dados_funcionario.items():
+                if hasattr(funcionario, key):
+                    setattr(funcionario, key, value)
+            db.flush()
+            db.refresh(funcionario)
+            return funcionario
 
-        return True
+        return self._escrever(gravar)
 
-    def realizar_aluguel(self, id_ciclista, id_tranca_inicio):
-        ciclista = self.recupera_ciclista_por_id(id_ciclista)
-        if not ciclista:
-            raise HTTPException(status_code=404, detail="Ciclista não encontrado.")
+    def delete_funcionario(self, id_funcionario: int):
 
-        aluguel = self.db.query(AluguelDB).filter(AluguelDB.ciclista_id == id_ciclista,
-                                                  AluguelDB.trancaFim.is_(None)).first()
+        def apagar(db: Session):
+            # Recupera o funcionário pelo ID
+            funcionario = db.execute(consulta_funcionario(id_funcionario)).scalars().first()
 
-        if aluguel:
-            self.enviar_email(assunto="Aviso: você ainda possui uma aluguel ativo",
-                              mensagem=f"Prezado {ciclista.nome},<br><br>Notamos que você tentou fazer um novo aluguel, "
-                                       f"mas ainda existe outro em seu nome. Para realizar um novo aluguel, encerre seu aluguel atual.<br><br>"
-                                       f"Cordialmente,<br>Grupo A",
-                              endereco_email=ciclista.email)
-            raise HTTPException(status_code=422, detail="Ciclista já possui aluguel")
+            if not funcionario:
+                return None
 
-        if ciclista.status == 'AGUARDANDO_CONFIRMACAO':
-            raise HTTPException(status_code=422, detail="Ciclista precisa ser ativado.")
+            # Deleta o funcionário
+            db.delete(funcionario)
+            return True
 
-        bicicleta = self.busca_bicicleta(id_tranca=id_tranca_inicio)
-        if not bicicleta:
-            raise HTTPException(422, "Bicicleta não encontrada.")
-
-        tranca = self.busca_tranca(id_tranca_inicio)
-        if not tranca or tranca['status'] != 'OCUPADA':
-            raise HTTPException(422, "Tranca não encontrada ou com defeito.")
-
-        cobranca = self.fazer_cobranca(id_ciclista=id_ciclista, valor=10)
-        string_cobranca = "Houve cobrança de <b>R$10,00<b/>"
-        if not cobranca:
-            string_cobranca = "Há uma cobrança pendente de <b>R$10,00<b/>"
-            cobranca = self.fazer_cobranca_pendente(id_ciclista, 10)
-            if not cobranca:
-                raise HTTPException(422, 'Não foi possível fazer a cobrança.')
-
-        tranca = self.destranca(id_tranca=id_tranca_inicio, id_bicicleta=bicicleta['numero'])
-        if not tranca:
-            raise HTTPException(422, "Tranca não pode ser liberada.")
-
-        hora_inicio = datetime.datetime.now()
-
-        aluguel = Aluguel(
-            bicicleta=bicicleta['numero'],
-            trancaInicio=id_tranca_inicio,
-            cobranca=cobranca['id'],
-            ciclista=id_ciclista,
-            horaInicio=hora_inicio  # Definindo a hora de início corretamente
-        )
-
-        # Criando o objeto de banco de dados AluguelDB e inserindo no banco
-        aluguel_banco = AluguelDB(
-            ciclista_id = id_ciclista,
-            trancaInicio = id_tranca_inicio,
-            cobranca=cobranca['id'],
-            horaInicio=hora_inicio,
-            bicicleta=bicicleta['numero']
-        )
-
-        self.db.add(aluguel_banco)
-        self.db.commit()
-        self.db.refresh(aluguel_banco)
-
-        self.enviar_email("Aluguel de Bicicleta -- Grupo A",
-                          mensagem=f"Prezado {ciclista.nome},<br>"
-                                   f"O aluguel da bicicleta {bicicleta['numero']} foi feito com sucesso às {hora_inicio}<br>"
-                                   f"{string_cobranca}<br><br>Cordialmente,<br>Grupo A.",
-                          endereco_email=ciclista.email)
-
-        return aluguel
-
-    def realizar_devolucao(self, id_bicicleta, id_tranca_fim):
-        aluguel = self.db.query(AluguelDB).filter(AluguelDB.bicicleta == id_bicicleta,
-                                                  AluguelDB.trancaFim.is_(None),
-                                                  AluguelDB.horaFim.is_(None)).first()
-        if not aluguel:
-            raise HTTPException(status_code=404, detail="Tranca ou bicicleta não existem")
-
-        tranca = self.busca_tranca(id_tranca_fim)
-        if tranca is None or tranca['status'] != 'DISPONIVEL':
-            raise HTTPException(status_code=422, detail="Tranca não está disponível")
-
-        if not self.bicicleta_em_uso(id_bicicleta):
-            raise HTTPException(status_code=422, detail="Tranca não está disponível")
-
-        hora_inicial = aluguel.horaInicio
-        hora_final = datetime.datetime.now()
-
-        aluguel.horaFim = hora_final
-        aluguel.trancaFim = id_tranca_fim
-
-        valor_a_cobrar = AluguelController.calcula_valor_extra(hora_inicial, hora_final)
-        string_cobranca = ""
-        if valor_a_cobrar > 0:
-            string_cobranca = f"Houve uma cobranca adicional de R${valor_a_cobrar}."
-            nova_cobranca = self.fazer_cobranca(id_ciclista=aluguel.ciclista_id, valor=valor_a_cobrar)
-            if nova_cobranca is None:
-                cobranca_pendente = self.fazer_cobranca_pendente(aluguel.ciclista_id, valor=valor_a_cobrar)
-                if not cobranca_pendente:
-                    raise HTTPException(422, "Erro ao fazer cobranca.")
-                aluguel.cobranca_adicional = cobranca_pendente['id']
-                string_cobranca =f"Há uma cobranca pendente de R${valor_a_cobrar}."
-            aluguel.cobranca_adicional = nova_cobranca['id']
-
-        ciclista = self.recupera_ciclista_por_id(aluguel.ciclista_id)
-
-        self.enviar_email(mensagem=f"Prezado {ciclista.nome},<br><br> Registramos sua devolução às {aluguel.horaFim}.<br>"
-                          f"{string_cobranca}<br><br>Cordialmente,<br>Grupo A.", assunto="Devolução -- Grupo A",
-                          endereco_email=ciclista.email)
-
-        self.db.commit()
-        self.db.refresh(aluguel)
-
-        self.tranca(id_tranca_fim, id_bicicleta)
-
-        devolucao = Devolucao(
-            bicicleta=id_bicicleta,
-            horaInicio=hora_inicial,
-            horaFim=hora_final,
-            trancaFim=id_tranca_fim,
-            cobranca=aluguel.cobranca_adicional,
-            ciclista=aluguel.ciclista_id
-        )
-
-        return devolucao
\ No newline at end of file
+        return self._escrever(apagar)
@@ -0,0 +1,447 @@
+import asyncio
+import datetime
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models import Ciclista, AluguelDB, EmailOutboxDB, CobrancaPendenteDB
+from ..schemas import Aluguel, Devolucao, Bicicleta
+from ..controllers import AluguelController
+from ..clients import ClienteHttpAsync, obter_cliente_async, CacheTTL, cache_equipamento, DependenciaIndisponivel
+from ..metricas import medir_upstream
+from .consultas import (consulta_elegibilidade, consulta_ciclista, consulta_ciclista_resposta, consulta_cartao,
+                        consulta_cartao_resposta, consulta_email_utilizado, consulta_aluguel_aberto,
+                        consulta_funcionarios, consulta_funcionario, consulta_funcionario_resposta, CAMPOS_FUNCIONARIO)
+from .indice_emails import IndiceEmails, indice_emails
+from .saida_rapida import CAMPOS_CARTAO, dto_ciclista, dto_simples
+from .escritor_service import EscritorBanco
+from .espelho_equipamento import EspelhoEquipamento, espelho_equipamento
+from .travas import TravasPorChaveAsync, travas_aluguel_async
+
+
+class CiclistaServiceAsync:
+    """
+    Variante assíncrona do CiclistaService para o caminho do aluguel (/aluguel, /devolucao e permiteAluguel)
+    e para as leituras mais chamadas (ciclista, cartão, existeEmail, funcionário, bicicletaAlugada).
+    Consultas independentes aos serviços externos são feitas em paralelo com asyncio.gather.
+    As consultas ao banco são as mesmas do CiclistaService (ver consultas.py); os endpoints podem
+    migrar de um para o outro sem mudar a resposta.
+    """
+    def __init__(self, db: AsyncSession, url_externo: str = None, url_equipamento: str = None,
+                 http_externo: ClienteHttpAsync = None, http_equipamento: ClienteHttpAsync = None,
+                 cache: CacheTTL = cache_equipamento, indice: IndiceEmails = indice_emails,
+                 travas: TravasPorChaveAsync = travas_aluguel_async,
+                 espelho: EspelhoEquipamento = espelho_equipamento, escritor: EscritorBanco = None):
+        self.db = db
+        self.url_externo = url_externo
+        self.url_equipamento = url_equipamento
+        self.http_externo = http_externo or obter_cliente_async(url_externo)
+        self.http_equipamento = http_equipamento or obter_cliente_async(url_equipamento)
+        # mesmo cache de equipamento do CiclistaService
+        self.cache = cache
+        self.indice_emails = indice
+        # aluguel/devolução da mesma chave (ciclista, bicicleta, tranca) em fila; chaves diferentes em paralelo
+        self.travas = travas
+        # estado local de trancas e bicicletas; sem registro válido, a leitura vai ao equipamento
+        self.espelho = espelho
+        # mesma fila única de escrita do CiclistaService; sem ela as unidades gravam na sessão da requisição
+        self.escritor = escritor
+
+    async def _escrever(self, unidade):
+        """
+        Aplica uma unidade de escrita (função síncrona que recebe a Session e grava, sem commit): pelo
+        EscritorBanco, sem bloquear o event loop, ou na sessão da requisição (run_sync) com um commit só.
+        """
+        if self.escritor is not None:
+            return await self.escritor.executar_async(unidade)
+        try:
+            resultado = await self.db.run_sync(unidade)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return resultado
+
+    @medir_upstream("enviar_email")
+    async def enviar_email(self, assunto, mensagem, endereco_email):
+        corpo = {
+            "email": endereco_email,
+            "assunto": assunto,
+            "mensagem": mensagem
+        }
+        headers = {"Content-Type": "application/json"}
+        response = await self.http_externo.post("/enviarEmail", dependencia="email", json=corpo, headers=headers)
+        return response.status_code == 200
+
+    @staticmethod
+    def enfileirar_email(assunto, mensagem, endereco_email, db: Session):
+        # mesma outbox do CiclistaService: entra no commit da unidade de escrita e é enviada pelo DespachanteEmail
+        db.add(EmailOutboxDB(email=endereco_email, assunto=assunto, mensagem=mensagem))
+
+    @medir_upstream("busca_tranca")
+    async def busca_tranca(self, id_tranca: int):
+        tranca = self.espelho.tranca(id_tranca)
+        if tranca is not None:
+            return tranca
+        tranca = self.cache.obter(("tranca", id_tranca))
+        if tranca is not None:
+            return tranca
+        headers = {'accept': 'application/json'}
+        resp = await self.http_equipamento.get(f"/tranca/{id_tranca}", dependencia="equipamento", headers=headers)
+        if resp.status_code != 200:
+            return None
+        tranca = resp.json()['tranca']
+        self.cache.guardar(("tranca", id_tranca), tranca)
+        return tranca
+
+    @medir_upstream("busca_bicicleta")
+    async def busca_bicicleta(self, id_tranca: int):
+        bicicleta = self.espelho.bicicleta_na_tranca(id_tranca)
+        if bicicleta is not None:
+            return bicicleta
+        bicicleta = self.cache.obter(("bicicleta_na_tranca", id_tranca))
+        if bicicleta is not None:
+            return bicicleta
+        headers = {'accept': 'application/json'}
+        resp = await self.http_equipamento.get(f"/tranca/{id_tranca}/bicicleta", dependencia="equipamento",
+                                               headers=headers)
+        if resp.status_code != 200:
+            return None
+        bicicleta = resp.json()['bicicleta']
+        self.cache.guardar(("bicicleta_na_tranca", id_tranca), bicicleta)
+        return bicicleta
+
+    @medir_upstream("busca_bicicleta_por_id")
+    async def busca_bicicleta_por_id(self, id_bicicleta: int):
+        bicicleta = self.espelho.bicicleta(id_bicicleta)
+        if bicicleta is not None:
+            return bicicleta
+        bicicleta = self.cache.obter(("bicicleta", id_bicicleta))
+        if bicicleta is not None:
+            return bicicleta
+        headers = {'accept': 'application/json'}
+        resp = await self.http_equipamento.get(f"/bicicleta/{id_bicicleta}", dependencia="equipamento", headers=headers)
+        if resp.status_code != 200:
+            return None
+        bicicleta = resp.json()['bicicleta']
+        self.cache.guardar(("bicicleta", id_bicicleta), bicicleta)
+        return bicicleta
+
+    async def bicicleta_em_uso(self, id_bicicleta: int):
+        bicicleta = await self.busca_bicicleta_por_id(id_bicicleta)
+        if bicicleta is None:
+            return False
+        return bicicleta['status'] == 'EM_USO'
+
+    def _atualiza_cache_equipamento(self, id_tranca, id_bicicleta, tranca):
+        self.cache.invalidar(("tranca", id_tranca), ("bicicleta_na_tranca", id_tranca), ("bicicleta", id_bicicleta))
+        if tranca is not None:
+            self.cache.guardar(("tranca", id_tranca), tranca)
+        else:
+            self.espelho.esquecer(id_tranca, id_bicicleta)
+
+    @medir_upstream("destranca")
+    async def destranca(self, id_tranca, id_bicicleta, numero_bicicleta=None):
+        # o equipamento recebe o número da bicicleta; cache e espelho guardam a bicicleta pelo id
+        headers = {"Content-Type": "application/json"}
+        corpo = {"bicicleta": id_bicicleta if numero_bicicleta is None else numero_bicicleta}
+        response = await self.http_equipamento.post(f"/tranca/{id_tranca}/destrancar", dependencia="equipamento",
+                                                    json=corpo, headers=headers)
+        if response.status_code != 200:
+            self._atualiza_cache_equipamento(id_tranca, id_bicicleta, None)
+            return None
+        tranca = response.json()['tranca']
+        self._atualiza_cache_equipamento(id_tranca, id_bicicleta, tranca)
+        await asyncio.to_thread(self.espelho.destrancou, id_tranca, id_bicicleta, tranca)
+        return tranca
+
+    @medir_upstream("tranca")
+    async def tranca(self, id_tranca, id_bicicleta):
+        headers = {"Content-Type": "application/json"}
+        response = await self.http_equipamento.post(f"/tranca/{id_tranca}/trancar", dependencia="equipamento",
+                                                    json={"bicicleta": id_bicicleta}, headers=headers)
+        if response.status_code != 200:
+            self._atualiza_cache_equipamento(id_tranca, id_bicicleta, None)
+            return None
+        tranca = response.json()['tranca']
+        self._atualiza_cache_equipamento(id_tranca, id_bicicleta, tranca)
+        await asyncio.to_thread(self.espelho.trancou, id_tranca, id_bicicleta, tranca)
+        return tranca
+
+    @medir_upstream("fazer_cobranca")
+    async def fazer_cobranca(self, id_ciclista, valor):
+        headers = {"Content-Type": "application/json"}
+        try:
+            response = await self.http_externo.post("/cobranca", dependencia="pagamento",
+                                                    json={"ciclista": id_ciclista, "valor": valor},
+                                                    headers=headers)
+        except DependenciaIndisponivel:
+            # circuito aberto: a chamada nem saiu, então é seguro adiar a cobrança
+            return None
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    @staticmethod
+    def adiar_cobranca(aluguel: AluguelDB, valor, campo: str, db: Session):
+        """
+        Registra a cobrança na fila local, na mesma transação do aluguel; o DespachanteCobranca envia
+        ao /filaCobranca depois e grava o id em aluguel.<campo>, que fica NULL até lá.
+        """
+        db.flush()
+        pendente = CobrancaPendenteDB(ciclista_id=aluguel.ciclista_id, aluguel_id=aluguel.id, campo=campo,
+                                      valor=valor)
+        db.add(pendente)
+        db.flush()
+        return pendente
+
+    async def recupera_ciclista_por_id(self, id_ciclista: int, com_passaporte: bool = False):
+        # na AsyncSession não há lazy load: quem serializa o passaporte precisa pedir o join
+        if com_passaporte:
+            return (await self.db.execute(consulta_ciclista(id_ciclista))).scalars().first()
+        return await self.db.get(Ciclista, id_ciclista)
+
+    async def recupera_ciclista_resposta(self, id_ciclista: int) -> dict | None:
+        linha = (await self.db.execute(consulta_ciclista_resposta(id_ciclista))).mappings().first()
+        return dto_ciclista(linha) if linha else None
+
+    async def busca_cartao(self, id_ciclista: int):
+        ciclista = await self.recupera_ciclista_por_id(id_ciclista)
+        if not ciclista:
+            raise HTTPException(404, "Ciclista não encontrado")
+
+        cartao = (await self.db.execute(consulta_cartao(ciclista.id))).scalars().first()
+        if not cartao:
+            raise HTTPException(status_code=404, detail="Ciclista não tem cartão")
+        return cartao
+
+    async def busca_cartao_resposta(self, id_ciclista: int) -> dict:
+        linha = (await self.db.execute(consulta_cartao_resposta(id_ciclista))).mappings().first()
+        if linha is None:
+            raise HTTPException(404, "Ciclista não encontrado")
+        if linha["id"] is None:
+            raise HTTPException(status_code=404, detail="Ciclista não tem cartão")
+        return dto_simples(linha, CAMPOS_CARTAO)
+
+    async def conferir_email_ja_foi_utilizado(self, email):
+        # o índice em memória é síncrono; a sincronização (quando vence) roda na conexão da AsyncSession
+        await self.db.run_sync(self.indice_emails.sincronizar)
+        if not self.indice_emails.pode_existir(email):
+            return False
+        return (await self.db.execute(consulta_email_utilizado(email))).scalar()
+
+    async def busca_bicicleta_alugada(self, id_ciclista):
+        ciclista = await self.recupera_ciclista_por_id(id_ciclista)
+        if not ciclista:
+            raise Exception("Ciclista não encontrado.")
+
+        aluguel = (await self.db.execute(consulta_aluguel_aberto(id_ciclista))).scalars().first()
+        if aluguel is None:
+            return None
+
+        bicicleta = await self.busca_bicicleta_por_id(id_bicicleta=aluguel.bicicleta)
+        if not bicicleta:
+            raise HTTPException(404, "Bicicleta não encontrada.")
+        return Bicicleta(id=bicicleta['id'],
+                         marca=bicicleta['marca'],
+                         modelo=bicicleta['modelo'],
+                         ano=bicicleta['ano'],
+                         numero=bicicleta['numero'],
+                         status=bicicleta['status'])
+
+    async def recupera_funcionarios(self, limite: int = None, apos: int = None, campos: List[str] = None) -> List[dict]:
+        consulta = consulta_funcionarios(limite, apos, campos)
+        return [dict(linha._mapping) for linha in await self.db.execute(consulta)]
+
+    async def recupera_funcionario(self, id_funcionario):
+        return (await self.db.execute(consulta_funcionario(id_funcionario))).scalars().first()
+
+    async def recupera_funcionario_resposta(self, id_funcionario: int) -> dict | None:
+        linha = (await self.db.execute(consulta_funcionario_resposta(id_funcionario))).mappings().first()
+        return dto_simples(linha, CAMPOS_FUNCIONARIO) if linha else None
+
+    async def ciclista_pode_alugar(self, id_ciclista):
+        linha = (await self.db.execute(consulta_elegibilidade(id_ciclista))).first()
+        if linha is None:
+            raise HTTPException(404, "Ciclista não encontrado")
+
+        status, tem_aluguel = linha
+        return not tem_aluguel and status == 'CONFIRMADO'
+
+    async def realizar_aluguel(self, id_ciclista, id_tranca_inicio):
+        # a checagem do aluguel em aberto, a cobrança e o insert ficam sob a mesma trava: a segunda
+        # requisição do mesmo ciclista (ou da mesma tranca) espera a primeira e já vê o aluguel dela
+        async with self.travas.travar(("ciclista", id_ciclista), ("tranca", id_tranca_inicio)):
+            return await self._realizar_aluguel(id_ciclista, id_tranca_inicio)
+
+    async def _realizar_aluguel(self, id_ciclista, id_tranca_inicio):
+        ciclista = await self.recupera_ciclista_por_id(id_ciclista)
+        if not ciclista:
+            raise HTTPException(status_code=404, detail="Ciclista não encontrado.")
+
+        resultado = await self.db.execute(
+            select(AluguelDB).filter(AluguelDB.ciclista_id == id_ciclista, AluguelDB.trancaFim.is_(None)).limit(1)
+        )
+        if resultado.scalars().first():
+            await self._escrever(lambda db: self.enfileirar_email(
+                assunto="Aviso: você ainda possui uma aluguel ativo",
+                mensagem=f"Prezado {ciclista.nome},<br><br>Notamos que você tentou fazer um novo aluguel, "
+                         f"mas ainda existe outro em seu nome. Para realizar um novo aluguel, encerre seu aluguel atual.<br><br>"
+                         f"Cordialmente,<br>Grupo A",
+                endereco_email=ciclista.email, db=db))
+            raise HTTPException(status_code=422, detail="Ciclista já possui aluguel")
+
+        if ciclista.status == 'AGUARDANDO_CONFIRMACAO':
+            raise HTTPException(status_code=422, detail="Ciclista precisa ser ativado.")
+
+        # bicicleta na tranca e status da tranca são independentes: uma única ida ao equipamento
+        bicicleta, tranca = await asyncio.gather(self.busca_bicicleta(id_tranca_inicio),
+                                                 self.busca_tranca(id_tranca_inicio))
+        if not bicicleta:
+            raise HTTPException(422, "Bicicleta não encontrada.")
+        if not tranca or tranca['status'] != 'OCUPADA':
+            raise HTTPException(422, "Tranca não encontrada ou com defeito.")
+
+        hora_inicio = datetime.datetime.now()
+
+        # o aluguel é gravado antes da cobrança e do destrancar: quem perde a disputa pelos índices únicos
+        # da 0006 (outro worker, mesma bicicleta ou ciclista) recebe 422 sem ter cobrado nem liberado nada
+        def reservar(db: Session):
+            aluguel_banco = AluguelDB(ciclista_id=id_ciclista, trancaInicio=id_tranca_inicio,
+                                      horaInicio=hora_inicio, bicicleta=bicicleta['numero'])
+            db.add(aluguel_banco)
+            try:
+                db.flush()
+            except IntegrityError:
+                raise HTTPException(status_code=422, detail="Ciclista ou bicicleta já possui aluguel em aberto.")
+            return aluguel_banco.id
+
+        id_aluguel = await self._escrever(reservar)
+
+        def desfazer(db: Session):
+            db.execute(delete(AluguelDB).where(AluguelDB.id == id_aluguel))
+
+        try:
+            cobranca = await self.fazer_cobranca(id_ciclista=id_ciclista, valor=10)
+            tranca = await self.destranca(id_tranca=id_tranca_inicio, id_bicicleta=bicicleta['id'],
+                                          numero_bicicleta=bicicleta['numero'])
+        except Exception:
+            await self._escrever(desfazer)
+            raise
+        if not tranca:
+            await self._escrever(desfazer)
+            raise HTTPException(422, "Tranca não pode ser liberada.")
+
+        string_cobranca = "Houve cobrança de <b>R$10,00<b/>"
+        if not cobranca:
+            # pagamento fora do ar: a cobrança vai para a fila local e segue o aluguel
+            string_cobranca = "Há uma cobrança pendente de <b>R$10,00<b/>"
+
+        def gravar(db: Session):
+            aluguel_banco = db.get(AluguelDB, id_aluguel)
+            if cobranca:
+                aluguel_banco.cobranca = cobranca['id']
+            else:
+                self.adiar_cobranca(aluguel_banco, 10, "cobranca", db)
+            self.enfileirar_email("Aluguel de Bicicleta -- Grupo A",
+                                  mensagem=f"Prezado {ciclista.nome},<br>"
+                                           f"O aluguel da bicicleta {bicicleta['numero']} foi feito com sucesso às {hora_inicio}<br>"
+                                           f"{string_cobranca}<br><br>Cordialmente,<br>Grupo A.",
+                                  endereco_email=ciclista.email, db=db)
+            return aluguel_banco.cobranca
+
+        return Aluguel(
+            bicicleta=bicicleta['numero'],
+            trancaInicio=id_tranca_inicio,
+            cobranca=await self._escrever(gravar),
+            ciclista=id_ciclista,
+            horaInicio=hora_inicio
+        )
+
+    async def realizar_devolucao(self, id_bicicleta, id_tranca_fim):
+        # duas devoluções da mesma bicicleta: a segunda só busca o aluguel depois que a primeira o fechou
+        async with self.travas.travar(("bicicleta", id_bicicleta), ("tranca", id_tranca_fim)):
+            return await self._realizar_devolucao(id_bicicleta, id_tranca_fim)
+
+    async def _realizar_devolucao(self, id_bicicleta, id_tranca_fim):
+        resultado = await self.db.execute(
+            select(AluguelDB).filter(AluguelDB.bicicleta == id_bicicleta,
+                                     AluguelDB.trancaFim.is_(None),
+                                     AluguelDB.horaFim.is_(None)).limit(1)
+        )
+        aluguel = resultado.scalars().first()
+        if not aluguel:
+            raise HTTPException(status_code=404, detail="Tranca ou bicicleta não existem")
+
+        # status da tranca, status da bicicleta e dados do ciclista em paralelo
+        tranca, em_uso, ciclista = await asyncio.gather(self.busca_tranca(id_tranca_fim),
+                                                        self.bicicleta_em_uso(id_bicicleta),
+                                                        self.recupera_ciclista_por_id(aluguel.ciclista_id))
+        if tranca is None or tranca['status'] != 'DISPONIVEL':
+            raise HTTPException(status_code=422, detail="Tranca não está disponível")
+
+        if not em_uso:
+            raise HTTPException(status_code=422, detail="Tranca não está disponível")
+
+        hora_inicial = aluguel.horaInicio
+        hora_final = datetime.datetime.now()
+        id_aluguel, id_ciclista = aluguel.id, aluguel.ciclista_id
+
+        # fecha antes de cobrar: a devolução da mesma bicicleta noutro worker (que não tem a trava deste)
+        # recebe 404 sem ter feito a cobrança adicional
+        def fechar(db: Session):
+            if not db.execute(
+                update(AluguelDB)
+                .where(AluguelDB.id == id_aluguel, AluguelDB.horaFim.is_(None))
+                .values(horaFim=hora_final, trancaFim=id_tranca_fim)
+            ).rowcount:
+                raise HTTPException(status_code=404, detail="Tranca ou bicicleta não existem")
+
+        await self._escrever(fechar)
+
+        def reabrir(db: Session):
+            # o aluguel volta a ficar aberto, como se a devolução não tivesse começado
+            db.execute(update(AluguelDB).where(AluguelDB.id == id_aluguel, AluguelDB.horaFim == hora_final)
+                       .values(horaFim=None, trancaFim=None))
+
+        # a cobrança sai entre as duas unidades de escrita: chamada externa não pode segurar a fila do escritor
+        valor_a_cobrar = AluguelController.calcula_valor_extra(hora_inicial, hora_final)
+        string_cobranca = ""
+        nova_cobranca = None
+        if valor_a_cobrar > 0:
+            string_cobranca = f"Houve uma cobranca adicional de R${valor_a_cobrar}."
+            try:
+                nova_cobranca = await self.fazer_cobranca(id_ciclista=id_ciclista, valor=valor_a_cobrar)
+            except Exception:
+                await self._escrever(reabrir)
+                raise
+            if nova_cobranca is None:
+                string_cobranca = f"Há uma cobranca pendente de R${valor_a_cobrar}."
+
+        def gravar(db: Session):
+            aluguel = db.get(AluguelDB, id_aluguel, populate_existing=True)
+            if valor_a_cobrar > 0:
+                if nova_cobranca is None:
+                    self.adiar_cobranca(aluguel, valor_a_cobrar, "cobranca_adicional", db)
+                else:
+                    aluguel.cobranca_adicional = nova_cobranca['id']
+            self.enfileirar_email(mensagem=f"Prezado {ciclista.nome},<br><br> Registramos sua devolução às {hora_final}.<br>"
+                                           f"{string_cobranca}<br><br>Cordialmente,<br>Grupo A.",
+                                  assunto="Devolução -- Grupo A",
+                                  endereco_email=ciclista.email, db=db)
+            return aluguel.cobranca_adicional
+
+        cobranca_adicional = await self._escrever(gravar)
+
+        await self.tranca(id_tranca_fim, id_bicicleta)
+
+        return Devolucao(
+            bicicleta=id_bicicleta,
+            horaInicio=hora_inicial,
+            horaFim=hora_final,
+            trancaFim=id_tranca_fim,
+            cobranca=cobranca_adicional,
+            ciclista=id_ciclista
+        )
@@ -0,0 +1,215 @@
+import datetime
+import math
+import os
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from ..clients import dependencias
+from ..models import CobrancaPendenteDB, AluguelDB
+from .ciclista_service import CiclistaService
+from .escritor_service import EscritorBanco
+
+COBRANCA_PENDENTE_INTERVALO = float(os.getenv("COBRANCA_PENDENTE_INTERVALO", 5))  # segundos entre varreduras
+COBRANCA_PENDENTE_LOTE = int(os.getenv("COBRANCA_PENDENTE_LOTE", 200))  # pendências lidas por varredura
+COBRANCA_PENDENTE_BACKOFF_BASE = float(os.getenv("COBRANCA_PENDENTE_BACKOFF_BASE", 5))
+COBRANCA_PENDENTE_BACKOFF_MAX = float(os.getenv("COBRANCA_PENDENTE_BACKOFF_MAX", 600))
+COBRANCA_PENDENTE_MAX_TENTATIVAS = int(os.getenv("COBRANCA_PENDENTE_MAX_TENTATIVAS", 20))  # depois disso, FALHOU
+# segundos além do pior caso do envio dos lotes reservados numa varredura
+COBRANCA_PENDENTE_RESERVA_FOLGA = float(os.getenv("COBRANCA_PENDENTE_RESERVA_FOLGA", 30))
+
+
+def estatisticas_cobrancas_pendentes(db: Session) -> dict:
+    pendentes, valor, mais_antiga = (
+        db.query(func.count(CobrancaPendenteDB.id), func.sum(CobrancaPendenteDB.valor),
+                 func.min(CobrancaPendenteDB.criadoEm))
+        .filter(CobrancaPendenteDB.status.in_(('PENDENTE', 'ENVIANDO')))
+        .one()
+    )
+    falhas = db.query(func.count(CobrancaPendenteDB.id)).filter(CobrancaPendenteDB.status == 'FALHOU').scalar()
+    idade = (datetime.datetime.now() - mais_antiga).total_seconds() if mais_antiga else 0.0
+    return {"pendentes": pendentes, "valorPendente": valor or 0.0, "idadeMaisAntigaSegundos": idade,
+            "falhas": falhas}
+
+
+class DespachanteCobranca:
+    """
+    Thread em segundo plano que esvazia a fila local de cobranças adiadas (ver CiclistaServiceAsync.adiar_cobranca).
+
+    As pendências de cada ciclista são somadas num lote e enviadas numa única chamada ao /filaCobranca,
+    com o id do lote como Idempotency-Key. O lote é fixado antes do envio e reaproveitado nas novas
+    tentativas, então uma falha ambígua (timeout) não gera segunda cobrança se o provedor respeitar a
+    chave. O id devolvido é gravado no aluguel com UPDATE condicional: cada pendência é aplicada uma vez.
+
+    Cada varredura reserva os lotes pelo pior caso do envio (duracao_reserva) e só grava o resultado nos
+    lotes que ainda têm essa reserva: se ela venceu e outro worker pegou o lote, o resultado dele é que
+    vale. Após COBRANCA_PENDENTE_MAX_TENTATIVAS recusas o lote fica como FALHOU, à vista da conciliação.
+    Formação, reserva e resultado dos lotes são gravados pelo EscritorBanco, quando há um; as buscas
+    do que está pendente são só leitura e não entram na fila de escrita.
+    """
+    def __init__(self, session_factory, url_externo: str, intervalo: float = COBRANCA_PENDENTE_INTERVALO,
+                 lote: int = COBRANCA_PENDENTE_LOTE, envios_paralelos: int = 4, escritor: EscritorBanco = None):
+        self.session_factory = session_factory
+        self.escritor = escritor
+        self.url_externo = url_externo
+        self.intervalo = intervalo
+        self.lote = lote
+        self.envios_paralelos = envios_paralelos
+        self.executor = ThreadPoolExecutor(max_workers=envios_paralelos, thread_name_prefix="cobranca-envio")
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, name="cobranca-pendente", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.executor.shutdown(wait=False)
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.processar_lote()
+            except Exception:
+                pass
+            self._parar.wait(self.intervalo)
+
+    def processar_lote(self) -> int:
+        """Agrupa as pendências novas em lotes e envia os lotes vencidos. Retorna quantos lotes foram enviados."""
+        db = self.session_factory()
+        try:
+            self._formar_lotes(db)
+            reserva, lotes = self._reservar_lotes(db)
+            if not lotes:
+                return 0
+
+            service = CiclistaService(db, url_externo=self.url_externo)
+            resultados = list(self.executor.map(lambda item: self._enviar(service, *item), lotes.items()))
+
+            def gravar(sessao: Session):
+                agora = datetime.datetime.now()
+                for lote, (cobranca, erro) in zip(lotes, resultados):
+                    # reserva vencida e retomada por outro worker: o lote não é mais deste
+                    pendencias = (sessao.query(CobrancaPendenteDB)
+                                  .filter(CobrancaPendenteDB.lote == lote, CobrancaPendenteDB.status == 'ENVIANDO',
+                                          CobrancaPendenteDB.proximaTentativa == reserva)
+                                  .all())
+                    if cobranca is not None:
+                        self._aplicar(sessao, pendencias, cobranca['id'], agora)
+                        continue
+                    for pendencia in pendencias:
+                        pendencia.tentativas += 1
+                        pendencia.ultimoErro = erro[:250]
+                        if pendencia.tentativas >= COBRANCA_PENDENTE_MAX_TENTATIVAS:
+                            pendencia.status = 'FALHOU'
+                            continue
+                        espera = min(COBRANCA_PENDENTE_BACKOFF_BASE * 2 ** (pendencia.tentativas - 1),
+                                     COBRANCA_PENDENTE_BACKOFF_MAX)
+                        pendencia.proximaTentativa = agora + datetime.timedelta(seconds=espera)
+
+            self._escrever(db, gravar)
+            return len(lotes)
+        finally:
+            db.close()
+
+    def _escrever(self, db: Session, unidade):
+        if self.escritor is not None:
+            return self.escritor.executar(unidade)
+        resultado = unidade(db)
+        db.commit()
+        return resultado
+
+    def _formar_lotes(self, db: Session):
+        novas = (
+            db.query(CobrancaPendenteDB.id, CobrancaPendenteDB.ciclista_id)
+            .filter(CobrancaPendenteDB.status == 'PENDENTE')
+            .order_by(CobrancaPendenteDB.id)
+            .limit(self.lote)
+            .all()
+        )
+        db.rollback()  # encerra a leitura antes de gravar
+        if not novas:
+            return
+        por_ciclista = defaultdict(list)
+        for id_pendencia, id_ciclista in novas:
+            por_ciclista[id_ciclista].append(id_pendencia)
+
+        def formar(sessao: Session):
+            for ids in por_ciclista.values():
+                # só passa a ENVIANDO o que ainda está PENDENTE: outro worker pode ter formado o lote antes
+                sessao.execute(
+                    update(CobrancaPendenteDB)
+                    .where(CobrancaPendenteDB.id.in_(ids), CobrancaPendenteDB.status == 'PENDENTE')
+                    .values(status='ENVIANDO', lote=uuid.uuid4().hex)
+                )
+
+        self._escrever(db, formar)
+
+    def duracao_reserva(self, quantidade: int) -> float:
+        """
+        Segundos que `quantidade` lotes ficam reservados: no pior caso saem em rodadas de envios_paralelos,
+        cada envio esperando a vaga do bulkhead e os timeouts de conexão e leitura da dependência "pagamento".
+        """
+        pagamento = dependencias["pagamento"]
+        conexao, leitura = pagamento.timeout
+        rodadas = math.ceil(quantidade / self.envios_paralelos)
+        return rodadas * (pagamento.bulkhead.espera + conexao + leitura) + COBRANCA_PENDENTE_RESERVA_FOLGA
+
+    def _reservar_lotes(self, db: Session) -> tuple:
+        """Reserva os lotes vencidos e devolve (fim da reserva, lote -> (ciclista, valor somado das pendências))."""
+        agora = datetime.datetime.now()
+        vencidas = (
+            db.query(CobrancaPendenteDB.lote)
+            .filter(CobrancaPendenteDB.status == 'ENVIANDO', CobrancaPendenteDB.proximaTentativa <= agora)
+            .distinct()
+            .limit(self.lote)
+            .all()
+        )
+        db.rollback()
+        if not vencidas:
+            return None, {}
+        reserva = agora + datetime.timedelta(seconds=self.duracao_reserva(len(vencidas)))
+
+        def reservar(sessao: Session) -> dict:
+            lotes = {}
+            for (lote,) in vencidas:
+                reservado = sessao.execute(
+                    update(CobrancaPendenteDB)
+                    .where(CobrancaPendenteDB.lote == lote, CobrancaPendenteDB.status == 'ENVIANDO',
+                           CobrancaPendenteDB.proximaTentativa <= agora)
+                    .values(proximaTentativa=reserva)
+                ).rowcount
+                if reservado:
+                    lotes[lote] = tuple(
+                        sessao.query(func.min(CobrancaPendenteDB.ciclista_id), func.sum(CobrancaPendenteDB.valor))
+                        .filter(CobrancaPendenteDB.lote == lote).one())
+            return lotes
+
+        return reserva, self._escrever(db, reservar)
+
+    @staticmethod
+    def _enviar(service: CiclistaService, lote: str, ciclista_e_valor: tuple) -> tuple:
+        """Retorna (cobrança, None) se o provedor aceitou, ou (None, descrição do erro)."""
+        id_ciclista, valor = ciclista_e_valor
+        try:
+            cobranca = service.fazer_cobranca_pendente(id_ciclista, valor, chave_idempotencia=lote)
+            if cobranca:
+                return cobranca, None
+            return None, "Serviço de pagamento recusou a cobrança"
+        except Exception as e:
+            return None, str(e) or e.__class__.__name__
+
+    @staticmethod
+    def _aplicar(db: Session, pendencias, id_cobranca: int, agora: datetime.datetime):
+        for pendencia in pendencias:
+            campo = getattr(AluguelDB, pendencia.campo)
+            db.execute(update(AluguelDB).where(AluguelDB.id == pendencia.aluguel_id, campo.is_(None))
+                       .values({pendencia.campo: id_cobranca}))
+            pendencia.status = 'ENVIADA'
+            pendencia.cobrancaId = id_cobranca
+            pendencia.enviadaEm = agora
@@ -0,0 +1,139 @@
+"""
+Recalcula as cobranças adicionais do histórico de aluguéis e aponta divergências.
+
+Uso pela linha de comando (relatório em JSON na saída padrão):
+
+    python -m src.services.conciliacao_service --inicio 2025-01-01 --fim 2025-04-01 --cobrancas provedor.csv
+
+O CSV opcional do provedor de pagamento tem as colunas id,valor (id da cobrança e valor cobrado).
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+from typing import Dict, Optional
+from sqlalchemy import exists, select, String, type_coerce
+from sqlalchemy.orm import Session
+from ..models import AluguelDB, CobrancaPendenteDB
+from ..controllers import AluguelController
+
+CONCILIACAO_CHUNK = int(os.getenv("CONCILIACAO_CHUNK", 100_000))
+
+# tipos de divergência
+COBRANCA_AUSENTE = "COBRANCA_AUSENTE"  # havia valor extra, mas nenhuma cobranca_adicional registrada
+COBRANCA_INDEVIDA = "COBRANCA_INDEVIDA"  # há cobranca_adicional, mas o valor extra calculado é zero
+VALOR_DIVERGENTE = "VALOR_DIVERGENTE"  # o provedor cobrou um valor diferente do calculado
+COBRANCA_PENDENTE = "COBRANCA_PENDENTE"  # sem cobranca_adicional: ela está na fila cobranca_pendente (ou FALHOU lá)
+
+
+class ConciliacaoService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _carrega_chunk(self, apos_id: int, inicio, fim, tamanho: int):
+        # cobrança adicional adiada (ver CiclistaServiceAsync.adiar_cobranca) que o DespachanteCobranca ainda não enviou
+        pendente = exists().where(CobrancaPendenteDB.aluguel_id == AluguelDB.id,
+                                  CobrancaPendenteDB.campo == "cobranca_adicional",
+                                  CobrancaPendenteDB.status != 'ENVIADA')
+        # datas como texto cru do SQLite: o numpy converte direto, sem criar um datetime por linha
+        consulta = (
+            select(AluguelDB.id, type_coerce(AluguelDB.horaInicio, String), type_coerce(AluguelDB.horaFim, String),
+                   AluguelDB.cobranca_adicional, pendente)
+            .where(AluguelDB.id > apos_id, AluguelDB.horaFim.is_not(None))
+            .order_by(AluguelDB.id)
+            .limit(tamanho)
+        )
+        if inicio is not None:
+            consulta = consulta.where(AluguelDB.horaFim >= inicio)
+        if fim is not None:
+            consulta = consulta.where(AluguelDB.horaFim < fim)
+        linhas = self.db.execute(consulta).all()
+        if not linhas:
+            return None
+        import numpy as np  # só aqui: o relatório é raro e o numpy atrasaria a subida do worker
+        ids, inicios, fins, cobrancas, pendentes = zip(*linhas)
+        return (np.array(ids, dtype=np.int64),
+                np.array(inicios, dtype="datetime64[us]"),
+                np.array(fins, dtype="datetime64[us]"),
+                np.array([-1 if c is None else c for c in cobrancas], dtype=np.int64),
+                np.array(pendentes, dtype=bool))
+
+    def conciliar(self, inicio: Optional[datetime.datetime] = None, fim: Optional[datetime.datetime] = None,
+                  valores_cobrados: Optional[Dict[int, float]] = None, tamanho_chunk: int = CONCILIACAO_CHUNK,
+                  max_divergencias: Optional[int] = None) -> dict:
+        """
+        Percorre os aluguéis encerrados (horaFim entre inicio e fim) em blocos, calcula o valor extra
+        de forma vetorizada e compara com o que foi registrado.
+        :param valores_cobrados: id da cobrança -> valor cobrado pelo provedor, se disponível
+        :param max_divergencias: limita quantas divergências são listadas (o total é sempre contado)
+        """
+        import numpy as np
+
+        resumo = {"alugueis": 0, "valorExtraTotal": 0, COBRANCA_AUSENTE: 0, COBRANCA_INDEVIDA: 0,
+                  VALOR_DIVERGENTE: 0, COBRANCA_PENDENTE: 0}
+        divergencias = []
+        ultimo_id = 0
+
+        while True:
+            chunk = self._carrega_chunk(ultimo_id, inicio, fim, tamanho_chunk)
+            if chunk is None:
+                break
+            ids, inicios, fins, cobrancas, pendentes = chunk
+            ultimo_id = int(ids[-1])
+            valores = AluguelController.calcula_valores_extra(inicios, fins)
+
+            resumo["alugueis"] += len(ids)
+            resumo["valorExtraTotal"] += int(valores.sum())
+
+            tem_cobranca = cobrancas >= 0
+            achados = [(COBRANCA_AUSENTE, (valores > 0) & ~tem_cobranca & ~pendentes),
+                       (COBRANCA_PENDENTE, ~tem_cobranca & pendentes),
+                       (COBRANCA_INDEVIDA, (valores <= 0) & tem_cobranca)]
+            if valores_cobrados:
+                cobrado = np.array([valores_cobrados.get(int(c), np.nan) for c in cobrancas], dtype=np.float64)
+                achados.append((VALOR_DIVERGENTE, tem_cobranca & ~np.isnan(cobrado) & (cobrado != valores)))
+
+            for tipo, mascara in achados:
+                posicoes = np.flatnonzero(mascara)
+                resumo[tipo] += len(posicoes)
+                for p in posicoes:
+                    if max_divergencias is not None and len(divergencias) >= max_divergencias:
+                        break
+                    divergencias.append({
+                        "aluguel": int(ids[p]),
+                        "tipo": tipo,
+                        "valorCalculado": int(valores[p]),
+                        "cobrancaAdicional": int(cobrancas[p]) if cobrancas[p] >= 0 else None,
+                    })
+
+        divergencias.sort(key=lambda d: d["aluguel"])
+        return {"resumo": resumo, "divergencias": divergencias}
+
+
+def carrega_csv_cobrancas(caminho: str) -> Dict[int, float]:
+    with open(caminho, newline="") as f:
+        return {int(linha["id"]): float(linha["valor"]) for linha in csv.DictReader(f)}
+
+
+def main():
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inicio", type=datetime.datetime.fromisoformat, default=None)
+    parser.add_argument("--fim", type=datetime.datetime.fromisoformat, default=None)
+    parser.add_argument("--cobrancas", help="CSV id,valor exportado do provedor de pagamento")
+    parser.add_argument("--chunk", type=int, default=CONCILIACAO_CHUNK)
+    args = parser.parse_args()
+
+    valores = carrega_csv_cobrancas(args.cobrancas) if args.cobrancas else None
+    db = SessionLocal()
+    try:
+        relatorio = ConciliacaoService(db).conciliar(args.inicio, args.fim, valores, args.chunk)
+    finally:
+        db.close()
+    print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
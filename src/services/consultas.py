@@ -0,0 +1,86 @@
+from typing import List
+from fastapi import HTTPException
+from sqlalchemy import select, exists, func
+from sqlalchemy.orm import joinedload
+from ..models import Ciclista, AluguelDB, CartaoCreditoDB, Passaporte, FuncionarioDB
+from ..schemas import Funcionario
+from .saida_rapida import CAMPOS_CICLISTA, CAMPOS_PASSAPORTE, CAMPOS_CARTAO
+
+# Construtores de SELECT usados pelo CiclistaService e pelo CiclistaServiceAsync: a consulta é a mesma,
+# só muda se ela roda numa Session ou numa AsyncSession.
+
+# ordem dos campos na resposta de /funcionario (a mesma do schema)
+CAMPOS_FUNCIONARIO = list(Funcionario.model_fields)
+
+
+def consulta_elegibilidade(id_ciclista: int):
+    """
+    Status do ciclista e se ele tem aluguel em aberto, numa única consulta e sem montar entidades do ORM.
+    O EXISTS usa o índice parcial aluguel_ciclista_aberto_unico. Retorna uma linha (status, tem_aluguel) ou nenhuma.
+    """
+    aluguel_aberto = exists().where(AluguelDB.ciclista_id == Ciclista.id, AluguelDB.horaFim.is_(None))
+    return select(Ciclista.status, aluguel_aberto.label("tem_aluguel")).where(Ciclista.id == id_ciclista)
+
+
+def consulta_ciclista(id_ciclista: int):
+    """Ciclista com o passaporte já carregado (o response_model Ciclista lê os dois)."""
+    return select(Ciclista).options(joinedload(Ciclista.passaporte)).where(Ciclista.id == id_ciclista)
+
+
+def consulta_ciclista_resposta(id_ciclista: int):
+    """Só as colunas da resposta de GET /ciclista/{id}, para o caminho rápido de saída (ver dto_ciclista)."""
+    colunas = [getattr(Ciclista, c) for c in CAMPOS_CICLISTA if c != "passaporte"]
+    colunas += [getattr(Passaporte, c).label(f"passaporte_{c}") for c in CAMPOS_PASSAPORTE]
+    return select(*colunas).outerjoin(Passaporte, Passaporte.ciclista_id == Ciclista.id).where(Ciclista.id == id_ciclista)
+
+
+def consulta_cartao_resposta(id_ciclista: int):
+    """Id do ciclista e colunas do cartão; o id do cartão vem nulo se o ciclista existe mas não tem cartão."""
+    colunas = [getattr(CartaoCreditoDB, c) for c in CAMPOS_CARTAO]
+    return (
+        select(Ciclista.id.label("id_ciclista"), *colunas)
+        .outerjoin(CartaoCreditoDB, CartaoCreditoDB.ciclista_id == Ciclista.id)
+        .where(Ciclista.id == id_ciclista)
+        .limit(1)
+    )
+
+
+def consulta_cartao(id_ciclista: int):
+    return select(CartaoCreditoDB).where(CartaoCreditoDB.ciclista_id == id_ciclista).limit(1)
+
+
+def consulta_email_utilizado(email: str):
+    """EXISTS no índice único lower(email) (migração 0005)."""
+    return select(exists().where(func.lower(Ciclista.email) == func.lower(email)))
+
+
+def consulta_aluguel_aberto(id_ciclista: int):
+    return select(AluguelDB).where(AluguelDB.ciclista_id == id_ciclista, AluguelDB.horaFim.is_(None)).limit(1)
+
+
+def consulta_funcionarios(limite: int = None, apos: int = None, campos: List[str] = None):
+    """
+    Consulta paginada por cursor (keyset) na matrícula, projetando só as colunas pedidas.
+    A matrícula sempre vem junto, pois é o cursor da próxima página.
+    """
+    campos = campos or CAMPOS_FUNCIONARIO
+    invalidos = [c for c in campos if c not in CAMPOS_FUNCIONARIO]
+    if invalidos:
+        raise HTTPException(422, f"Campos inválidos: {', '.join(invalidos)}")
+    if "matricula" not in campos:
+        campos = [*campos, "matricula"]
+
+    consulta = select(*[getattr(FuncionarioDB, c) for c in campos]).order_by(FuncionarioDB.matricula)
+    if apos is not None:
+        consulta = consulta.where(FuncionarioDB.matricula > apos)
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    return consulta
+
+
+def consulta_funcionario(id_funcionario: int):
+    return select(FuncionarioDB).where(FuncionarioDB.matricula == id_funcionario)
+
+
+def consulta_funcionario_resposta(id_funcionario: int):
+    return select(*[getattr(FuncionarioDB, c) for c in CAMPOS_FUNCIONARIO]).where(FuncionarioDB.matricula == id_funcionario)
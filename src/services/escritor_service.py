@@ -0,0 +1,162 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturoAtrasado
+from typing import Callable, TypeVar
+from sqlalchemy.orm import Session
+
+ESCRITOR_UNICO = os.getenv("ESCRITOR_UNICO", "1") == "1"  # "0" volta a gravar na sessão de cada requisição
+ESCRITOR_LOTE = int(os.getenv("ESCRITOR_LOTE", 64))  # unidades de escrita por commit
+ESCRITOR_JANELA = float(os.getenv("ESCRITOR_JANELA", 0.002))  # segundos esperando mais unidades para o lote
+ESCRITOR_TIMEOUT = float(os.getenv("ESCRITOR_TIMEOUT", 30))  # segundos que uma unidade pode esperar na fila
+
+T = TypeVar("T")
+
+
+class EscritorBanco:
+    """
+    Fila única de escrita do processo. As unidades de escrita (funções que recebem a Session e gravam)
+    de todas as threads vão para uma thread só, que as aplica em lotes numa transação BEGIN IMMEDIATE
+    e faz um único COMMIT por lote (group commit).
+
+    Cada unidade roda num SAVEPOINT: se ela levanta exceção (HTTPException, IntegrityError...), só ela é
+    desfeita e a exceção volta para quem submeteu; as outras do lote seguem. O resultado só é entregue
+    depois do COMMIT. A sessão do escritor não expira no commit e é fechada ao fim do lote, então a
+    unidade deve devolver valores simples ou objetos do ORM já carregados com tudo que a resposta usa.
+
+    Unidades não devem chamar serviços externos: enquanto uma roda, o lote inteiro espera.
+    Rotas async usam executar_async; as unidades continuam síncronas e rodam na thread do escritor.
+
+    Quem submeteu não recebe erro de uma escrita que acontece depois: passado o timeout, a unidade que
+    ainda está na fila é cancelada (o escritor a pula); a que já entrou num lote tem o commit esperado.
+    """
+    def __init__(self, session_factory, lote: int = ESCRITOR_LOTE, janela: float = ESCRITOR_JANELA,
+                 timeout: float = ESCRITOR_TIMEOUT):
+        self.session_factory = session_factory
+        self.lote = lote
+        self.janela = janela
+        self.timeout = timeout
+        self.lotes = 0
+        self.unidades = 0
+        self.unidades_com_erro = 0
+        self.commits_com_erro = 0
+        self.maior_lote = 0
+        self._fila: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="escritor-banco", daemon=True)
+                self._thread.start()
+
+    def parar(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread:
+            self._fila.put(None)  # o que já está na fila é gravado antes
+            thread.join(timeout=5)
+
+    def submeter(self, unidade: Callable[[Session], T]) -> Future:
+        if self._thread is None:
+            self.iniciar()  # sem lifespan (scripts, TestClient sem `with`) o escritor sobe no primeiro uso
+        futuro = Future()
+        self._fila.put((unidade, futuro))
+        return futuro
+
+    def executar(self, unidade: Callable[[Session], T]) -> T:
+        """
+        Submete e espera o commit do lote; exceções da unidade ou do commit sobem para quem chamou.
+        TimeoutError só sai se a unidade ficou `timeout` segundos na fila: ela é cancelada e não grava.
+        """
+        futuro = self.submeter(unidade)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturoAtrasado:
+            if futuro.cancel():
+                raise
+        # já está no lote sendo gravado: o resultado sai no commit
+        return futuro.result()
+
+    async def executar_async(self, unidade: Callable[[Session], T]) -> T:
+        """Como executar, para corrotinas: espera o commit sem bloquear o event loop."""
+        futuro = self.submeter(unidade)
+        try:
+            # shield: o timeout não cancela o futuro do escritor por baixo; quem decide é o futuro.cancel()
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), self.timeout)
+        except asyncio.TimeoutError:
+            if futuro.cancel():
+                raise
+        except asyncio.CancelledError:
+            futuro.cancel()  # requisição cancelada: se ainda estiver na fila, não grava
+            raise
+        return await asyncio.wrap_future(futuro)
+
+    def _loop(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                return
+            lote = [item]
+            limite = time.monotonic() + self.janela
+            while len(lote) < self.lote:
+                try:
+                    item = self._fila.get(timeout=max(limite - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._fila.put(None)  # termina depois deste lote
+                    break
+                lote.append(item)
+            self._gravar(lote)
+
+    def _gravar(self, lote):
+        pendentes = [(unidade, futuro) for unidade, futuro in lote if futuro.set_running_or_notify_cancel()]
+        if not pendentes:
+            return
+        resultados = []
+        db = self.session_factory(expire_on_commit=False)
+        try:
+            # o lock de escrita é pego no início: sem isso, uma transação que leu antes de escrever
+            # falha na hora (SQLITE_BUSY_SNAPSHOT) se outro processo commitou nesse meio-tempo
+            db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            for unidade, futuro in pendentes:
+                try:
+                    with db.begin_nested():
+                        resultados.append((futuro, unidade(db), None))
+                except Exception as e:
+                    resultados.append((futuro, None, e))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.commits_com_erro += 1
+            for _, futuro in pendentes:
+                futuro.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        self.lotes += 1
+        self.unidades += len(pendentes)
+        self.maior_lote = max(self.maior_lote, len(pendentes))
+        for futuro, resultado, erro in resultados:
+            if erro is not None:
+                self.unidades_com_erro += 1
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+
+    def estatisticas(self) -> dict:
+        return {
+            "ativo": self._thread is not None and self._thread.is_alive(),
+            "fila": self._fila.qsize(),
+            "lotes": self.lotes,
+            "unidades": self.unidades,
+            "unidadesPorLote": self.unidades / self.lotes if self.lotes else 0.0,
+            "maiorLote": self.maior_lote,
+            "unidadesComErro": self.unidades_com_erro,
+            "commitsComErro": self.commits_com_erro,
+        }
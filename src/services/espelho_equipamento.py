@@ -0,0 +1,300 @@
+import os
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..clients import obter_cliente
+from ..models import TrancaEspelhoDB, BicicletaEspelhoDB
+
+ESPELHO_EQUIPAMENTO = os.getenv("ESPELHO_EQUIPAMENTO", "1") == "1"  # "0" volta a consultar o equipamento sempre
+ESPELHO_VALIDADE = float(os.getenv("ESPELHO_VALIDADE", 180))  # segundos que um estado confirmado vale
+ESPELHO_RESSINCRONIA = float(os.getenv("ESPELHO_RESSINCRONIA", 60))  # segundos entre cargas completas (0 desliga)
+ESPELHO_SINCRONIA = float(os.getenv("ESPELHO_SINCRONIA", 1.0))  # segundos entre leituras das gravações de outros workers
+ESPELHO_TOKEN = os.getenv("ESPELHO_TOKEN")  # X-Equipamento-Token de /equipamento/eventos e /ressincronizar; sem ele, recusam
+MARGEM_SINCRONIA = 5.0  # segundos relidos para trás: gravações de outros workers podem commitar fora de ordem
+
+CAMPOS = {"tranca": ("id", "status", "bicicleta"),
+          "bicicleta": ("id", "numero", "marca", "modelo", "ano", "status")}
+MODELOS = {"tranca": TrancaEspelhoDB, "bicicleta": BicicletaEspelhoDB}
+
+
+class EspelhoEquipamento:
+    """
+    Estado de trancas e bicicletas do serviço de equipamento em memória, para o aluguel e a devolução
+    validarem sem ir à rede. Só destrancar/trancar continuam sendo chamadas ao equipamento.
+
+    O estado chega por eventos (POST /equipamento/eventos com o ESPELHO_TOKEN, mandados pelo equipamento ou por quem o
+    represente) e pela carga completa a cada ESPELHO_RESSINCRONIA segundos (GET /tranca e /bicicleta),
+    que cobre eventos perdidos. Os dois renovam a confirmação do registro; um registro sem confirmação
+    nos últimos ESPELHO_VALIDADE segundos, incompleto ou desconhecido devolve None e quem chamou consulta
+    o equipamento como antes. Com o espelho vazio (sem eventos nem carga) nada muda.
+
+    O resultado dos nossos destrancar/trancar é aplicado na hora (a devolução logo depois do aluguel já vê
+    a bicicleta EM_USO), mas não renova a confirmação. Tudo é gravado nas tabelas tranca_espelho e
+    bicicleta_espelho, de onde os outros workers leem a cada ESPELHO_SINCRONIA segundos. As duas tabelas
+    voltam vazias no /restaurarBanco: quem restaurou chama reiniciar e os outros notam na sincronia.
+    """
+    def __init__(self, ativo: bool = ESPELHO_EQUIPAMENTO, validade: float = ESPELHO_VALIDADE,
+                 ressincronia: float = ESPELHO_RESSINCRONIA, sincronia: float = ESPELHO_SINCRONIA):
+        self.ativo = ativo
+        self.validade = validade
+        self.ressincronia = ressincronia
+        self.sincronia = sincronia
+        self.session_factory = None
+        self.escritor = None
+        self.url_equipamento = None
+        self._registros = {"tranca": {}, "bicicleta": {}}  # id -> dict; trocado inteiro, nunca alterado
+        self._alterado_ate = {"tranca": 0.0, "bicicleta": 0.0}
+        self._ultima_linha = {"tranca": None, "bicicleta": None}  # (id, alteradoEm) da última linha lida da tabela
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+        self.acertos = 0
+        self.faltas = 0
+        self.aplicados = 0
+        self.ignorados = 0
+        self.falhas_gravacao = 0
+        self.ressincronizacoes = 0
+        self.falhas_ressincronizacao = 0
+        self.ultima_ressincronizacao = None
+
+    def iniciar(self, session_factory, escritor=None, url_equipamento: str = None):
+        """Liga a persistência (pelo EscritorBanco, se houver) e a thread de sincronia e carga completa."""
+        self.session_factory = session_factory
+        self.escritor = escritor
+        self.url_equipamento = url_equipamento
+        if not self.ativo:
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name="espelho-equipamento", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        proxima_carga = 0.0
+        while True:
+            try:
+                self.sincronizar()
+            except Exception:
+                pass  # banco ocupado ou restaurando: tenta na próxima volta
+            if self.url_equipamento and self.ressincronia > 0 and time.monotonic() >= proxima_carga:
+                try:
+                    self.ressincronizar()
+                except Exception:
+                    self.falhas_ressincronizacao += 1
+                proxima_carga = time.monotonic() + self.ressincronia
+            if self._parar.wait(self.sincronia):
+                return
+
+    # leituras
+
+    def _valido(self, tipo: str, id_registro) -> dict | None:
+        registro = self._registros[tipo].get(id_registro)
+        if registro is None or registro.get("confirmadoEm") is None:
+            return None
+        if time.time() - registro["confirmadoEm"] > self.validade:
+            return None
+        # bicicleta precisa de todos os campos (vira o Bicicleta da resposta); tranca, do status
+        obrigatorios = CAMPOS[tipo] if tipo == "bicicleta" else ("status",)
+        if any(registro.get(campo) is None for campo in obrigatorios):
+            return None
+        return {campo: registro.get(campo) for campo in CAMPOS[tipo]}
+
+    def _contar(self, resultado):
+        if resultado is None:
+            self.faltas += 1
+        else:
+            self.acertos += 1
+        return resultado
+
+    def tranca(self, id_tranca: int) -> dict | None:
+        if not self.ativo:
+            return None
+        return self._contar(self._valido("tranca", id_tranca))
+
+    def bicicleta(self, id_bicicleta: int) -> dict | None:
+        if not self.ativo:
+            return None
+        return self._contar(self._valido("bicicleta", id_bicicleta))
+
+    def bicicleta_na_tranca(self, id_tranca: int) -> dict | None:
+        if not self.ativo:
+            return None
+        tranca = self._valido("tranca", id_tranca)
+        if tranca is None or tranca["bicicleta"] is None:
+            return self._contar(None)  # tranca vazia também vai ao equipamento, que responde o erro de sempre
+        return self._contar(self._valido("bicicleta", tranca["bicicleta"]))
+
+    # escritas
+
+    def aplicar(self, trancas=(), bicicletas=(), confirmado: bool = True) -> dict:
+        """
+        Aplica estados parciais (dicts com "id" e os campos que mudaram) e grava nas tabelas.
+        Estado com versao menor que a guardada é ignorado. confirmado=False (nossos comandos) só
+        altera registros que já existem e não renova a validade.
+        :return: quantas trancas e bicicletas foram aplicadas e quantos estados foram ignorados
+        """
+        agora = time.time()
+        linhas = {"tranca": [], "bicicleta": []}
+        ignorados = 0
+        with self._lock:
+            for tipo, estados in (("tranca", trancas), ("bicicleta", bicicletas)):
+                for estado in estados:
+                    atual = self._registros[tipo].get(estado["id"])
+                    if atual is None and not confirmado:
+                        continue
+                    versao = estado.get("versao")
+                    if atual and versao is not None and atual.get("versao") is not None and versao < atual["versao"]:
+                        ignorados += 1
+                        continue
+                    novo = {**(atual or {}), **estado,
+                            "versao": versao if versao is not None else (atual or {}).get("versao"),
+                            "confirmadoEm": agora if confirmado else (atual or {}).get("confirmadoEm"),
+                            "alteradoEm": agora}
+                    self._registros[tipo][estado["id"]] = novo
+                    linhas[tipo].append(novo)
+        self.aplicados += len(linhas["tranca"]) + len(linhas["bicicleta"])
+        self.ignorados += ignorados
+        self._gravar(linhas)
+        return {"trancas": len(linhas["tranca"]), "bicicletas": len(linhas["bicicleta"]), "ignorados": ignorados}
+
+    def _gravar(self, linhas: dict):
+        if self.session_factory is None or not (linhas["tranca"] or linhas["bicicleta"]):
+            return
+
+        def unidade(db):
+            for tipo, modelo in MODELOS.items():
+                if not linhas[tipo]:
+                    continue
+                colunas = [coluna.name for coluna in modelo.__table__.columns]
+                comando = sqlite_insert(modelo)
+                comando = comando.on_conflict_do_update(
+                    index_elements=["id"],
+                    set_={coluna: comando.excluded[coluna] for coluna in colunas if coluna != "id"})
+                db.execute(comando, [{coluna: linha.get(coluna) for coluna in colunas} for linha in linhas[tipo]])
+
+        if self.escritor is not None:
+            self.escritor.executar(unidade)
+            return
+        with self.session_factory() as db:
+            unidade(db)
+            db.commit()
+
+    def destrancou(self, id_tranca: int, id_bicicleta: int, tranca: dict):
+        """Nosso destrancar deu certo: a tranca ficou vazia e a bicicleta saiu em uso."""
+        self._aplicar_comando([{"id": id_tranca, "status": tranca.get("status"), "bicicleta": None}],
+                              [{"id": id_bicicleta, "status": "EM_USO"}])
+
+    def trancou(self, id_tranca: int, id_bicicleta: int, tranca: dict):
+        """Nosso trancar deu certo: a bicicleta está presa na tranca e disponível."""
+        self._aplicar_comando([{"id": id_tranca, "status": tranca.get("status"), "bicicleta": id_bicicleta}],
+                              [{"id": id_bicicleta, "status": "DISPONIVEL"}])
+
+    def _aplicar_comando(self, trancas, bicicletas):
+        if not self.ativo:
+            return
+        try:
+            self.aplicar(trancas, bicicletas, confirmado=False)
+        except Exception:
+            # o comando já foi feito no equipamento; a memória está certa e a próxima carga corrige a tabela
+            self.falhas_gravacao += 1
+
+    def esquecer(self, id_tranca: int, id_bicicleta: int):
+        """Comando falhou e o estado ficou incerto: as leituras vão ao equipamento até a próxima confirmação."""
+        with self._lock:
+            for tipo, id_registro in (("tranca", id_tranca), ("bicicleta", id_bicicleta)):
+                atual = self._registros[tipo].get(id_registro)
+                if atual is not None:
+                    self._registros[tipo][id_registro] = {**atual, "confirmadoEm": None}
+
+    # sincronia
+
+    def reiniciar(self):
+        """Esquece o estado em memória (ex.: depois do /restaurarBanco); a próxima sincronia relê as tabelas."""
+        with self._lock:
+            self._registros = {"tranca": {}, "bicicleta": {}}
+            self._alterado_ate = {"tranca": 0.0, "bicicleta": 0.0}
+            self._ultima_linha = {"tranca": None, "bicicleta": None}
+
+    def sincronizar(self):
+        """Traz as gravações de outros workers (na primeira vez, as tabelas inteiras)."""
+        if self.session_factory is None:
+            return
+        with self.session_factory() as db:
+            if not self._linhas_conferem(db):
+                # linha já lida sumiu: o banco foi restaurado (em outro worker) e a memória é de antes
+                self.reiniciar()
+            for tipo, modelo in MODELOS.items():
+                desde = self._alterado_ate[tipo] - MARGEM_SINCRONIA
+                linhas = db.execute(select(modelo.__table__).where(modelo.alteradoEm >= desde)
+                                    .order_by(modelo.alteradoEm)).mappings().all()
+                with self._lock:
+                    for linha in linhas:
+                        atual = self._registros[tipo].get(linha["id"])
+                        if atual is None or atual["alteradoEm"] < linha["alteradoEm"]:
+                            self._registros[tipo][linha["id"]] = dict(linha)
+                        self._alterado_ate[tipo] = max(self._alterado_ate[tipo], linha["alteradoEm"])
+                    if linhas:
+                        self._ultima_linha[tipo] = (linhas[-1]["id"], linhas[-1]["alteradoEm"])
+
+    def _linhas_conferem(self, db) -> bool:
+        # linhas só saem das tabelas na restauração; uma atualização só aumenta o alteradoEm
+        for tipo, modelo in MODELOS.items():
+            ultima = self._ultima_linha[tipo]
+            if ultima is not None and db.execute(
+                    select(modelo.id).where(modelo.id == ultima[0], modelo.alteradoEm >= ultima[1])).first() is None:
+                return False
+        return True
+
+    def ressincronizar(self) -> dict:
+        """
+        Carga completa do equipamento. Não usa a política da dependência "equipamento": uma carga lenta
+        ou com erro não abre o circuit breaker nem ocupa o bulkhead do aluguel.
+        """
+        cliente = obter_cliente(self.url_equipamento)
+        headers = {'accept': 'application/json'}
+        trancas = self._lista(cliente.get("/tranca", headers=headers), "trancas")
+        bicicletas = self._lista(cliente.get("/bicicleta", headers=headers), "bicicletas")
+        for tranca in trancas:
+            if isinstance(tranca.get("bicicleta"), dict):
+                tranca["bicicleta"] = tranca["bicicleta"].get("id")
+        resultado = self.aplicar(
+            [{campo: item.get(campo) for campo in CAMPOS["tranca"] + ("versao",)} for item in trancas],
+            [{campo: item.get(campo) for campo in CAMPOS["bicicleta"] + ("versao",)} for item in bicicletas])
+        self.ressincronizacoes += 1
+        self.ultima_ressincronizacao = time.time()
+        return resultado
+
+    @staticmethod
+    def _lista(resposta, chave: str) -> list:
+        resposta.raise_for_status()
+        corpo = resposta.json()
+        return corpo[chave] if isinstance(corpo, dict) else corpo
+
+    def estatisticas(self) -> dict:
+        consultas = self.acertos + self.faltas
+        return {
+            "ativo": self.ativo,
+            "trancas": len(self._registros["tranca"]),
+            "bicicletas": len(self._registros["bicicleta"]),
+            "validadeSegundos": self.validade,
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "taxaAcerto": self.acertos / consultas if consultas else 0.0,
+            "aplicados": self.aplicados,
+            "ignorados": self.ignorados,
+            "falhasGravacao": self.falhas_gravacao,
+            "ressincronizacoes": self.ressincronizacoes,
+            "falhasRessincronizacao": self.falhas_ressincronizacao,
+            "segundosDesdeRessincronizacao": time.time() - self.ultima_ressincronizacao
+                                             if self.ultima_ressincronizacao else None,
+        }
+
+
+# compartilhado pelos serviços do processo; o main liga a persistência e a carga no lifespan
+espelho_equipamento = EspelhoEquipamento()
@@ -0,0 +1,150 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import time
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from starlette.responses import JSONResponse
+from ..models import IdempotenciaDB
+from .escritor_service import EscritorBanco
+
+IDEMPOTENCIA_TTL = float(os.getenv("IDEMPOTENCIA_TTL", 24 * 3600))  # segundos que a resposta fica guardada
+IDEMPOTENCIA_ESPERA = float(os.getenv("IDEMPOTENCIA_ESPERA", 30))  # espera máxima por uma duplicata em andamento
+IDEMPOTENCIA_INTERVALO = 0.05  # consulta ao banco enquanto outro worker processa a mesma chave
+IDEMPOTENCIA_LIMPEZA = 60  # segundos entre remoções das chaves expiradas
+
+
+class GuardaIdempotencia:
+    """
+    Idempotency-Key para POSTs com efeito colateral (cobrança, destrancar/trancar).
+
+    A primeira requisição com uma chave reserva a linha (chave, rota) na tabela idempotencia, executa
+    e guarda o código e o corpo da resposta. Repetições recebem a resposta guardada sem executar nada.
+    Duplicatas que chegam enquanto a primeira ainda roda esperam por ela: no mesmo processo por um
+    asyncio.Event, entre workers consultando a linha. Erros 5xx e exceções não são guardados, para a
+    repetição poder tentar de novo. Com o EscritorBanco, reserva, conclusão e liberação entram na fila
+    única de escrita; sem ele, cada uma commita numa sessão própria.
+    """
+    def __init__(self, session_factory, ttl: float = IDEMPOTENCIA_TTL, espera: float = IDEMPOTENCIA_ESPERA,
+                 escritor: EscritorBanco = None):
+        self.session_factory = session_factory
+        self.escritor = escritor
+        self.ttl = ttl
+        self.espera = espera
+        self._em_andamento: dict[tuple, asyncio.Event] = {}
+        self._ultima_limpeza = 0.0
+
+    @staticmethod
+    def hash_corpo(corpo: dict) -> str:
+        return hashlib.sha256(json.dumps(jsonable_encoder(corpo), sort_keys=True).encode()).hexdigest()
+
+    async def executar(self, rota: str, chave: str | None, corpo: dict, funcao, codigo: int = 200):
+        """
+        Executa `funcao` (corrotina sem argumentos) no máximo uma vez por chave e rota.
+        Sem chave, apenas executa. Com chave repetida, devolve a resposta guardada.
+        """
+        if not chave:
+            return await funcao()
+        hash_corpo = self.hash_corpo(corpo)
+        chave_local = (chave, rota)
+        limite = time.monotonic() + self.espera
+
+        while True:
+            evento = self._em_andamento.get(chave_local)
+            if evento is not None:
+                try:
+                    await asyncio.wait_for(evento.wait(), max(limite - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    raise HTTPException(409, "Requisição com esta Idempotency-Key ainda em andamento.")
+                continue
+            registro = await self._reservar(chave, rota, hash_corpo)
+            if registro is None:
+                break
+            if registro.hashCorpo != hash_corpo:
+                raise HTTPException(422, "Idempotency-Key já usada com outro corpo.")
+            if registro.status == "CONCLUIDA":
+                return JSONResponse(status_code=registro.codigoHttp, content=json.loads(registro.resposta),
+                                    headers={"Idempotency-Replayed": "true"})
+            # outro worker está processando a mesma chave
+            if time.monotonic() >= limite:
+                raise HTTPException(409, "Requisição com esta Idempotency-Key ainda em andamento.")
+            await asyncio.sleep(IDEMPOTENCIA_INTERVALO)
+
+        evento = self._em_andamento[chave_local] = asyncio.Event()
+        try:
+            try:
+                resultado = await funcao()
+            except HTTPException as e:
+                if e.status_code < 500:
+                    await self._concluir(chave, rota, e.status_code, {"detail": e.detail})
+                else:
+                    await self._liberar(chave, rota)
+                raise
+            except BaseException:
+                await self._liberar(chave, rota)
+                raise
+            await self._concluir(chave, rota, codigo, jsonable_encoder(resultado))
+            return resultado
+        finally:
+            del self._em_andamento[chave_local]
+            evento.set()
+
+    async def _escrever(self, unidade):
+        if self.escritor is not None:
+            return await self.escritor.executar_async(unidade)
+        async with self.session_factory() as db:
+            resultado = await db.run_sync(unidade)
+            await db.commit()
+            return resultado
+
+    async def _reservar(self, chave: str, rota: str, hash_corpo: str):
+        """Reserva a chave e retorna None, ou retorna o registro existente (não expirado)."""
+        limpar = time.monotonic() - self._ultima_limpeza > IDEMPOTENCIA_LIMPEZA
+        if limpar:
+            self._ultima_limpeza = time.monotonic()
+
+        def reservar(db: Session):
+            agora = datetime.datetime.now()
+            if limpar:
+                db.execute(delete(IdempotenciaDB).where(IdempotenciaDB.expiraEm < agora))
+            while True:
+                # a reserva também vence, caso o worker que a fez tenha morrido no meio
+                resultado = db.execute(
+                    sqlite_insert(IdempotenciaDB)
+                    .values(chave=chave, rota=rota, hashCorpo=hash_corpo, status="EM_ANDAMENTO", criadoEm=agora,
+                            expiraEm=agora + datetime.timedelta(seconds=2 * self.espera))
+                    .on_conflict_do_nothing()
+                )
+                if resultado.rowcount == 1:
+                    return None
+                registro = db.get(IdempotenciaDB, (chave, rota), populate_existing=True)
+                if registro is not None and registro.expiraEm >= agora:
+                    return registro
+                db.execute(delete(IdempotenciaDB).where(IdempotenciaDB.chave == chave,
+                                                        IdempotenciaDB.rota == rota,
+                                                        IdempotenciaDB.expiraEm < agora))
+
+        return await self._escrever(reservar)
+
+    async def _concluir(self, chave: str, rota: str, codigo: int, corpo):
+        def concluir(db: Session):
+            registro = db.get(IdempotenciaDB, (chave, rota))
+            if registro is None:
+                return
+            registro.status = "CONCLUIDA"
+            registro.codigoHttp = codigo
+            registro.resposta = json.dumps(corpo, ensure_ascii=False)
+            registro.expiraEm = datetime.datetime.now() + datetime.timedelta(seconds=self.ttl)
+
+        await self._escrever(concluir)
+
+    async def _liberar(self, chave: str, rota: str):
+        def liberar(db: Session):
+            db.execute(delete(IdempotenciaDB).where(IdempotenciaDB.chave == chave, IdempotenciaDB.rota == rota))
+
+        await self._escrever(liberar)
@@ -0,0 +1,171 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models import CiclistaEmailAlteracaoDB
+
+EMAIL_INDICE_MODO = os.getenv("EMAIL_INDICE_MODO", "exato")  # "exato", "bloom" (menos memória) ou "desligado"
+EMAIL_INDICE_CAPACIDADE = int(os.getenv("EMAIL_INDICE_CAPACIDADE", 1_000_000))  # emails previstos (modo bloom)
+EMAIL_INDICE_FALSO_POSITIVO = float(os.getenv("EMAIL_INDICE_FALSO_POSITIVO", 0.001))
+EMAIL_INDICE_SINCRONIA = float(os.getenv("EMAIL_INDICE_SINCRONIA", 1.0))  # segundos entre buscas de alterações
+EMAIL_INDICE_LOTE = 5000  # alterações lidas por consulta
+
+
+def normalizar_email(email: str) -> str:
+    return email.strip().casefold()
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom com a mesma interface de set (add / in). Pode dar falso positivo, nunca falso negativo.
+    Com 0,1% de falso positivo gasta ~1,8 byte por email, contra ~100 bytes de um set de strings.
+    """
+    def __init__(self, capacidade: int, taxa_falso_positivo: float):
+        self.bits = max(int(-capacidade * math.log(taxa_falso_positivo) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.bits / capacidade * math.log(2)), 1)
+        self._bits = bytearray((self.bits + 7) // 8)
+
+    def _posicoes(self, chave: str):
+        # hashing duplo: k posições a partir de dois hashes de 64 bits
+        digest = hashlib.blake2b(chave.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, chave: str):
+        for posicao in self._posicoes(chave):
+            self._bits[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, chave: str) -> bool:
+        return all(self._bits[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+
+class IndiceEmails:
+    """
+    Emails de ciclistas já usados, normalizados (casefold), em memória.
+
+    "Não está no índice" é resposta definitiva e não consulta o banco; "está" só quer dizer talvez
+    (falso positivo do Bloom, email trocado no PUT) e é confirmado com EXISTS no índice único
+    ciclista_email_unico. O índice é aquecido na subida, recebe os cadastros deste processo na hora e,
+    a cada EMAIL_INDICE_SINCRONIA segundos, lê na ciclista_email_alteracao (gatilhos da migração 0009)
+    os emails cadastrados ou trocados por PUT em qualquer worker. Se a última alteração lida sumiu ou
+    mudou, o banco foi restaurado e o índice é refeito.
+    """
+    def __init__(self, modo: str = EMAIL_INDICE_MODO, capacidade: int = EMAIL_INDICE_CAPACIDADE,
+                 taxa_falso_positivo: float = EMAIL_INDICE_FALSO_POSITIVO, sincronia: float = EMAIL_INDICE_SINCRONIA):
+        self.modo = modo
+        self.capacidade = capacidade
+        self.taxa_falso_positivo = taxa_falso_positivo
+        self.sincronia = sincronia
+        self.pronto = False
+        self.itens = 0
+        self.respostas_sem_banco = 0
+        self.confirmacoes_no_banco = 0
+        self._emails = self._nova_estrutura()
+        self._ultima_alteracao = (0, None)  # (seq, email) da última linha lida da ciclista_email_alteracao
+        self._sincronizado_em = 0.0
+        self._lock_escrita = threading.Lock()  # bits do Bloom são read-modify-write
+        self._lock_sincronia = threading.Lock()
+
+    @property
+    def ativo(self) -> bool:
+        return self.modo != "desligado"
+
+    def _nova_estrutura(self):
+        if self.modo == "bloom":
+            return FiltroBloom(self.capacidade, self.taxa_falso_positivo)
+        return set()
+
+    def adicionar(self, *emails: str):
+        if not self.ativo:
+            return
+        with self._lock_escrita:
+            for email in emails:
+                self._emails.add(normalizar_email(email))
+                self.itens += 1
+
+    def pode_existir(self, email: str) -> bool:
+        """False: nenhum ciclista usa o email. True: talvez use, confirmar no banco."""
+        if not self.pronto:
+            return True
+        if normalizar_email(email) in self._emails:
+            self.confirmacoes_no_banco += 1
+            return True
+        self.respostas_sem_banco += 1
+        return False
+
+    def sincronizar(self, db: Session, forcar: bool = False):
+        """Traz as alterações de email desde a última lida. Se ela não está mais lá (banco restaurado), refaz."""
+        if not self.ativo or (not forcar and self.pronto and time.monotonic() - self._sincronizado_em < self.sincronia):
+            return
+        # quem só consulta não espera a sincronização de outra thread: enquanto o índice não fica
+        # pronto, pode_existir responde "talvez" e a confirmação vai ao banco
+        if not self._lock_sincronia.acquire(blocking=forcar):
+            return
+        try:
+            if not forcar and self.pronto and time.monotonic() - self._sincronizado_em < self.sincronia:
+                return  # outra thread acabou de sincronizar
+            if self.pronto and not self._alteracao_confere(db):
+                self._reiniciar()
+            while True:
+                linhas = db.execute(
+                    select(CiclistaEmailAlteracaoDB.seq, CiclistaEmailAlteracaoDB.email)
+                    .where(CiclistaEmailAlteracaoDB.seq > self._ultima_alteracao[0])
+                    .order_by(CiclistaEmailAlteracaoDB.seq)
+                    .limit(EMAIL_INDICE_LOTE)
+                ).all()
+                if not linhas:
+                    break
+                self.adicionar(*(email for _, email in linhas))
+                self._ultima_alteracao = tuple(linhas[-1])
+            self._sincronizado_em = time.monotonic()
+            self.pronto = True
+        finally:
+            self._lock_sincronia.release()
+
+    def _alteracao_confere(self, db: Session) -> bool:
+        seq, email = self._ultima_alteracao
+        if not seq:
+            return True
+        return db.execute(select(CiclistaEmailAlteracaoDB.email)
+                          .where(CiclistaEmailAlteracaoDB.seq == seq)).scalar() == email
+
+    def aquecer_em_segundo_plano(self, session_factory) -> threading.Thread:
+        """Carrega o índice numa thread, para o worker atender enquanto lê os emails do banco."""
+        def _aquecer():
+            with session_factory() as db:
+                self.sincronizar(db, forcar=True)
+        thread = threading.Thread(target=_aquecer, name="indice-emails", daemon=True)
+        thread.start()
+        return thread
+
+    def recarregar(self, db: Session):
+        """Refaz o índice do zero (ex.: depois do /restaurarBanco)."""
+        with self._lock_sincronia:
+            self._reiniciar()
+        self.sincronizar(db, forcar=True)
+
+    def _reiniciar(self):
+        with self._lock_escrita:
+            self._emails = self._nova_estrutura()
+            self.itens = 0
+            self._ultima_alteracao = (0, None)
+            self.pronto = False
+
+    def estatisticas(self) -> dict:
+        consultas = self.respostas_sem_banco + self.confirmacoes_no_banco
+        return {
+            "modo": self.modo,
+            "pronto": self.pronto,
+            "itens": self.itens,
+            "ultimaAlteracao": self._ultima_alteracao[0],
+            "respostasSemBanco": self.respostas_sem_banco,
+            "confirmacoesNoBanco": self.confirmacoes_no_banco,
+            "taxaSemBanco": self.respostas_sem_banco / consultas if consultas else 0.0,
+        }
+
+
+indice_emails = IndiceEmails()
@@ -0,0 +1,167 @@
+import datetime
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from ..clients import dependencias
+from ..models import EmailOutboxDB
+from .ciclista_service import CiclistaService
+from .escritor_service import EscritorBanco
+
+OUTBOX_INTERVALO = float(os.getenv("OUTBOX_INTERVALO", 1))  # segundos entre varreduras
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", 50))
+OUTBOX_MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", 8))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", 2))  # segundos, dobra a cada falha
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", 600))
+OUTBOX_RESERVA_FOLGA = float(os.getenv("OUTBOX_RESERVA_FOLGA", 30))  # segundos além do pior caso do envio do lote
+
+
+def estatisticas_outbox(db: Session) -> dict:
+    """
+    Profundidade e idade da fila de emails pendentes.
+    """
+    pendentes, mais_antigo = (
+        db.query(func.count(EmailOutboxDB.id), func.min(EmailOutboxDB.criadoEm))
+        .filter(EmailOutboxDB.status.in_(('PENDENTE', 'ENVIANDO')))
+        .one()
+    )
+    falhas = db.query(func.count(EmailOutboxDB.id)).filter(EmailOutboxDB.status == 'FALHOU').scalar()
+    idade = (datetime.datetime.now() - mais_antigo).total_seconds() if mais_antigo else 0.0
+    return {"pendentes": pendentes, "idadeMaisAntigoSegundos": idade, "falhas": falhas}
+
+
+class DespachanteEmail:
+    """
+    Thread em segundo plano que lê a outbox em lotes e envia os emails pelo serviço externo,
+    com novas tentativas e backoff exponencial. Após OUTBOX_MAX_TENTATIVAS o email fica como FALHOU.
+
+    Cada email é reservado com UPDATE condicional antes do envio (status ENVIANDO e proximaTentativa
+    adiada até o fim da reserva), então com vários workers só um deles envia. A reserva cobre o pior
+    caso do lote (duracao_reserva); se o worker cair no meio, ela vence e o email volta a ser pego. O
+    resultado só é gravado se a linha ainda tiver a mesma reserva. Reserva e resultado são gravados pelo
+    EscritorBanco, quando há um; a busca dos vencidos é só leitura e não entra na fila de escrita.
+    """
+    def __init__(self, session_factory, url_externo: str, intervalo: float = OUTBOX_INTERVALO,
+                 lote: int = OUTBOX_LOTE, envios_paralelos: int = 4, escritor: EscritorBanco = None):
+        self.session_factory = session_factory
+        self.escritor = escritor
+        self.url_externo = url_externo
+        self.intervalo = intervalo
+        self.lote = lote
+        self.envios_paralelos = envios_paralelos
+        self.executor = ThreadPoolExecutor(max_workers=envios_paralelos, thread_name_prefix="outbox-envio")
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._loop, name="outbox-email", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.executor.shutdown(wait=False)
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                enviados = self.processar_lote()
+            except Exception:
+                enviados = 0
+            # lote cheio: provavelmente há mais, não espera
+            if enviados < self.lote:
+                self._parar.wait(self.intervalo)
+
+    def processar_lote(self) -> int:
+        db = self.session_factory()
+        try:
+            agora = datetime.datetime.now()
+            ids = [id_email for (id_email,) in
+                   db.query(EmailOutboxDB.id).filter(*self._vencidos(agora))
+                   .order_by(EmailOutboxDB.id).limit(self.lote).all()]
+            db.rollback()  # encerra a leitura antes de gravar
+            if not ids:
+                return 0
+            reserva = agora + datetime.timedelta(seconds=self.duracao_reserva(len(ids)))
+            emails = self._escrever(db, lambda sessao: self._reservar(sessao, ids, agora, reserva))
+            if not emails:
+                return 0
+
+            service = CiclistaService(db, url_externo=self.url_externo)
+            resultados = list(self.executor.map(lambda e: self._enviar(service, *e[2:]), emails))
+
+            def gravar(sessao: Session):
+                agora = datetime.datetime.now()
+                for (id_email, tentativas, *_), erro in zip(emails, resultados):
+                    if erro is None:
+                        valores = {"status": 'ENVIADO', "enviadoEm": agora}
+                    elif tentativas + 1 >= OUTBOX_MAX_TENTATIVAS:
+                        valores = {"status": 'FALHOU', "tentativas": tentativas + 1, "ultimoErro": erro[:250]}
+                    else:
+                        espera = min(OUTBOX_BACKOFF_BASE * 2 ** tentativas, OUTBOX_BACKOFF_MAX)
+                        valores = {"status": 'PENDENTE', "tentativas": tentativas + 1, "ultimoErro": erro[:250],
+                                   "proximaTentativa": agora + datetime.timedelta(seconds=espera)}
+                    # reserva vencida e retomada por outro worker: o resultado dele é que vale
+                    sessao.execute(
+                        update(EmailOutboxDB)
+                        .where(EmailOutboxDB.id == id_email, EmailOutboxDB.status == 'ENVIANDO',
+                               EmailOutboxDB.proximaTentativa == reserva)
+                        .values(**valores))
+
+            self._escrever(db, gravar)
+            return len(emails)
+        finally:
+            db.close()
+
+    def _escrever(self, db: Session, unidade):
+        if self.escritor is not None:
+            return self.escritor.executar(unidade)
+        resultado = unidade(db)
+        db.commit()
+        return resultado
+
+    def duracao_reserva(self, quantidade: int) -> float:
+        """
+        Segundos que `quantidade` emails ficam reservados: no pior caso saem em rodadas de envios_paralelos,
+        cada envio esperando a vaga do bulkhead e os timeouts de conexão e leitura da dependência "email".
+        """
+        email = dependencias["email"]
+        conexao, leitura = email.timeout
+        rodadas = math.ceil(quantidade / self.envios_paralelos)
+        return rodadas * (email.bulkhead.espera + conexao + leitura) + OUTBOX_RESERVA_FOLGA
+
+    @staticmethod
+    def _vencidos(agora: datetime.datetime) -> tuple:
+        # ENVIANDO com a reserva vencida: o worker que reservou caiu antes de gravar o resultado
+        return EmailOutboxDB.status.in_(('PENDENTE', 'ENVIANDO')), EmailOutboxDB.proximaTentativa <= agora
+
+    def _reservar(self, db: Session, ids: list, agora: datetime.datetime, reserva: datetime.datetime) -> list:
+        """Reserva até `reserva` os emails ainda vencidos e devolve (id, tentativas, assunto, mensagem, email)."""
+        reservados = []
+        for id_email in ids:
+            # só quem mudar a linha envia: outro worker pode ter reservado entre a leitura e aqui
+            if db.execute(
+                update(EmailOutboxDB)
+                .where(EmailOutboxDB.id == id_email, *self._vencidos(agora))
+                .values(status='ENVIANDO', proximaTentativa=reserva)
+            ).rowcount:
+                reservados.append(id_email)
+        if not reservados:
+            return []
+        return [tuple(linha) for linha in
+                db.query(EmailOutboxDB.id, EmailOutboxDB.tentativas, EmailOutboxDB.assunto, EmailOutboxDB.mensagem,
+                         EmailOutboxDB.email)
+                .filter(EmailOutboxDB.id.in_(reservados)).order_by(EmailOutboxDB.id).all()]
+
+    @staticmethod
+    def _enviar(service: CiclistaService, assunto: str, mensagem: str, endereco_email: str) -> str | None:
+        """Retorna None se enviou, ou a descrição do erro."""
+        try:
+            if service.enviar_email(assunto=assunto, mensagem=mensagem, endereco_email=endereco_email):
+                return None
+            return "Serviço de email recusou o envio"
+        except Exception as e:
+            return str(e) or e.__class__.__name__
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import threading
+import time
+
+DB_REPLICA_INTERVALO = float(os.getenv("DB_REPLICA_INTERVALO", 1.0))  # segundos entre cópias para a réplica
+
+
+class ReplicaLeitura:
+    """
+    Mantém a réplica de leitura do DB_LEITURA_MODO=replica: a cada intervalo copia o banco principal para
+    o arquivo da réplica com a API de backup online do SQLite (a mesma do /restaurarBanco).
+
+    A cópia é uma única transação na réplica, então quem lê vê o estado anterior ou o novo, nunca metade.
+    No principal ela só precisa de uma transação de leitura, que no WAL não bloqueia quem escreve.
+    Vários workers podem apontar para a mesma réplica: quem pega o lock de escrita copia, os outros esperam.
+    """
+    def __init__(self, engine_principal, caminho_replica: str, intervalo: float = DB_REPLICA_INTERVALO):
+        self.engine_principal = engine_principal
+        self.caminho_replica = caminho_replica
+        self.intervalo = intervalo
+        self.copias = 0
+        self.falhas = 0
+        self.ultima_copia = None  # time.time() da última cópia completa
+        self.duracao_ultima_copia = 0.0
+        self._parar = threading.Event()
+        self._thread = None
+
+    def iniciar(self):
+        # a primeira cópia é síncrona: o engine de leitura abre a réplica em modo ro e ela precisa existir
+        self.atualizar()
+        self._thread = threading.Thread(target=self._loop, name="replica-leitura", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.atualizar()
+            except Exception:
+                self.falhas += 1
+
+    def atualizar(self) -> float:
+        """Copia o principal para a réplica e retorna a duração em segundos."""
+        inicio = time.perf_counter()
+        origem = self.engine_principal.raw_connection()
+        try:
+            destino = sqlite3.connect(self.caminho_replica)
+            try:
+                origem.driver_connection.backup(destino)
+            finally:
+                destino.close()
+        finally:
+            origem.close()
+        self.duracao_ultima_copia = time.perf_counter() - inicio
+        self.ultima_copia = time.time()
+        self.copias += 1
+        return self.duracao_ultima_copia
+
+    def estatisticas(self) -> dict:
+        return {
+            "caminho": self.caminho_replica,
+            "copias": self.copias,
+            "falhas": self.falhas,
+            "atrasoSegundos": time.time() - self.ultima_copia if self.ultima_copia else None,
+            "duracaoUltimaCopiaMs": round(self.duracao_ultima_copia * 1000, 3),
+        }
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+from ..metricas import registro, Histograma
+
+RESTAURAR_MODO = os.getenv("RESTAURAR_MODO", "snapshot")  # "snapshot" ou "sql" (comportamento antigo)
+
+restauracao_duracao = registro.registrar(Histograma(
+    "db_restauracao_duracao_segundos", "Duração do /restaurarBanco por modo", ("modo",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)))
+
+
+class RestauracaoBanco:
+    """
+    Restaura o banco para o estado do restaurar_banco.sql + migrações.
+
+    No modo "snapshot" o script roda uma única vez num banco dourado em memória; cada restauração
+    copia as páginas dele para o banco da aplicação com a API de backup online do SQLite, sem
+    interpretar SQL. O banco dourado é refeito se o script ou alguma migração mudar.
+    O modo "sql" mantém o caminho antigo, comando por comando.
+    """
+    def __init__(self, engine_alvo, caminho_sql: str, migracoes_dir: str, aplicar_migracoes):
+        self.engine_alvo = engine_alvo
+        self.caminho_sql = caminho_sql
+        self.migracoes_dir = migracoes_dir
+        self.aplicar_migracoes = aplicar_migracoes
+        self._dourado: sqlite3.Connection | None = None
+        self._assinatura = None
+        self._criado_em = 0.0  # time.time() da criação, para reajustar horários relativos a "now"
+        self._lock = threading.Lock()
+
+    def _assinatura_arquivos(self):
+        arquivos = [self.caminho_sql] + sorted(
+            os.path.join(self.migracoes_dir, f) for f in os.listdir(self.migracoes_dir) if f.endswith(".sql"))
+        return tuple((f, os.stat(f).st_mtime_ns) for f in arquivos)
+
+    def _banco_dourado(self) -> sqlite3.Connection:
+        assinatura = self._assinatura_arquivos()
+        if self._dourado is not None and assinatura == self._assinatura:
+            return self._dourado
+        engine_dourado = create_engine("sqlite://", poolclass=StaticPool,
+                                       connect_args={"check_same_thread": False})
+        conexao = engine_dourado.raw_connection().driver_connection
+        with open(self.caminho_sql, "r") as f:
+            conexao.executescript(f.read())
+        self.aplicar_migracoes(engine_dourado)
+        self._dourado, self._assinatura, self._criado_em = conexao, assinatura, time.time()
+        return conexao
+
+    def restaurar(self, modo: str = RESTAURAR_MODO, db: Session = None) -> float:
+        """Restaura e retorna a duração em segundos. O modo "sql" usa a sessão `db`."""
+        with self._lock:
+            inicio = time.perf_counter()
+            if modo == "sql":
+                self._restaurar_por_sql(db)
+            else:
+                self._restaurar_snapshot()
+            duracao = time.perf_counter() - inicio
+        restauracao_duracao.observar(duracao, modo)
+        return duracao
+
+    def _restaurar_snapshot(self):
+        dourado = self._banco_dourado()
+        conexao = self.engine_alvo.raw_connection()
+        try:
+            dourado.backup(conexao.driver_connection)
+            # o script usa datetime('now') nos aluguéis de exemplo: avança esses horários pelo tempo
+            # desde a criação do banco dourado, como se o script tivesse acabado de rodar
+            atraso = int(time.time() - self._criado_em)
+            if atraso > 0:
+                deslocamento = f"+{atraso} seconds"
+                conexao.driver_connection.execute(
+                    "UPDATE aluguel SET horaInicio = datetime(horaInicio, ?), horaFim = datetime(horaFim, ?)",
+                    (deslocamento, deslocamento))
+                conexao.driver_connection.commit()
+        finally:
+            conexao.close()
+
+    def _restaurar_por_sql(self, db: Session):
+        with open(self.caminho_sql, "r") as file:
+            sql_commands = file.read()
+        # Dividir o conteúdo em comandos separados por ponto e vírgula
+        for command in sql_commands.split(';'):  # maluquice do sqlite
+            command = command.strip()
+            if command:
+                db.execute(text(command))  # peculiaridade do sqlalchemy
+        db.commit()
+        # o script volta o banco para a versão 0; reaplica tabelas e índices das migrações
+        self.aplicar_migracoes(self.engine_alvo)
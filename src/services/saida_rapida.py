@@ -0,0 +1,38 @@
+import os
+from pydantic_core import to_json
+from starlette.responses import JSONResponse
+from ..schemas import Ciclista, Passaporte, CartaoCredito
+
+# Liga o caminho rápido de saída nos GETs de ciclista, cartão e funcionário (desligado por padrão)
+SAIDA_RAPIDA = os.getenv("SAIDA_RAPIDA", "0") == "1"
+
+# ordem dos campos na resposta (a mesma dos schemas, que continuam documentando as rotas)
+CAMPOS_CICLISTA = list(Ciclista.model_fields)
+CAMPOS_PASSAPORTE = list(Passaporte.model_fields)
+CAMPOS_CARTAO = list(CartaoCredito.model_fields)
+
+
+class RespostaRapida(JSONResponse):
+    """
+    Resposta para dicts que já estão no formato do response_model: serializa com o pydantic_core
+    (em Rust) e não passa pela validação de saída do FastAPI. Os dados foram validados na entrada,
+    então EmailStr, PaymentCardNumber e o código de país não são conferidos de novo a cada GET.
+    """
+    def render(self, content) -> bytes:
+        return to_json(content)
+
+
+def dto_ciclista(linha) -> dict:
+    """Linha de CiclistaService.consulta_ciclista_resposta -> dict no formato do schema Ciclista."""
+    dados = {}
+    for campo in CAMPOS_CICLISTA:
+        if campo == "passaporte":
+            dados[campo] = None if linha["passaporte_numero"] is None else {
+                c: linha[f"passaporte_{c}"] for c in CAMPOS_PASSAPORTE}
+        else:
+            dados[campo] = linha[campo]
+    return dados
+
+
+def dto_simples(linha, campos) -> dict:
+    return {campo: linha[campo] for campo in campos}
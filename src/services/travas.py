@@ -0,0 +1,75 @@
+import asyncio
+import os
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+TRAVAS_LISTRAS = int(os.getenv("TRAVAS_LISTRAS", 1024))  # travas por conjunto; chaves diferentes raramente colidem
+
+
+class _Listras:
+    """
+    Travas por chave com listras (lock striping): a chave cai numa de N travas fixas pelo hash.
+    Requisições com a mesma chave se enfileiram e chaves diferentes seguem em paralelo (salvo colisão
+    de listra, rara com N bem maior que o número de requisições simultâneas). Não cresce com o número
+    de chaves e não precisa limpar travas antigas.
+
+    Várias chaves de uma vez são pegas em ordem crescente de listra, então duas requisições que
+    disputam as mesmas chaves em ordem trocada não se travam mutuamente.
+    """
+    def __init__(self, fabrica, listras: int = TRAVAS_LISTRAS):
+        self._travas = [fabrica() for _ in range(listras)]
+        self.aquisicoes = 0
+        self.esperas = 0  # aquisições que encontraram a listra ocupada
+
+    def _listras(self, chaves) -> list:
+        return [self._travas[i] for i in sorted({hash(chave) % len(self._travas) for chave in chaves})]
+
+    def _contar(self, travas):
+        self.aquisicoes += 1
+        if any(trava.locked() for trava in travas):
+            self.esperas += 1
+
+    def estatisticas(self) -> dict:
+        return {"listras": len(self._travas), "aquisicoes": self.aquisicoes, "esperas": self.esperas}
+
+
+class TravasPorChave(_Listras):
+    """Versão para threads (CiclistaService)."""
+    def __init__(self, listras: int = TRAVAS_LISTRAS):
+        super().__init__(threading.Lock, listras)
+
+    @contextmanager
+    def travar(self, *chaves):
+        travas = self._listras(chaves)
+        self._contar(travas)
+        for trava in travas:
+            trava.acquire()
+        try:
+            yield
+        finally:
+            for trava in reversed(travas):
+                trava.release()
+
+
+class TravasPorChaveAsync(_Listras):
+    """Versão para o event loop (CiclistaServiceAsync): quem espera não ocupa thread."""
+    def __init__(self, listras: int = TRAVAS_LISTRAS):
+        super().__init__(asyncio.Lock, listras)
+
+    @asynccontextmanager
+    async def travar(self, *chaves):
+        travas = self._listras(chaves)
+        self._contar(travas)
+        adquiridas = []
+        try:
+            for trava in travas:
+                await trava.acquire()
+                adquiridas.append(trava)
+            yield
+        finally:
+            for trava in reversed(adquiridas):
+                trava.release()
+
+
+# uma chave por ciclista e uma por bicicleta/tranca, compartilhadas por todas as instâncias do serviço
+travas_aluguel_async = TravasPorChaveAsync()
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import sys
+from typing import NamedTuple
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+import stubs  # noqa: E402
+from database import aplicar_migracoes, criar_async_engine, criar_engine  # noqa: E402
+
+# latência dos stubs: as duas requisições concorrentes passam pela checagem antes de qualquer insert
+LATENCIA_STUB_MS = 30
+
+
+class Banco:
+    """Cópia do banco do restaurar_banco.sql com as migrações, num arquivo temporário."""
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.engine = criar_engine(f"sqlite:///{caminho}")
+        self.async_engine = criar_async_engine(f"sqlite+aiosqlite:///{caminho}")
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.AsyncSessionLocal = async_sessionmaker(bind=self.async_engine, autoflush=False, expire_on_commit=False)
+
+    def consultar(self, sql: str, *parametros) -> list:
+        with sqlite3.connect(self.caminho) as conexao:
+            return conexao.execute(sql, parametros).fetchall()
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho = str(tmp_path / "banco.db")
+    with sqlite3.connect(caminho) as conexao, open(os.path.join(RAIZ, "restaurar_banco.sql")) as f:
+        conexao.executescript(f.read())
+    novo = Banco(caminho)
+    aplicar_migracoes(novo.engine)
+    yield novo
+    novo.engine.dispose()
+
+
+class Upstreams(NamedTuple):
+    url_externo: str
+    url_equipamento: str
+    externo: stubs.ConfigStub  # requisicoes conta as chamadas recebidas
+    equipamento: stubs.ConfigStub
+
+
+@pytest.fixture
+def upstreams():
+    """Stubs do externo e do equipamento (benchmarks/stubs.py)."""
+    externo, config_externo = stubs.iniciar(stubs.rotas_externo, latencia_ms=LATENCIA_STUB_MS)
+    equipamento, config_equipamento = stubs.iniciar(stubs.rotas_equipamento, latencia_ms=LATENCIA_STUB_MS)
+    yield Upstreams(f"http://127.0.0.1:{externo.server_port}", f"http://127.0.0.1:{equipamento.server_port}",
+                    config_externo, config_equipamento)
+    externo.shutdown()
+    equipamento.shutdown()
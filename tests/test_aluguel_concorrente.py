@@ -0,0 +1,98 @@
+"""
+Aluguel e devolução concorrentes contra os stubs do externo e do equipamento.
+
+Cada chamada tem sua sessão e suas travas, como requisições em dois workers diferentes: a trava
+por chave não as separa, então quem garante um aluguel em aberto por ciclista/bicicleta são os
+índices únicos parciais da 0006 e o fechamento condicional da devolução.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from src.clients import CacheTTL, ClienteHttpAsync
+from src.services import CiclistaServiceAsync, EscritorBanco, EspelhoEquipamento, TravasPorChaveAsync
+
+CICLISTA_SEM_ALUGUEL = 1
+BICICLETA_ALUGADA = 5  # aluguel em aberto do ciclista 4 no restaurar_banco.sql
+
+
+async def _concorrentes(banco, upstreams, escritor, chamada, *argumentos) -> list:
+    """Roda `chamada` uma vez para cada tupla de argumentos, todas ao mesmo tempo. Devolve os status."""
+    url_externo, url_equipamento = upstreams.url_externo, upstreams.url_equipamento
+    http_externo, http_equipamento = ClienteHttpAsync(url_externo), ClienteHttpAsync(url_equipamento)
+
+    async def worker(args):
+        async with banco.AsyncSessionLocal() as db:
+            service = CiclistaServiceAsync(db, url_externo, url_equipamento, http_externo=http_externo,
+                                           http_equipamento=http_equipamento, cache=CacheTTL(ttl=0),
+                                           travas=TravasPorChaveAsync(), espelho=EspelhoEquipamento(ativo=False),
+                                           escritor=escritor)
+            try:
+                await getattr(service, chamada)(*args)
+                return 200
+            except HTTPException as e:
+                return e.status_code
+
+    try:
+        return sorted(await asyncio.gather(*(worker(args) for args in argumentos)))
+    finally:
+        await http_externo.fechar()
+        await http_equipamento.fechar()
+        await banco.async_engine.dispose()
+
+
+@pytest.fixture(params=["sessao", "escritor"])
+def escritor(request, banco):
+    """Sem escritor cada worker grava pela própria sessão; com ele, as unidades passam pelo EscritorBanco."""
+    if request.param == "sessao":
+        yield None
+        return
+    novo = EscritorBanco(banco.SessionLocal)
+    novo.iniciar()
+    yield novo
+    novo.parar()
+
+
+def test_aluguel_concorrente_do_mesmo_ciclista(banco, upstreams, escritor):
+    # trancas ímpares começam OCUPADAS no stub do equipamento
+    status = asyncio.run(_concorrentes(banco, upstreams, escritor, "realizar_aluguel",
+                                       (CICLISTA_SEM_ALUGUEL, 7), (CICLISTA_SEM_ALUGUEL, 9)))
+
+    assert status == [200, 422]
+    assert upstreams.externo.requisicoes == 1  # quem perdeu no índice não chegou a cobrar
+    abertos = banco.consultar("SELECT trancaInicio, bicicleta FROM aluguel WHERE ciclista_id = ? AND horaFim IS NULL",
+                              CICLISTA_SEM_ALUGUEL)
+    assert len(abertos) == 1
+    assert abertos[0][0] == abertos[0][1]  # a bicicleta é a da tranca do aluguel que ficou
+    emails = banco.consultar("SELECT count(*) FROM email_outbox WHERE assunto = 'Aluguel de Bicicleta -- Grupo A'")
+    assert emails == [(1,)]
+
+
+def test_devolucao_concorrente_da_mesma_bicicleta(banco, upstreams, escritor):
+    (id_aluguel,), = banco.consultar("SELECT id FROM aluguel WHERE bicicleta = ? AND horaFim IS NULL",
+                                     BICICLETA_ALUGADA)
+
+    # trancas pares começam DISPONIVEIS no stub do equipamento
+    status = asyncio.run(_concorrentes(banco, upstreams, escritor, "realizar_devolucao",
+                                       (BICICLETA_ALUGADA, 2), (BICICLETA_ALUGADA, 4)))
+
+    assert status == [200, 404]
+    assert upstreams.externo.requisicoes == 1  # só a devolução que fechou o aluguel cobrou o adicional
+    (hora_fim, tranca_fim), = banco.consultar("SELECT horaFim, trancaFim FROM aluguel WHERE id = ?", id_aluguel)
+    assert hora_fim is not None and tranca_fim in (2, 4)
+    assert banco.consultar("SELECT count(*) FROM aluguel WHERE bicicleta = ? AND horaFim IS NULL",
+                           BICICLETA_ALUGADA) == [(0,)]
+    emails = banco.consultar("SELECT count(*) FROM email_outbox WHERE assunto = 'Devolução -- Grupo A'")
+    assert emails == [(1,)]
+
+
+@pytest.mark.parametrize("coluna, valor", [("ciclista_id", 3), ("bicicleta", 3)])
+def test_indice_rejeita_segundo_aluguel_em_aberto(banco, coluna, valor):
+    # ciclista 3 tem aluguel em aberto com a bicicleta 3; o outro campo é livre
+    outros = {"ciclista_id": 1, "bicicleta": 99}
+    outros[coluna] = valor
+    with sqlite3.connect(banco.caminho) as conexao, pytest.raises(sqlite3.IntegrityError):
+        conexao.execute("INSERT INTO aluguel (ciclista_id, bicicleta, trancaInicio, horaInicio) "
+                        "VALUES (?, ?, 1, datetime('now'))", (outros["ciclista_id"], outros["bicicleta"]))
@@ -0,0 +1,95 @@
+"""
+DespachanteCobranca (src/services/cobranca_pendente_service.py) contra o stub do externo.
+"""
+import datetime
+
+from sqlalchemy import update
+
+from src.models import AluguelDB, CobrancaPendenteDB
+from src.services import DespachanteCobranca, estatisticas_cobrancas_pendentes
+from src.services import cobranca_pendente_service
+
+CICLISTA_COM_ALUGUEL = 4
+
+
+def _adiar(banco) -> int:
+    """Cobrança inicial do aluguel em aberto do ciclista 4 volta para a fila local; devolve o id do aluguel."""
+    (id_aluguel,), = banco.consultar("SELECT id FROM aluguel WHERE ciclista_id = ? AND horaFim IS NULL",
+                                     CICLISTA_COM_ALUGUEL)
+    with banco.SessionLocal() as db:
+        db.execute(update(AluguelDB).where(AluguelDB.id == id_aluguel).values(cobranca=None))
+        db.add(CobrancaPendenteDB(ciclista_id=CICLISTA_COM_ALUGUEL, aluguel_id=id_aluguel, campo="cobranca",
+                                  valor=10))
+        db.commit()
+    return id_aluguel
+
+
+def _vencer_reservas(banco):
+    with banco.SessionLocal() as db:
+        db.query(CobrancaPendenteDB).update({"proximaTentativa": datetime.datetime(2000, 1, 1)})
+        db.commit()
+
+
+def _pendencias(banco) -> list:
+    return banco.consultar("SELECT status, tentativas, cobrancaId FROM cobranca_pendente")
+
+
+def test_cobranca_adiada_e_enviada_e_gravada_no_aluguel(banco, upstreams):
+    id_aluguel = _adiar(banco)
+    despachante = DespachanteCobranca(banco.SessionLocal, upstreams.url_externo)
+    try:
+        assert despachante.processar_lote() == 1
+        assert despachante.processar_lote() == 0
+    finally:
+        despachante.parar()
+
+    (status, tentativas, cobranca_id), = _pendencias(banco)
+    assert (status, tentativas) == ("ENVIADA", 0)
+    assert banco.consultar("SELECT cobranca FROM aluguel WHERE id = ?", id_aluguel) == [(cobranca_id,)]
+
+
+def test_resultado_de_reserva_vencida_nao_e_gravado(banco, upstreams):
+    _adiar(banco)
+    lento = DespachanteCobranca(banco.SessionLocal, upstreams.url_externo)
+    outro = DespachanteCobranca(banco.SessionLocal, upstreams.url_externo)
+    reserva_do_outro = []
+
+    def falhar_depois_de_perder_a_reserva(service, lote, ciclista_e_valor):
+        # a reserva vence no meio do envio e outro worker reserva o lote para reenviá-lo
+        _vencer_reservas(banco)
+        with banco.SessionLocal() as db:
+            reserva, lotes = outro._reservar_lotes(db)
+        assert list(lotes) == [lote]
+        reserva_do_outro.append(reserva)
+        return None, "timeout de leitura"
+
+    lento._enviar = falhar_depois_de_perder_a_reserva
+    try:
+        assert lento.processar_lote() == 1
+    finally:
+        lento.parar()
+        outro.parar()
+
+    # a falha de quem perdeu a reserva não conta tentativa nem mexe na reserva do outro
+    with banco.SessionLocal() as db:
+        pendencia = db.query(CobrancaPendenteDB).one()
+        assert (pendencia.status, pendencia.tentativas, pendencia.ultimoErro) == ("ENVIANDO", 0, None)
+        assert pendencia.proximaTentativa == reserva_do_outro[0]
+
+
+def test_cobranca_recusada_para_de_tentar_apos_o_limite(banco, monkeypatch):
+    _adiar(banco)
+    monkeypatch.setattr(cobranca_pendente_service, "COBRANCA_PENDENTE_MAX_TENTATIVAS", 3)
+    despachante = DespachanteCobranca(banco.SessionLocal, "http://127.0.0.1:1")
+    despachante._enviar = lambda service, lote, ciclista_e_valor: (None, "Serviço de pagamento recusou a cobrança")
+    try:
+        for _ in range(5):
+            _vencer_reservas(banco)
+            despachante.processar_lote()
+    finally:
+        despachante.parar()
+
+    assert _pendencias(banco) == [("FALHOU", 3, None)]
+    with banco.SessionLocal() as db:
+        estatisticas = estatisticas_cobrancas_pendentes(db)
+    assert (estatisticas["pendentes"], estatisticas["falhas"]) == (0, 1)
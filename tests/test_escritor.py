@@ -0,0 +1,90 @@
+"""
+EscritorBanco (src/services/escritor_service.py): timeout de quem espera e o que de fato é gravado.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.models import EmailOutboxDB
+from src.services import EscritorBanco
+
+
+@pytest.fixture
+def escritor(banco):
+    novo = EscritorBanco(banco.SessionLocal, timeout=0.1)
+    novo.iniciar()
+    yield novo
+    novo.parar()
+
+
+def _gravar_email(assunto: str):
+    def unidade(db):
+        db.add(EmailOutboxDB(email="c@example.com", assunto=assunto, mensagem="oi"))
+        db.flush()
+        return assunto
+    return unidade
+
+
+def _assuntos(banco) -> list:
+    return [assunto for (assunto,) in banco.consultar("SELECT assunto FROM email_outbox ORDER BY id")]
+
+
+def _ocupar(escritor) -> threading.Event:
+    """Prende a thread do escritor numa unidade até o evento devolvido ser marcado."""
+    liberar, ocupado = threading.Event(), threading.Event()
+
+    def unidade(db):
+        ocupado.set()
+        liberar.wait(5)
+
+    escritor.submeter(unidade)
+    ocupado.wait(5)
+    return liberar
+
+
+def test_unidade_que_esperou_demais_na_fila_nao_grava(banco, escritor):
+    liberar = _ocupar(escritor)
+    with pytest.raises(TimeoutError):
+        escritor.executar(_gravar_email("desistiu"))
+    with pytest.raises(TimeoutError):
+        asyncio.run(escritor.executar_async(_gravar_email("desistiu async")))
+    liberar.set()
+
+    assert escritor.executar(_gravar_email("depois")) == "depois"
+    assert _assuntos(banco) == ["depois"]
+
+
+def test_unidade_ja_no_lote_tem_o_commit_esperado(banco, escritor):
+    def lenta(nome):
+        gravar = _gravar_email(nome)
+
+        def unidade(db):
+            time.sleep(0.3)  # mais que o timeout, mas já rodando
+            return gravar(db)
+        return unidade
+
+    assert escritor.executar(lenta("sync")) == "sync"
+    assert asyncio.run(escritor.executar_async(lenta("async"))) == "async"
+    assert _assuntos(banco) == ["sync", "async"]
+
+
+def test_lote_tem_um_commit_e_a_unidade_com_erro_e_desfeita_sozinha(banco, escritor):
+    def com_erro(db):
+        _gravar_email("desfeito")(db)
+        raise ValueError("unidade com erro")
+
+    liberar = _ocupar(escritor)
+    # enquanto o escritor está ocupado as três se acumulam na fila e entram no mesmo lote
+    futuros = [escritor.submeter(unidade) for unidade in (_gravar_email("a"), com_erro, _gravar_email("b"))]
+    liberar.set()
+
+    assert futuros[0].result(5) == "a"
+    assert futuros[2].result(5) == "b"
+    with pytest.raises(ValueError):
+        futuros[1].result(5)
+    assert _assuntos(banco) == ["a", "b"]
+    estatisticas = escritor.estatisticas()
+    assert (estatisticas["lotes"], estatisticas["maiorLote"]) == (2, 3)  # o lote da unidade que ocupou e o das três
+    assert (estatisticas["unidadesComErro"], estatisticas["commitsComErro"]) == (1, 0)
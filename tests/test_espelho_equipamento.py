@@ -0,0 +1,101 @@
+"""
+Espelho do equipamento (src/services/espelho_equipamento.py) no aluguel contra os stubs.
+"""
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import RAIZ
+from database import MIGRACOES_DIR, aplicar_migracoes
+from src.clients import CacheTTL, ClienteHttpAsync
+from src.services import CiclistaServiceAsync, EspelhoEquipamento, RestauracaoBanco, TravasPorChaveAsync
+
+CICLISTA_SEM_ALUGUEL = 1
+
+
+def _bicicleta(id_bicicleta: int, numero: int) -> dict:
+    return {"id": id_bicicleta, "numero": numero, "marca": "Caloi", "modelo": "Urbana", "ano": "2023",
+            "status": "DISPONIVEL"}
+
+
+async def _alugar(banco, upstreams, espelho, id_ciclista, id_tranca):
+    url_externo, url_equipamento = upstreams.url_externo, upstreams.url_equipamento
+    http_externo, http_equipamento = ClienteHttpAsync(url_externo), ClienteHttpAsync(url_equipamento)
+    try:
+        async with banco.AsyncSessionLocal() as db:
+            service = CiclistaServiceAsync(db, url_externo, url_equipamento, http_externo=http_externo,
+                                           http_equipamento=http_equipamento, cache=CacheTTL(ttl=0),
+                                           travas=TravasPorChaveAsync(), espelho=espelho)
+            return await service.realizar_aluguel(id_ciclista, id_tranca)
+    finally:
+        await http_externo.fechar()
+        await http_equipamento.fechar()
+        await banco.async_engine.dispose()
+
+
+def test_aluguel_atualiza_a_bicicleta_do_espelho_pelo_id(banco, upstreams):
+    # a bicicleta de número 7 tem id 1007; o id 7 é de outra bicicleta, que não pode mudar
+    espelho = EspelhoEquipamento(ativo=True)
+    espelho.aplicar([{"id": 7, "status": "OCUPADA", "bicicleta": 1007}],
+                    [_bicicleta(1007, 7), _bicicleta(7, 70)])
+
+    aluguel = asyncio.run(_alugar(banco, upstreams, espelho, CICLISTA_SEM_ALUGUEL, 7))
+
+    assert aluguel.bicicleta == 7
+    assert espelho.bicicleta(1007)["status"] == "EM_USO"
+    assert espelho.bicicleta(7)["status"] == "DISPONIVEL"
+    assert espelho.bicicleta_na_tranca(7) is None
+
+
+@pytest.mark.parametrize("modo", ["snapshot", "sql"])
+def test_restauracao_esvazia_o_espelho_dos_outros_workers(banco, modo):
+    # um worker recebe o evento e grava; o outro lê da tabela na sincronia
+    recebeu, outro = EspelhoEquipamento(ativo=True), EspelhoEquipamento(ativo=True)
+    recebeu.session_factory = outro.session_factory = banco.SessionLocal
+    recebeu.aplicar([{"id": 3, "status": "OCUPADA", "bicicleta": 3}], [_bicicleta(3, 3)])
+    outro.sincronizar()
+    assert outro.tranca(3) is not None
+
+    restauracao = RestauracaoBanco(banco.engine, os.path.join(RAIZ, "restaurar_banco.sql"), MIGRACOES_DIR,
+                                   aplicar_migracoes)
+    with banco.SessionLocal() as db:
+        restauracao.restaurar(modo, db)
+
+    assert banco.consultar("SELECT count(*) FROM tranca_espelho") == [(0,)]
+    assert banco.consultar("SELECT count(*) FROM bicicleta_espelho") == [(0,)]
+    outro.sincronizar()
+    assert outro.tranca(3) is None
+    assert outro.bicicleta(3) is None
+
+
+@pytest.mark.parametrize("configurado, enviado", [
+    (None, None), (None, ""), ("segredo", None), ("segredo", "outro"),
+])
+def test_eventos_sem_o_token_do_equipamento_sao_recusados(monkeypatch, configurado, enviado):
+    # sem ESPELHO_TOKEN configurado ninguém empurra estado: o aluguel confiaria nele sem ir ao equipamento
+    espelho = EspelhoEquipamento(ativo=True)
+    monkeypatch.setattr(main, "ESPELHO_TOKEN", configurado)
+    monkeypatch.setattr(main, "espelho_equipamento", espelho)
+    cabecalhos = {} if enviado is None else {"X-Equipamento-Token": enviado}
+
+    resposta = TestClient(main.app).post("/equipamento/eventos", headers=cabecalhos,
+                                         json={"trancas": [{"id": 3, "status": "DISPONIVEL"}]})
+
+    assert resposta.status_code == 401
+    assert espelho.tranca(3) is None
+
+
+def test_eventos_com_o_token_do_equipamento_sao_aplicados(banco, monkeypatch):
+    espelho = EspelhoEquipamento(ativo=True)
+    espelho.session_factory = banco.SessionLocal
+    monkeypatch.setattr(main, "ESPELHO_TOKEN", "segredo")
+    monkeypatch.setattr(main, "espelho_equipamento", espelho)
+
+    resposta = TestClient(main.app).post("/equipamento/eventos", headers={"X-Equipamento-Token": "segredo"},
+                                         json={"trancas": [{"id": 3, "status": "DISPONIVEL"}]})
+
+    assert resposta.status_code == 200
+    assert espelho.tranca(3)["status"] == "DISPONIVEL"
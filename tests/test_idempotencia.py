@@ -0,0 +1,80 @@
+"""
+Idempotency-Key (src/services/idempotencia_service.py) no aluguel, com dois workers contra os stubs.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from src.clients import CacheTTL, ClienteHttpAsync
+from src.services import (CiclistaServiceAsync, EscritorBanco, EspelhoEquipamento, GuardaIdempotencia,
+                          TravasPorChaveAsync)
+
+CICLISTA_SEM_ALUGUEL = 1
+
+
+@pytest.fixture(params=["sessao", "escritor"])
+def escritor(request, banco):
+    """Sem escritor a guarda commita numa sessão própria; com ele, reserva e conclusão vão para a fila única."""
+    if request.param == "sessao":
+        yield None
+        return
+    novo = EscritorBanco(banco.SessionLocal)
+    novo.iniciar()
+    yield novo
+    novo.parar()
+
+
+async def _alugar_com_chave(banco, upstreams, guardas, chave, *trancas) -> list:
+    """Um aluguel do mesmo ciclista por tranca, cada um num worker (guarda, sessão e travas próprias)."""
+    http_externo = ClienteHttpAsync(upstreams.url_externo)
+    http_equipamento = ClienteHttpAsync(upstreams.url_equipamento)
+
+    async def worker(guarda, id_tranca):
+        async with banco.AsyncSessionLocal() as db:
+            service = CiclistaServiceAsync(db, upstreams.url_externo, upstreams.url_equipamento,
+                                           http_externo=http_externo, http_equipamento=http_equipamento,
+                                           cache=CacheTTL(ttl=0), travas=TravasPorChaveAsync(),
+                                           espelho=EspelhoEquipamento(ativo=False), escritor=guarda.escritor)
+            try:
+                return await guarda.executar(
+                    "/aluguel", chave, {"ciclista": CICLISTA_SEM_ALUGUEL, "trancaInicio": id_tranca},
+                    lambda: service.realizar_aluguel(CICLISTA_SEM_ALUGUEL, id_tranca))
+            except HTTPException as e:
+                return e
+
+    try:
+        return await asyncio.gather(*(worker(guarda, id_tranca) for guarda, id_tranca in zip(guardas, trancas)))
+    finally:
+        await http_externo.fechar()
+        await http_equipamento.fechar()
+        await banco.async_engine.dispose()
+
+
+def test_mesma_chave_em_dois_workers_aluga_uma_vez(banco, upstreams, escritor):
+    guardas = [GuardaIdempotencia(banco.AsyncSessionLocal, escritor=escritor) for _ in range(2)]
+
+    primeiro, repetido = sorted(asyncio.run(_alugar_com_chave(banco, upstreams, guardas, "chave-1", 7, 7)),
+                                key=lambda resultado: isinstance(resultado, JSONResponse))
+
+    assert not isinstance(primeiro, (JSONResponse, HTTPException))
+    assert isinstance(repetido, JSONResponse) and repetido.headers["Idempotency-Replayed"] == "true"
+    assert upstreams.externo.requisicoes == 1  # a repetição não cobrou de novo
+    assert banco.consultar("SELECT count(*) FROM aluguel WHERE ciclista_id = ? AND horaFim IS NULL",
+                           CICLISTA_SEM_ALUGUEL) == [(1,)]
+    assert banco.consultar("SELECT status, codigoHttp FROM idempotencia") == [("CONCLUIDA", 200)]
+
+
+def test_mesma_chave_com_outro_corpo_e_recusada(banco, upstreams, escritor):
+    guardas = [GuardaIdempotencia(banco.AsyncSessionLocal, escritor=escritor) for _ in range(2)]
+    asyncio.run(_alugar_com_chave(banco, upstreams, guardas[:1], "chave-1", 7))
+    requisicoes = upstreams.externo.requisicoes
+
+    erro, = asyncio.run(_alugar_com_chave(banco, upstreams, guardas[1:], "chave-1", 9))
+
+    assert isinstance(erro, HTTPException) and erro.status_code == 422
+    assert erro.detail == "Idempotency-Key já usada com outro corpo."
+    assert upstreams.externo.requisicoes == requisicoes  # nada foi executado
+    assert banco.consultar("SELECT trancaInicio FROM aluguel WHERE ciclista_id = ? AND horaFim IS NULL",
+                           CICLISTA_SEM_ALUGUEL) == [(7,)]
@@ -0,0 +1,61 @@
+"""
+IndiceEmails (src/services/indice_emails.py): sincronia pelos gatilhos da 0009 entre workers e restauração.
+"""
+import os
+import sqlite3
+
+import pytest
+
+from conftest import RAIZ
+from database import MIGRACOES_DIR, aplicar_migracoes
+from src.services import IndiceEmails, RestauracaoBanco
+
+
+def _cadastrar(banco, id_ciclista: int, email: str):
+    # direto no banco, como um cadastro feito por outro worker: só o gatilho avisa o índice
+    with sqlite3.connect(banco.caminho) as conexao:
+        conexao.execute("INSERT INTO ciclista (id, nome, email, nacionalidade, nascimento, senha, status) "
+                        "VALUES (?, 'Outro Worker', ?, 'ESTRANGEIRO', '2000-01-01', 'x', 'ATIVO')",
+                        (id_ciclista, email))
+
+
+def _sincronizar(banco, indice: IndiceEmails):
+    with banco.SessionLocal() as db:
+        indice.sincronizar(db, forcar=True)
+
+
+def test_indice_ve_cadastro_e_troca_de_email_de_outro_worker(banco):
+    indice = IndiceEmails(modo="exato")
+    _sincronizar(banco, indice)
+    assert indice.pode_existir("USER@example.com")
+    assert not indice.pode_existir("novo@example.com")
+
+    _cadastrar(banco, 10, "novo@example.com")
+    with sqlite3.connect(banco.caminho) as conexao:
+        conexao.execute("UPDATE ciclista SET email = 'trocado@example.com' WHERE id = 2")
+    _sincronizar(banco, indice)
+
+    assert indice.pode_existir("novo@example.com")
+    assert indice.pode_existir("trocado@example.com")
+
+
+@pytest.mark.parametrize("modo", ["snapshot", "sql"])
+def test_indice_refeito_quando_outro_worker_restaura_o_banco(banco, modo):
+    indice = IndiceEmails(modo="exato")
+    _cadastrar(banco, 10, "antes@example.com")
+    _sincronizar(banco, indice)
+    assert indice.pode_existir("antes@example.com")
+
+    restauracao = RestauracaoBanco(banco.engine, os.path.join(RAIZ, "restaurar_banco.sql"), MIGRACOES_DIR,
+                                   aplicar_migracoes)
+    with banco.SessionLocal() as db:
+        restauracao.restaurar(modo, db)
+    # a tabela de alterações foi refeita: este cadastro ganha o mesmo seq que o índice já leu
+    _cadastrar(banco, 10, "depois@example.com")
+    assert banco.consultar("SELECT seq FROM ciclista_email_alteracao WHERE email = 'depois@example.com'") == \
+        [(indice.estatisticas()["ultimaAlteracao"],)]
+    _sincronizar(banco, indice)
+
+    assert indice.pode_existir("depois@example.com")
+    assert not indice.pode_existir("antes@example.com")
+    assert indice.pode_existir("user@example.com")
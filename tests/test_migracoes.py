@@ -0,0 +1,58 @@
+"""
+aplicar_migracoes (database.py) com dois workers subindo juntos.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from conftest import RAIZ
+from database import MIGRACOES_DIR, aplicar_migracoes, criar_engine
+
+ULTIMA_VERSAO = max(int(f.split("_", 1)[0]) for f in os.listdir(MIGRACOES_DIR) if f.endswith(".sql"))
+
+
+@pytest.mark.parametrize("perfil", ["wal", "legado"])
+def test_dois_workers_aplicam_as_migracoes_uma_vez(tmp_path, perfil):
+    caminho = str(tmp_path / "banco.db")
+    with sqlite3.connect(caminho) as conexao, open(os.path.join(RAIZ, "restaurar_banco.sql")) as f:
+        conexao.executescript(f.read())
+    alugueis = sqlite3.connect(caminho).execute("SELECT count(*) FROM aluguel").fetchone()
+
+    engines = [criar_engine(f"sqlite:///{caminho}", perfil=perfil) for _ in range(2)]
+    aplicadas = []
+    for engine_worker in engines:
+        @event.listens_for(engine_worker, "after_cursor_execute")
+        def _observar(conn, cursor, statement, *args):
+            if statement.startswith("PRAGMA user_version = "):
+                aplicadas.append(int(statement.rsplit(" ", 1)[1]))
+            elif statement == "PRAGMA user_version":
+                time.sleep(0.2)  # sem a trava, o outro worker leria a mesma versão antiga neste meio-tempo
+
+    largada = threading.Barrier(len(engines))
+    versoes, erros = [], []
+
+    def worker(engine_worker):
+        largada.wait()
+        try:
+            versoes.append(aplicar_migracoes(engine_worker))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=worker, args=(e,)) for e in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for engine_worker in engines:
+        engine_worker.dispose()
+
+    assert erros == []
+    assert versoes == [ULTIMA_VERSAO, ULTIMA_VERSAO]
+    assert sorted(aplicadas) == list(range(1, ULTIMA_VERSAO + 1))  # cada migração rodou uma vez só
+    with sqlite3.connect(caminho) as conexao:
+        assert conexao.execute("PRAGMA user_version").fetchone() == (ULTIMA_VERSAO,)
+        assert conexao.execute("SELECT count(*) FROM aluguel").fetchone() == alugueis
@@ -0,0 +1,66 @@
+"""
+DespachanteEmail (src/services/outbox_service.py) contra o stub do externo.
+"""
+import datetime
+
+from src.models import EmailOutboxDB
+from src.services import DespachanteEmail
+
+
+def _enfileirar(banco, quantidade: int):
+    with banco.SessionLocal() as db:
+        db.add_all(EmailOutboxDB(email=f"c{i}@example.com", assunto="Teste", mensagem="oi")
+                   for i in range(quantidade))
+        db.commit()
+
+
+def _estados(banco) -> list:
+    return banco.consultar("SELECT status, tentativas, ultimoErro FROM email_outbox ORDER BY id")
+
+
+def test_despachantes_enviam_cada_email_uma_vez(banco, upstreams):
+    _enfileirar(banco, 10)
+    url_externo = upstreams.url_externo
+    a, b = (DespachanteEmail(banco.SessionLocal, url_externo, lote=4) for _ in range(2))
+    try:
+        while a.processar_lote() + b.processar_lote():
+            pass
+    finally:
+        a.parar()
+        b.parar()
+
+    assert _estados(banco) == [("ENVIADO", 0, None)] * 10
+
+
+def test_resultado_de_reserva_vencida_nao_e_gravado(banco, upstreams):
+    _enfileirar(banco, 1)
+    url_externo = upstreams.url_externo
+    lento = DespachanteEmail(banco.SessionLocal, url_externo)
+    outro = DespachanteEmail(banco.SessionLocal, url_externo)
+
+    def enviar_depois_de_perder_a_reserva(service, *email):
+        # a reserva vence no meio do envio e outro worker pega o email e o envia
+        with banco.SessionLocal() as db:
+            db.query(EmailOutboxDB).update({"proximaTentativa": datetime.datetime(2000, 1, 1)})
+            db.commit()
+        assert outro.processar_lote() == 1
+        return "timeout de leitura"
+
+    lento._enviar = enviar_depois_de_perder_a_reserva
+    try:
+        assert lento.processar_lote() == 1
+    finally:
+        lento.parar()
+        outro.parar()
+
+    # a falha do worker que perdeu a reserva não sobrescreve o envio do outro nem conta tentativa
+    assert _estados(banco) == [("ENVIADO", 0, None)]
+
+
+def test_reserva_cobre_o_pior_caso_do_lote():
+    despachante = DespachanteEmail(None, "http://127.0.0.1:1", envios_paralelos=4)
+    try:
+        # 50 emails em rodadas de 4: mais que um envio com todos os timeouts estourados por rodada
+        assert despachante.duracao_reserva(50) > 13 * 12
+    finally:
+        despachante.parar()
@@ -0,0 +1,101 @@
+"""
+Circuit breaker e bulkhead (src/clients/resiliencia.py) com chamadas canceladas e vários event loops.
+"""
+import asyncio
+
+import pytest
+
+from src.clients.resiliencia import ABERTO, FECHADO, MEIO_ABERTO, Bulkhead, Dependencia, DependenciaIndisponivel
+
+
+def _dependencia(limite: int = 4, espera: float = 0.5) -> Dependencia:
+    dependencia = Dependencia("teste", (1, 1), limite)
+    dependencia.bulkhead = Bulkhead("teste", limite, espera)
+    return dependencia
+
+
+async def _cancelar_chamada(dependencia: Dependencia):
+    """Cancela uma chamada já em andamento, como a requisição de um cliente que desconectou."""
+    em_andamento = asyncio.Event()
+
+    async def chamada():
+        async with dependencia.chamada_async():
+            em_andamento.set()
+            await asyncio.sleep(10)
+
+    tarefa = asyncio.ensure_future(chamada())
+    await em_andamento.wait()
+    tarefa.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await tarefa
+
+
+def test_chamadas_canceladas_nao_abrem_o_circuito():
+    dependencia = _dependencia()
+
+    async def rodar():
+        for _ in range(dependencia.breaker.limite_falhas * 2):
+            await _cancelar_chamada(dependencia)
+
+    asyncio.run(rodar())
+    assert dependencia.breaker.estado == FECHADO
+    assert dependencia.breaker.falhas_seguidas == 0
+
+
+def test_teste_do_meio_aberto_cancelado_libera_o_proximo():
+    dependencia = _dependencia()
+    breaker = dependencia.breaker
+    for _ in range(breaker.limite_falhas):
+        breaker.registrar_falha()
+    assert breaker.estado == ABERTO
+    breaker.aberto_ate = 0
+
+    asyncio.run(_cancelar_chamada(dependencia))
+
+    assert breaker.estado == MEIO_ABERTO
+    breaker.permitir()  # a próxima chamada ainda pode ser o teste
+
+
+def test_bulkhead_funciona_em_event_loops_diferentes():
+    dependencia = _dependencia(limite=1, espera=1)
+
+    async def disputar():
+        # a segunda espera a vaga da primeira: o semáforo passa a pertencer a este loop
+        async def chamada():
+            async with dependencia.bulkhead.vaga_async():
+                await asyncio.sleep(0.01)
+        await asyncio.gather(chamada(), chamada())
+
+    asyncio.run(disputar())
+    asyncio.run(disputar())  # TestClient, asyncio.run de testes e benchmarks criam loops novos
+    assert dependencia.bulkhead.em_uso == 0
+
+
+def test_bulkhead_nao_perde_vaga_quando_o_timeout_empata_com_a_liberacao():
+    espera = 0.02
+    dependencia = _dependencia(limite=1, espera=espera)
+    bulkhead = dependencia.bulkhead
+
+    async def rodar():
+        async def segurar():
+            async with bulkhead.vaga_async():
+                await asyncio.sleep(espera)  # libera mais ou menos quando a outra desiste
+
+        async def tentar():
+            await asyncio.sleep(0)
+            try:
+                async with bulkhead.vaga_async():
+                    pass
+            except DependenciaIndisponivel:
+                pass
+
+        for _ in range(100):
+            await asyncio.gather(segurar(), tentar())
+        # se alguma vaga tivesse se perdido, esta ficaria sem vaga
+        async with bulkhead.vaga_async():
+            pass
+        return bulkhead._semaforo_do_loop()
+
+    semaforo = asyncio.run(rodar())
+    assert bulkhead.em_uso == 0
+    assert semaforo._value == 1